@@ -0,0 +1,92 @@
+"""
+Measure the time taken by `import kestra` in a fresh interpreter, in milliseconds.
+
+    python benchmarks/bench_import_time.py [--repeat N] [--max-ms MS]
+
+Each run starts a new interpreter with `-X importtime` and reads the cumulative
+import time of the `kestra` module, which includes the modules it imports. The
+first run compiles the bytecode and is not counted, as installed packages come
+with it. With `--max-ms`, the script exits with an error when the best time goes
+over the given budget, to catch regressions of the cold start.
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+def import_time(env: dict) -> tuple[float, list[tuple[str, float]]]:
+    """
+    Import kestra in a new interpreter.
+
+    Returns:
+        tuple[float, list[tuple[str, float]]]: The cumulative import time of kestra,
+            and the modules it imports directly with their cumulative time, in
+            milliseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import kestra"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # lines like "import time:   self [us] | cumulative | <indentation>package"
+    modules = [
+        (match[3], int(match[2]) / 1000, len(match[3]) - len(match[3].lstrip()))
+        for match in re.finditer(
+            r"^import time:\s+(\d+) \|\s+(\d+) \| (.*)$", result.stderr, re.M
+        )
+    ]
+    # the modules imported by kestra are the indented lines right before it
+    index = next(i for i, (name, _, _) in enumerate(modules) if name == "kestra")
+    children = []
+    for name, cumulative, depth in reversed(modules[:index]):
+        if depth == 0:
+            break
+        if depth == 2:
+            children.append((name.strip(), cumulative))
+    return modules[index][1], children
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, help="fail above this import time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache:
+        env = {
+            **os.environ,
+            "PYTHONPATH": SRC,
+            "PYTHONPYCACHEPREFIX": cache,
+            "PYTHONDONTWRITEBYTECODE": "",
+        }
+        import_time(env)
+        runs = [import_time(env) for _ in range(args.repeat)]
+
+    times = [total for total, _ in runs]
+    best = min(range(len(runs)), key=times.__getitem__)
+    result = {
+        "best_ms": round(times[best], 2),
+        "median_ms": round(statistics.median(times), 2),
+        "slowest_imports_ms": {
+            name: round(cumulative, 2)
+            for name, cumulative in sorted(runs[best][1], key=lambda m: -m[1])[:5]
+        },
+    }
+    print(json.dumps(result, indent=2))
+
+    if args.max_ms is not None and times[best] > args.max_ms:
+        sys.exit(f"import time {times[best]:.2f} ms above {args.max_ms} ms")
+
+
+if __name__ == "__main__":
+    main()
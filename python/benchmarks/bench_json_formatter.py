@@ -0,0 +1,100 @@
+"""
+Measure the throughput of JsonFormatter, in records per second.
+
+    python benchmarks/bench_json_formatter.py [--records N] [--min-rate RATE]
+
+The formatter is compared to the straightforward implementation it replaced, a
+`LogFormatter` pass followed by `Kestra.format`. With `--min-rate`, the script exits
+with an error when the throughput falls below the given rate, to catch regressions.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from kestra import JsonFormatter, Kestra, LogFormatter  # noqa: E402
+
+_REFERENCE_FORMATTER = LogFormatter("%(asctime)s - %(message)s")
+
+
+def reference_format(record: logging.LogRecord) -> str:
+    levels = {10: "DEBUG", 20: "INFO", 30: "WARN", 40: "ERROR", 50: "ERROR"}
+    entry = {
+        "level": levels.get(record.levelno, "TRACE"),
+        "message": _REFERENCE_FORMATTER.format(record),
+    }
+    return Kestra.format({"logs": [entry]})
+
+
+def make_records(count: int) -> list[logging.LogRecord]:
+    return [
+        logging.LogRecord(
+            "Kestra",
+            logging.INFO if i % 10 else logging.WARNING,
+            __file__,
+            i,
+            "Processed item %d of %s",
+            (i, "batch-42"),
+            None,
+        )
+        for i in range(count)
+    ]
+
+
+def throughput(format_, records: list[logging.LogRecord], repeat: int) -> float:
+    """
+    The best throughput of `format_` over `repeat` runs, in records per second.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        # spread the records over 100 seconds, as in a long-running task
+        for i, record in enumerate(records):
+            record.created = 1_700_000_000 + i * 100 / len(records)
+        start = time.perf_counter()
+        for record in records:
+            format_(record)
+        best = min(best, time.perf_counter() - start)
+
+    return len(records) / best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-rate", type=float, default=None)
+    args = parser.parse_args()
+
+    records = make_records(args.records)
+    result = {
+        "benchmark": "json_formatter",
+        "records": args.records,
+        "records_per_second": round(
+            throughput(JsonFormatter().format, records, args.repeat)
+        ),
+        "reference_records_per_second": round(
+            throughput(reference_format, records, args.repeat)
+        ),
+    }
+    result["speedup"] = round(
+        result["records_per_second"] / result["reference_records_per_second"], 2
+    )
+    print(json.dumps(result, indent=2))
+
+    if args.min_rate is not None and result["records_per_second"] < args.min_rate:
+        print(
+            f"Throughput below {args.min_rate:.0f} records per second",
+            file=sys.stderr,
+        )
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""
+Run the benchmark suite of the library, without network, and save its results.
+
+    python benchmarks/bench_suite.py [--only NAME ...] [--ion-sizes MB,...]
+        [--output FILE] [--compare FILE]
+
+The benchmarks are:
+- emission: `Kestra.outputs`, `counter`, `timer` and `gauge` calls per second.
+- json_formatter: `JsonFormatter` records per second, see bench_json_formatter.py.
+- ion_read: `Kestra.read` and `Kestra.iter_read` throughput, in MB/s, and peak
+  memory on generated Ion files. Each read runs in a fresh interpreter, so that
+  the peak resident memory it reports, which includes the interpreter, is its
+  own.
+- flow: `Flow.execute`, `submit` and `execute_many` against the local stand-in of
+  the Kestra API used by the tests, in executions per second.
+
+The results are printed and saved as JSON with `--output`. Pass the results of
+another version with `--compare` to print the ratio of each metric to it.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(BENCHMARKS, "..", "src")
+TESTS = os.path.join(BENCHMARKS, "..", "tests")
+sys.path[:0] = [SRC, TESTS]
+
+import bench_json_formatter  # noqa: E402
+from fake_kestra import FakeKestraServer  # noqa: E402
+from kestra import Flow, JsonFormatter, Kestra, PollingStrategy  # noqa: E402
+
+
+def rate(function, count: int, repeat: int = 3) -> float:
+    """
+    The best rate of `count` calls of `function` over `repeat` runs, per second.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(count):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+
+def bench_emission(args: argparse.Namespace) -> dict:
+    calls = {
+        "outputs": lambda: Kestra.outputs({"rows": 42, "status": "ok"}),
+        "counter": lambda: Kestra.counter("rows", 42, {"table": "orders"}),
+        "timer": lambda: Kestra.timer("duration", 0.5, {"table": "orders"}),
+        "gauge": lambda: Kestra.gauge("lag", 12.5, {"table": "orders"}),
+    }
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return {
+            f"{name}_per_second": round(rate(call, args.calls))
+            for name, call in calls.items()
+        }
+
+
+def bench_json_formatter_(args: argparse.Namespace) -> dict:
+    records = bench_json_formatter.make_records(args.records)
+    return {
+        "records_per_second": round(
+            bench_json_formatter.throughput(JsonFormatter().format, records, 3)
+        )
+    }
+
+
+# measures a read in a fresh interpreter: path, method
+_READ_SCRIPT = """
+import json, resource, sys, time
+from kestra import Kestra
+
+path, method = sys.argv[1:]
+start = time.perf_counter()
+if method == "read":
+    count = len(Kestra.read(path))
+else:
+    count = sum(1 for _ in Kestra.iter_read(path))
+duration = time.perf_counter() - start
+# the peak of the whole interpreter, in kilobytes on Linux and bytes on macOS
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+peak *= 1 if sys.platform == "darwin" else 1024
+print(json.dumps({"records": count, "seconds": duration, "peak_bytes": peak}))
+"""
+
+
+def write_ion_file(path: str, size: int) -> None:
+    """
+    Write a text Ion file of about `size` bytes, made of flat records.
+    """
+    import amazon.ion.simpleion as ion
+
+    batch = [
+        {
+            "id": i,
+            "name": f"customer-{i}",
+            "amount": 1234.5 + i,
+            "active": i % 2 == 0,
+            "created": "2024-04-21T13:43:24.340Z",
+        }
+        for i in range(1000)
+    ]
+    chunk = ion.dumps(batch, binary=False, sequence_as_stream=True).encode()
+    with open(path, "wb") as file:
+        for _ in range(max(1, size // len(chunk))):
+            file.write(chunk + b"\n")
+
+
+def bench_ion_read(args: argparse.Namespace) -> dict:
+    results = {}
+    env = {**os.environ, "PYTHONPATH": SRC}
+    with tempfile.TemporaryDirectory() as directory:
+        for megabytes in args.ion_sizes:
+            path = os.path.join(directory, f"{megabytes}mb.ion")
+            write_ion_file(path, megabytes * 1024 * 1024)
+            size = os.path.getsize(path) / 1024 / 1024
+            for method in ("read", "iter_read"):
+                output = subprocess.run(
+                    [sys.executable, "-c", _READ_SCRIPT, path, method],
+                    env=env,
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                ).stdout
+                measure = json.loads(output)
+                results[f"{method}_{megabytes}mb"] = {
+                    "records": measure["records"],
+                    "mb_per_second": round(size / measure["seconds"], 2),
+                    "peak_memory_mb": round(measure["peak_bytes"] / 1024 / 1024, 1),
+                }
+            os.remove(path)
+    return results
+
+
+def latencies(durations: list[float]) -> dict:
+    durations = sorted(durations)
+    return {
+        "p50_ms": round(statistics.median(durations) * 1000, 2),
+        "p95_ms": round(durations[int(len(durations) * 0.95)] * 1000, 2),
+    }
+
+
+def bench_flow(args: argparse.Namespace) -> dict:
+    results = {}
+    polling = PollingStrategy.fixed(0.01)
+    with FakeKestraServer() as server:
+        flow = Flow(polling=polling)
+        flow.hostname = server.url
+
+        durations = []
+        for _ in range(args.executions):
+            start = time.perf_counter()
+            flow.execute("namespace", "flow", {"key": "value"})
+            durations.append(time.perf_counter() - start)
+        results["execute"] = {
+            "executions_per_second": round(len(durations) / sum(durations), 1),
+            **latencies(durations),
+        }
+
+        start = time.perf_counter()
+        futures = [
+            flow.submit("namespace", "flow", {"key": "value"})
+            for _ in range(args.executions)
+        ]
+        for future in futures:
+            future.result()
+        results["submit"] = {
+            "executions_per_second": round(
+                args.executions / (time.perf_counter() - start), 1
+            )
+        }
+        flow.close()
+
+        flow = Flow(polling=polling)
+        flow.hostname = server.url
+        start = time.perf_counter()
+        for _ in flow.execute_many(
+            "namespace", "flow", ({"key": i} for i in range(args.executions))
+        ):
+            pass
+        results["execute_many"] = {
+            "executions_per_second": round(
+                args.executions / (time.perf_counter() - start), 1
+            )
+        }
+        flow.close()
+
+        flow = Flow(wait_for_completion=False)
+        flow.hostname = server.url
+        results["create"] = {
+            "executions_per_second": round(
+                rate(lambda: flow.execute("namespace", "flow"), args.executions, 1), 1
+            )
+        }
+    return results
+
+
+BENCHES = {
+    "emission": bench_emission,
+    "json_formatter": bench_json_formatter_,
+    "ion_read": bench_ion_read,
+    "flow": bench_flow,
+}
+
+
+def flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(results: dict, baseline: dict) -> dict[str, float]:
+    """
+    The ratio of each metric to the one of the baseline, for the metrics of both.
+    """
+    current = flatten(results["benchmarks"])
+    previous = flatten(baseline["benchmarks"])
+    return {
+        name: round(value / previous[name], 2)
+        for name, value in current.items()
+        if previous.get(name)
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=BENCHES, default=list(BENCHES))
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument(
+        "--ion-sizes",
+        type=lambda sizes: [int(size) for size in sizes.split(",")],
+        default=[1, 10],
+        help="sizes of the Ion files, in MB, default 1,10. Reading a 1000 MB file "
+        "takes minutes, and several GB of memory with Kestra.read",
+    )
+    parser.add_argument("--executions", type=int, default=100)
+    parser.add_argument("--output", help="file to save the results to")
+    parser.add_argument("--compare", help="results of a previous run")
+    args = parser.parse_args()
+
+    results = {
+        "date": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": {},
+    }
+    for name in args.only:
+        print(f"Running {name}", file=sys.stderr)
+        results["benchmarks"][name] = BENCHES[name](args)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            ratios = compare(results, json.load(file))
+        print(json.dumps({"ratio_to_baseline": ratios}, indent=2))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,7 +12,8 @@ setup(
     include_package_data=True,
     install_requires=["requests", "amazon.ion", "python-dateutil"],
     extras_require={
-        "test": ["pytest", "requests_mock", "pytest-mock"],
+        "async": ["httpx"],
+        "test": ["pytest", "requests_mock", "pytest-mock", "httpx"],
         "dev": ["isort", "black", "flake8"],
     },
     python_requires=">=3",
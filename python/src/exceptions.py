@@ -4,3 +4,20 @@ class FailedExponentialBackoff(Exception):
     """
 
     pass
+
+
+class ExecutionWaitTimeout(Exception):
+    """
+    Exception raised when an execution does not finish within the wait timeout.
+    """
+
+    pass
+
+
+class CircuitOpenError(Exception):
+    """
+    Exception raised when a request is not sent because the circuit breaker of the
+    Kestra server is open.
+    """
+
+    pass
@@ -1,34 +1,580 @@
+from __future__ import annotations
+
+import atexit
+import contextlib
+import functools
+import hashlib
+import itertools
 import json
 import logging
+import logging.handlers
+import math
+import multiprocessing
 import os
+import queue
+import random
 import re
+import socket
+import sqlite3
 import sys
+import threading
 import time
+import uuid
+import weakref
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from json.encoder import encode_basestring_ascii
 from logging import Logger
-from typing import Any, Callable, Optional
-
-import amazon.ion.simpleion as ion
-import dateutil.parser
-import requests
-from amazon.ion.simple_types import (
-    IonPyBool,
-    IonPyBytes,
-    IonPyDecimal,
-    IonPyDict,
-    IonPyNull,
-)
+from types import FrameType, ModuleType
+from typing import IO, TYPE_CHECKING, Any, Callable, Iterable, Iterator, Optional
+from urllib.parse import urlsplit
+
+from exceptions import CircuitOpenError, ExecutionWaitTimeout, FailedExponentialBackoff
+
+if TYPE_CHECKING:
+    import httpx
+    import requests
+
+
+@functools.cache
+def _ion_types() -> ModuleType:
+    """
+    The Ion value types, imported on the first conversion of a value. Cached, as
+    the conversion runs for every value read.
+    """
+    import amazon.ion.simple_types
 
-from exceptions import FailedExponentialBackoff
+    return amazon.ion.simple_types
 
 
 @dataclass(slots=True)
 class FlowExecution:
-    execution_id: str
+    execution_id: Optional[str]
     status: Optional[str]
     log: Optional[str]
     error: Optional[str]
+    log_path: Optional[str] = None
+    outputs: Optional[dict] = None
+
+
+@dataclass(slots=True)
+class PollingStrategy:
+    """
+    Schedule used to poll the Kestra server while waiting for an execution.
+
+    The first status check happens after `initial_interval` seconds, then each
+    interval is multiplied by `multiplier` until it reaches `max_interval`. Short
+    executions are therefore picked up quickly, while long ones are polled less
+    and less often.
+
+    Example - poll fast at first, then back off up to 30 seconds:
+        PollingStrategy(initial_interval=0.1, max_interval=30)
+
+    Example - fixed interval of 5 seconds, give up after one hour:
+        PollingStrategy.fixed(5, timeout=3600)
+
+    Attributes:
+        initial_interval (float): Delay before the first status check, in seconds.
+        max_interval (float): Upper bound of the delay between two checks, in
+            seconds.
+        multiplier (float): Growth factor applied to the delay after each check.
+        jitter (float): Fraction of each delay that is randomized, between 0 and 1.
+            Spreads the checks of many concurrent waits over time.
+        timeout (float): Overall time to wait for the execution, in seconds
+            (optional). An `ExecutionWaitTimeout` is raised once it is exceeded.
+    """
+
+    initial_interval: float = 0.2
+    max_interval: float = 10.0
+    multiplier: float = 2.0
+    jitter: float = 0.1
+    timeout: Optional[float] = None
+
+    @staticmethod
+    def fixed(interval: float, timeout: Optional[float] = None) -> "PollingStrategy":
+        """
+        Build a strategy polling at a constant interval, without jitter.
+
+        Args:
+            interval (float): The delay between two checks, in seconds.
+            timeout (float): Overall time to wait, in seconds (optional).
+
+        Returns:
+            PollingStrategy: The fixed-interval strategy.
+        """
+        return PollingStrategy(
+            initial_interval=interval,
+            max_interval=interval,
+            multiplier=1.0,
+            jitter=0.0,
+            timeout=timeout,
+        )
+
+    def intervals(self) -> Iterator[float]:
+        """
+        Yield the successive delays to sleep between two status checks.
+
+        Returns:
+            Iterator[float]: An endless iterator of delays, in seconds.
+        """
+        interval = self.initial_interval
+        while True:
+            if self.jitter > 0:
+                yield interval * (1 - self.jitter * random.random())
+            else:
+                yield interval
+            interval = min(interval * self.multiplier, self.max_interval)
+
+
+@dataclass(slots=True)
+class RetryPolicy:
+    """
+    How the requests to the Kestra server are retried.
+
+    A request is retried when the server answers one of `retry_statuses`, or when
+    one of `retry_exceptions` is raised, which by default are the connection errors
+    and timeouts of the HTTP client. The delay before the attempt `n` (starting at
+    0) is `min(max_delay, base_delay * 2**n)`. With `jitter`, a random delay
+    between 0 and that value is used instead ("full jitter"), so that many clients
+    failing at once do not retry in lockstep. A `Retry-After` header sent with the
+    response takes precedence, up to `max_retry_after`.
+
+    Example - retry for at most one minute:
+        Flow(retry_policy=RetryPolicy(max_attempts=10, deadline=60))
+
+    Attributes:
+        max_attempts (int): The maximum number of attempts, including the first one.
+        base_delay (float): The delay before the first retry, in seconds.
+        max_delay (float): The upper bound of the computed delays, in seconds.
+        jitter (bool): Whether to randomize the delays (full jitter).
+        retry_after (bool): Whether to honor the `Retry-After` header of the
+            responses.
+        max_retry_after (float): The upper bound of the delays asked by the
+            `Retry-After` headers, in seconds.
+        retry_statuses (frozenset[int]): The status codes of the retried responses.
+        retry_exceptions (tuple[type[Exception], ...]): The errors on which the
+            request is retried (optional). Default is the connection errors and
+            timeouts of the HTTP client.
+        deadline (float): The overall time allowed for all the attempts, in seconds
+            (optional). No retry is made if it would end past the deadline.
+    """
+
+    max_attempts: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    jitter: bool = True
+    retry_after: bool = True
+    max_retry_after: float = 300.0
+    retry_statuses: frozenset = frozenset({408, 429, 500, 502, 503, 504})
+    retry_exceptions: Optional[tuple] = None
+    deadline: Optional[float] = None
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """
+        Compute the delay before retrying a failed attempt.
+
+        Args:
+            attempt (int): The number of the failed attempt, starting at 0.
+            retry_after (str): The `Retry-After` header of the response (optional),
+                either a number of seconds or an HTTP date.
+
+        Returns:
+            float: The delay, in seconds.
+        """
+        if self.retry_after and retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                import email.utils
+
+                try:
+                    date = email.utils.parsedate_to_datetime(retry_after)
+                    delay = (date - datetime.now(timezone.utc)).total_seconds()
+                except (TypeError, ValueError):
+                    delay = None
+            if delay is not None:
+                return min(self.max_retry_after, max(0.0, delay))
+
+        delay = min(self.max_delay, self.base_delay * 2**attempt)
+        if self.jitter:
+            return random.uniform(0, delay)
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Fail fast when a Kestra server is down, instead of retrying every request.
+
+    The breaker counts the consecutive failures of the requests made to each host:
+    connection errors and 5xx responses. After `failure_threshold` of them, the
+    circuit of the host opens and its requests raise a `CircuitOpenError` without
+    being sent. After `reset_timeout` seconds, one trial request is let through:
+    the circuit closes if it succeeds, and opens again otherwise.
+
+    A breaker can be shared by several Flow instances, so that they all stop
+    calling a server that is down.
+
+    Example:
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+        flow = Flow(circuit_breaker=breaker)
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold (int): The number of consecutive failures opening the
+                circuit of a host. Default is 5.
+            reset_timeout (float): How long a circuit stays open before a trial
+                request, in seconds. Default is 30.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        # host -> (consecutive failures, time.monotonic() the circuit opened at)
+        self._hosts: dict[str, tuple[int, float | None]] = {}
+
+    def check(self, host: str) -> None:
+        """
+        Make sure a request can be sent to a host.
+
+        Args:
+            host (str): The host of the request.
+
+        Raises:
+            CircuitOpenError: If the circuit of the host is open.
+        """
+        with self._lock:
+            failures, opened_at = self._hosts.get(host, (0, None))
+            if opened_at is None:
+                return
+
+            if time.monotonic() - opened_at < self.reset_timeout:
+                raise CircuitOpenError(
+                    f"The Kestra server {host} is unavailable, the request was not "
+                    f"sent after {failures} consecutive failures"
+                )
+
+            # half-open: let this request through, and keep the others out until
+            # its outcome is known
+            self._hosts[host] = (failures, time.monotonic())
+
+    def record_success(self, host: str) -> None:
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def record_failure(self, host: str) -> None:
+        with self._lock:
+            failures, opened_at = self._hosts.get(host, (0, None))
+            failures += 1
+            if failures >= self.failure_threshold:
+                opened_at = time.monotonic()
+            self._hosts[host] = (failures, opened_at)
+
+
+class RateLimiter:
+    """
+    Smooth the requests made to the Kestra server, to stay under its rate limits.
+
+    Each budget is a token bucket: it holds up to `burst` requests, and is refilled
+    at `rate` requests per second. The requests creating or changing executions
+    (POST, PUT, DELETE...) use the `create_rate` budget, and the requests reading
+    them (GET) the `read_rate` one, so that status checks do not delay the creation
+    of new executions. A budget left to None is not limited.
+
+    A limiter is thread-safe, and can be shared by several Flow and AsyncFlow
+    instances to limit the requests of the whole process.
+
+    Example:
+        limiter = RateLimiter(create_rate=5, read_rate=50)
+        flow = Flow(rate_limiter=limiter)
+    """
+
+    def __init__(
+        self,
+        create_rate: float | None = None,
+        read_rate: float | None = None,
+        burst: int | None = None,
+    ):
+        """
+        Args:
+            create_rate (float): The requests per second creating or changing
+                executions (optional).
+            read_rate (float): The requests per second reading executions and
+                logs (optional).
+            burst (int): How many requests can be sent at once after an idle
+                period (optional). Default is one second worth of requests.
+        """
+        self.create_rate = create_rate
+        self.read_rate = read_rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        # budget -> (available tokens, time.monotonic() of the last update)
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    def reserve(self, method: str) -> float:
+        """
+        Take a token from the budget of a request.
+
+        The token is taken even if the budget is exhausted, the caller being
+        expected to wait for the returned delay before sending the request. This
+        way, the waiting requests are served in order.
+
+        Args:
+            method (str): The HTTP method of the request.
+
+        Returns:
+            float: How long to wait before sending the request, in seconds.
+        """
+        budget = "read" if method.upper() in ("GET", "HEAD") else "create"
+        rate = self.read_rate if budget == "read" else self.create_rate
+        if not rate:
+            return 0.0
+
+        capacity = self.burst or max(1.0, rate)
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated_at = self._buckets.get(budget, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate) - 1
+            self._buckets[budget] = (tokens, now)
+
+        return max(0.0, -tokens / rate)
+
+    def acquire(self, method: str) -> None:
+        """
+        Wait until a request can be sent.
+
+        Args:
+            method (str): The HTTP method of the request.
+        """
+        delay = self.reserve(method)
+        if delay:
+            time.sleep(delay)
+
+
+class IdempotencyStore:
+    """
+    Remember the executions created by a Flow, so that triggering the same flow with
+    the same inputs again attaches to the existing execution instead of creating a
+    new one.
+
+    An execution is identified by a hash of the server, tenant, namespace, flow and
+    inputs, the content of the FILE inputs included. It is reused for `ttl` seconds
+    after its creation, unless it failed, was killed or was cancelled, in which case
+    a new execution is created. Executions with a non-seekable FILE input, whose
+    content cannot be hashed, are never deduplicated.
+
+    The executions are recorded in a SQLite database, which can be shared by
+    several processes, for example the successive attempts of a retried task.
+
+    Example:
+        store = IdempotencyStore("/tmp/kestra-executions.db", ttl=3600)
+        flow = Flow(idempotency=store)
+    """
+
+    def __init__(self, path: str, ttl: float = 3600.0):
+        """
+        Args:
+            path (str): The path of the SQLite database. It is created if needed.
+            ttl (float): How long an execution is reused after its creation, in
+                seconds. Default is one hour.
+        """
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS executions ("
+                "key TEXT PRIMARY KEY, execution_id TEXT NOT NULL, "
+                "created_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def key(url: str, inputs: dict) -> str | None:
+        """
+        Compute the key identifying an execution.
+
+        Args:
+            url (str): The URL creating the execution, which identifies the server,
+                tenant, namespace and flow.
+            inputs (dict): The inputs of the execution.
+
+        Returns:
+            str | None: The key, or None if a FILE input is not seekable.
+
+        Raises:
+            ValueError: If a FILE input is not a tuple of its filename, content, and
+                optionally content type and headers.
+        """
+        digest = hashlib.sha256(url.encode())
+
+        for name, value in sorted(inputs.items()):
+            digest.update(b"\0" + name.encode() + b"\0")
+            if not isinstance(value, tuple):
+                digest.update(str(value).encode())
+                continue
+
+            if not 2 <= len(value) <= 4:
+                raise ValueError(
+                    f"The FILE input {name!r} must be a (filename, content) tuple, "
+                    f"optionally followed by a content type and headers, not {value!r}"
+                )
+            filename, content, *rest = value
+            digest.update(repr((filename, rest)).encode())
+            if isinstance(content, (str, bytes)):
+                digest.update(content.encode() if isinstance(content, str) else content)
+                continue
+
+            try:
+                if not content.seekable():
+                    return None
+                position = content.tell()
+            except (AttributeError, OSError):
+                return None
+            while chunk := content.read(_CHUNK_SIZE):
+                digest.update(chunk.encode() if isinstance(chunk, str) else chunk)
+            content.seek(position)
+
+        return digest.hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """
+        Get the execution recorded for a key, if it has not expired.
+
+        Args:
+            key (str): The key of the execution.
+
+        Returns:
+            str | None: The ID of the execution, if any.
+        """
+        with self._lock, self._connect() as connection:
+            row = connection.execute(
+                "SELECT execution_id FROM executions WHERE key = ? AND created_at > ?",
+                (key, time.time() - self.ttl),
+            ).fetchone()
+
+        return row[0] if row else None
+
+    def put(self, key: str, execution_id: str) -> None:
+        """
+        Record the execution created for a key, and forget the expired ones.
+
+        Args:
+            key (str): The key of the execution.
+            execution_id (str): The ID of the execution.
+        """
+        now = time.time()
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "DELETE FROM executions WHERE created_at <= ?", (now - self.ttl,)
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO executions VALUES (?, ?, ?)",
+                (key, execution_id, now),
+            )
+
+
+class Instrumentation:
+    """
+    Hooks receiving the measurements of the requests made by a Flow and of the
+    waits for its executions.
+
+    Subclass it and override the hooks you need, the default ones do nothing. The
+    hooks are called from the threads making the requests, so they must be
+    thread-safe and fast. An exception raised by a hook is logged and ignored.
+
+    Example:
+        class SlowRequests(Instrumentation):
+            def request(self, endpoint, method, status, duration, retries, *args):
+                if duration > 1:
+                    logging.warning("Slow %s request: %.1fs", endpoint, duration)
+
+        flow = Flow(instrumentation=SlowRequests())
+    """
+
+    def request(
+        self,
+        endpoint: str,
+        method: str,
+        status: int | None,
+        duration: float,
+        retries: int,
+        bytes_sent: int,
+        bytes_received: int,
+    ) -> None:
+        """
+        Called once a request is over, after its retries.
+
+        Args:
+            endpoint (str): The API endpoint called: create, status, search, follow,
+                logs, logs_follow, bulk or file.
+            method (str): The HTTP method of the request.
+            status (int | None): The status code of the last response, or None if no
+                response was received.
+            duration (float): The duration of the request, retries and backoff
+                included, in seconds.
+            retries (int): The number of retries.
+            bytes_sent (int): The size of the request body, when known.
+            bytes_received (int): The size of the response body. For the streamed
+                responses, it is their Content-Length, when known.
+        """
+
+    def wait(self, execution_id: str, state: str | None, duration: float) -> None:
+        """
+        Called once the wait for an execution is over.
+
+        Args:
+            execution_id (str): The ID of the execution.
+            state (str | None): The terminal state of the execution, or None if the
+                wait failed, for example because of a timeout.
+            duration (float): The time between the creation of the execution, or
+                the start of the wait, and its terminal state, in seconds.
+        """
+
+
+class MetricsInstrumentation(Instrumentation):
+    """
+    Emit the measurements of a Flow as Kestra metrics, so that the time spent calling
+    the Kestra API and waiting for the subflows shows up in the task metrics:
+    - kestra.api.duration (timer): the duration of the requests
+    - kestra.api.retries (counter): the number of retries
+    - kestra.api.bytes.sent and kestra.api.bytes.received (counters): the sizes of
+      the request and response bodies
+    - kestra.execution.wait (timer): the time waiting for the executions
+
+    The request metrics are tagged with the `endpoint` and the `status` code, and
+    the wait timer with the terminal `state` of the execution.
+
+    Example:
+        flow = Flow(instrumentation=MetricsInstrumentation())
+    """
+
+    def request(
+        self,
+        endpoint: str,
+        method: str,
+        status: int | None,
+        duration: float,
+        retries: int,
+        bytes_sent: int,
+        bytes_received: int,
+    ) -> None:
+        tags = {"endpoint": endpoint, "status": str(status)}
+        Kestra.timer("kestra.api.duration", duration, tags)
+        if retries:
+            Kestra.counter("kestra.api.retries", retries, tags)
+        if bytes_sent:
+            Kestra.counter("kestra.api.bytes.sent", bytes_sent, tags)
+        if bytes_received:
+            Kestra.counter("kestra.api.bytes.received", bytes_received, tags)
+
+    def wait(self, execution_id: str, state: str | None, duration: float) -> None:
+        Kestra.timer("kestra.execution.wait", duration, {"state": str(state)})
 
 
 class Kestra:
@@ -57,6 +603,10 @@ class Kestra:
     """
 
     _logger: Logger | None = None
+    _log_handlers: list[logging.Handler] = []
+    _log_listener: "_LogListener | None" = None
+    # The queue to the MultiprocessCollector of the parent, in a worker process
+    _worker_queue: "multiprocessing.SimpleQueue | None" = None
 
     def __init__(self):
         pass
@@ -64,12 +614,139 @@ class Kestra:
     @staticmethod
     def _send(map_: dict):
         """
-        Send a message to the Kestra server through STDOUT print statement.
+        Send a message to the Kestra server through STDOUT.
+
+        The frame and its newline are written with a single write, so that the
+        messages sent by several threads, like the ones of `resource_sampler()` or of
+        `MetricsInstrumentation`, do not interleave.
+
+        In a worker process set up by `Kestra.multiprocess()`, the message is sent to
+        the collector of the parent process instead.
 
         Args:
             map_ (dict): The message to send to the Kestra server.
         """
-        print(Kestra.format(map_))
+        if Kestra._worker_queue is None:
+            sys.stdout.write(Kestra.format(map_) + "\n")
+        elif list(map_) == ["metrics"]:
+            Kestra._worker_queue.put(("metrics", map_["metrics"]))
+        else:
+            Kestra._worker_queue.put(("write", "stdout", Kestra.format(map_) + "\n"))
+
+    @staticmethod
+    def multiprocess(context=None) -> "MultiprocessCollector":
+        """
+        Collect the logs, outputs and metrics of worker processes in the parent.
+
+        Without it, worker processes print to the inherited STDOUT, where large
+        frames written concurrently can interleave, and their metrics are sent
+        separately. With it, the workers send their messages over a pipe to a
+        thread of the parent, which writes each frame with a single write, and
+        merges the metrics of all the workers before sending them: the counters and
+        timers with the same name and tags are summed, and the last value of the
+        gauges is kept.
+
+        The workers are set up with the `initializer` and `initargs` of the
+        collector.
+
+        Example:
+            with Kestra.multiprocess() as collector, ProcessPoolExecutor(
+                initializer=collector.initializer, initargs=collector.initargs
+            ) as pool:
+                pool.map(work, items)
+
+        The messages are sent synchronously: each one is in the pipe when the call
+        sending it returns, so none is lost when `multiprocessing.Pool` terminates
+        its workers on exit.
+
+        Args:
+            context: The multiprocessing context the workers are started with
+                (optional), for example `multiprocessing.get_context("spawn")`.
+                Default is the default context.
+
+        Returns:
+            MultiprocessCollector: The collector, to be used as a context manager.
+        """
+        return MultiprocessCollector(context)
+
+    @staticmethod
+    def profile(
+        name: str | None = None,
+        mode: str | None = None,
+        top: int = 10,
+        output: str | None = None,
+        interval: float = 0.01,
+    ) -> "Profiler":
+        """
+        Profile a block of code or a function, and report its hottest functions.
+
+        The `top` functions by cumulative time are sent as `kestra.profile` timers,
+        tagged by `block` and `function`, along with the duration of the block as
+        a `kestra.profile.duration` timer. The full profile is written to `output`:
+        pstats data in "cprofile" mode, which `python -m pstats` or snakeviz read,
+        and collapsed stacks in "sampling" mode, which flame graph tools read.
+
+        When `mode` is not given, it is taken from the KESTRA_PROFILE environment
+        variable: "cprofile" (or "1" or "true"), or "sampling". When it is not set
+        either, the block runs without profiling, so that profiling can be turned
+        on in production without code changes.
+
+        Example - as a context manager:
+            with Kestra.profile("transform"):
+                transform(rows)
+
+        Example - as a decorator, profiled when KESTRA_PROFILE is set:
+            @Kestra.profile()
+            def transform(rows):
+                ...
+
+        Args:
+            name (str): The name of the block (optional). Default is the qualified
+                name of the decorated function, or "profile".
+            mode (str): "cprofile" for a deterministic profile, or "sampling" for a
+                sampling profiler with a lower overhead (optional).
+            top (int): The number of functions reported as metrics. Default is 10.
+            output (str): The path of the profile written (optional). Default is
+                `<name>.pstats` or `<name>.collapsed` in the working directory.
+            interval (float): The sampling interval, in seconds, in "sampling" mode.
+                Default is 0.01.
+
+        Returns:
+            Profiler: The profiler, to be used as a context manager or decorator.
+        """
+        return Profiler(name, mode, top, output, interval)
+
+    @staticmethod
+    def resource_sampler(
+        interval: float = 30.0, tags: dict | None = None
+    ) -> "ResourceSampler":
+        """
+        Sample the resources used by the process in a background thread, and send
+        them as gauges, to tell whether a task is CPU-bound, memory-bound or
+        I/O-bound.
+
+        Every `interval` seconds, the CPU usage, resident and peak memory, context
+        switches and bytes read and written are sent as `kestra.process.*` gauges.
+        When the sampler stops, at the latest at exit, their totals, means and
+        maximums are sent as gauges tagged with a `stat`, along with the time
+        spent sampling as a `kestra.process.sampler.duration` timer.
+
+        Example - for the whole script:
+            Kestra.resource_sampler().start()
+
+        Example - for a block:
+            with Kestra.resource_sampler(interval=5):
+                transform(rows)
+
+        Args:
+            interval (float): The delay between two samples, in seconds. Default is
+                30, sampling costs well under a millisecond.
+            tags (dict): The tags of the gauges (optional).
+
+        Returns:
+            ResourceSampler: The sampler, to start or use as a context manager.
+        """
+        return ResourceSampler(interval, tags)
 
     @staticmethod
     def format(map_: dict):
@@ -198,36 +875,117 @@ class Kestra:
         Kestra._metrics(name, "gauge", value, tags)
 
     @staticmethod
-    def logger():
+    def logger(
+        non_blocking: bool = False,
+        queue_size: int = 10_000,
+        batch_size: int | None = None,
+        batch_interval: float = 0.05,
+    ):
         """
         Get the logger for the Kestra server.
 
+        By default, the records are formatted and written to STDOUT (INFO and below)
+        or STDERR (WARNING and above) by the thread logging them. With
+        `non_blocking`, logging a record only puts it in a bounded queue, and a
+        background thread formats and writes them. When the queue is full, the
+        records are dropped rather than blocking the caller, and their number is
+        reported when the process exits, after the queued records are written.
+
+        The arguments of a record are formatted by the background thread: log the
+        values, not mutable objects changed right after the call.
+
+        With `batch_size`, the records are grouped into a single `logs` frame per
+        stream, of up to `batch_size` records, or of the records logged within
+        `batch_interval` seconds. Their order and their routing to STDOUT or STDERR
+        are preserved. The batching is set up by the first call.
+
+        Args:
+            non_blocking (bool): Whether to write the records from a background
+                thread. A later call with `non_blocking=True` switches the logger
+                to the background thread. Default is False.
+            queue_size (int): The maximum number of records waiting to be written
+                when non_blocking. Default is 10000.
+            batch_size (int): The maximum number of records written in a single
+                frame (optional). Default is None: one frame per record.
+            batch_interval (float): How long a record waits for others to be
+                batched with, in seconds. Default is 0.05.
+
         Returns:
             Logger: The logger for the Kestra server.
         """
-        if Kestra._logger is not None:
+        if Kestra._logger is not None and (
+            not non_blocking or Kestra._log_listener is not None
+        ):
             return Kestra._logger
 
         logger = logging.getLogger("Kestra")
 
         logger.setLevel(logging.DEBUG)
 
-        stdOut = logging.StreamHandler(sys.stdout)
-        stdOut.setLevel(logging.DEBUG)
-        stdOut.addFilter(lambda record: record.levelno <= logging.INFO)
-        stdOut.setFormatter(JsonFormatter())
+        if Kestra._logger is None:
+            stdout, stderr = sys.stdout, sys.stderr
+            if Kestra._worker_queue is not None:
+                stdout = _QueueStream(Kestra._worker_queue, "stdout")
+                stderr = _QueueStream(Kestra._worker_queue, "stderr")
+
+            if batch_size is not None:
+                stdOut = _BatchStreamHandler(stdout, batch_size, batch_interval)
+                stdErr = _BatchStreamHandler(stderr, batch_size, batch_interval)
+            else:
+                stdOut = logging.StreamHandler(stdout)
+                stdErr = logging.StreamHandler(stderr)
+
+            stdOut.setLevel(logging.DEBUG)
+            stdOut.addFilter(lambda record: record.levelno <= logging.INFO)
+            stdOut.setFormatter(JsonFormatter())
+
+            stdErr.setLevel(logging.WARNING)
+            stdErr.setFormatter(JsonFormatter())
 
-        stdErr = logging.StreamHandler(sys.stderr)
-        stdErr.setLevel(logging.WARNING)
-        stdErr.setFormatter(JsonFormatter())
+            Kestra._log_handlers = [stdOut, stdErr]
+        else:
+            for handler in Kestra._log_handlers:
+                logger.removeHandler(handler)
 
-        logger.addHandler(stdOut)
-        logger.addHandler(stdErr)
+        if non_blocking:
+            log_queue: queue.Queue = queue.Queue(queue_size)
+            Kestra._log_listener = _LogListener(log_queue, *Kestra._log_handlers)
+            Kestra._log_listener.start()
+            logger.addHandler(Kestra._log_listener.queue_handler)
+            atexit.register(Kestra._stop_log_listener)
+        else:
+            for handler in Kestra._log_handlers:
+                logger.addHandler(handler)
 
         Kestra._logger = logger
 
         return logger
 
+    @staticmethod
+    def _stop_log_listener() -> None:
+        """
+        Write the records still queued by the non-blocking logger, report the
+        dropped ones, and make the logger write the next records synchronously.
+        """
+        listener = Kestra._log_listener
+        if listener is None:
+            return
+
+        Kestra._log_listener = None
+        atexit.unregister(Kestra._stop_log_listener)
+        listener.stop()
+
+        logger = logging.getLogger("Kestra")
+        logger.removeHandler(listener.queue_handler)
+        for handler in Kestra._log_handlers:
+            logger.addHandler(handler)
+
+        if listener.queue_handler.dropped:
+            logger.warning(
+                "%d log records were dropped because the log queue was full",
+                listener.queue_handler.dropped,
+            )
+
     @staticmethod
     def _convert_ion_types(value: Any) -> Any:
         """
@@ -239,20 +997,23 @@ class Kestra:
         Returns:
             Any: returns the converted value
         """
-        if isinstance(value, IonPyNull):
+        ion_types = _ion_types()
+        if isinstance(value, ion_types.IonPyNull):
             return None
-        elif isinstance(value, IonPyDecimal):
+        elif isinstance(value, ion_types.IonPyDecimal):
             return float(value)
-        elif isinstance(value, IonPyBool):
+        elif isinstance(value, ion_types.IonPyBool):
             return bool(value)
-        elif isinstance(value, IonPyBytes):
+        elif isinstance(value, ion_types.IonPyBytes):
             return value.decode("utf-8")
-        elif isinstance(value, IonPyDict) or isinstance(value, dict):
+        elif isinstance(value, ion_types.IonPyDict) or isinstance(value, dict):
             return {k: Kestra._convert_ion_types(v) for k, v in value.items()}
         elif isinstance(value, str):
             try:
                 # Check if the value follows the expected format e.g. "LocalDateTime::'2024-04-21T13:43:24.34'"
                 if value.startswith("LocalDateTime::"):
+                    import dateutil.parser
+
                     date_str = value.split("::")[1].strip('"')
                     return dateutil.parser.isoparse(date_str)
                 # Use regex to check if the string is a valid ISO 8601 date
@@ -260,6 +1021,8 @@ class Kestra:
                     r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?(Z|[+-]\d{2}:\d{2})?$"
                 )
                 if re.match(iso_date_pattern, value):
+                    import dateutil.parser
+
                     return dateutil.parser.isoparse(value)
                 else:
                     raise ValueError("Not a valid LocalDatetime:: or ISO 8601 date")
@@ -281,6 +1044,8 @@ class Kestra:
         Returns:
             list[dict[str, Any]]: returns the list of dictionaries
         """
+        import amazon.ion.simpleion as ion
+
         with open(path_, "rb") as file:
             ion_content = file.read()
 
@@ -293,6 +1058,28 @@ class Kestra:
 
         return list_of_dicts
 
+    @staticmethod
+    def iter_read(file: str | IO[bytes]) -> Iterator[dict[str, Any]]:
+        """
+        Read an Ion file record by record, without loading it in memory.
+
+        Args:
+            file (str | IO[bytes]): The path to the Ion file, or a binary file object
+                such as a streamed HTTP response.
+
+        Returns:
+            Iterator[dict[str, Any]]: The records, converted like in `read`.
+        """
+        if isinstance(file, str):
+            with open(file, "rb") as fp:
+                yield from Kestra.iter_read(fp)
+            return
+
+        import amazon.ion.simpleion as ion
+
+        for record in ion.load(file, single_value=False, parse_eagerly=False):
+            yield {k: Kestra._convert_ion_types(v) for k, v in dict(record).items()}
+
 
 class LogFormatter(logging.Formatter):
     def formatTime(self, record, datefmt=None):
@@ -304,211 +1091,3251 @@ class LogFormatter(logging.Formatter):
 
 
 class JsonFormatter(logging.Formatter):
+    """
+    Format the records as Kestra log messages.
+
+    The output is the same as `Kestra.format({"logs": [{"level": ..., "message":
+    "<asctime> - <message>"}]})`, with the time formatted by `LogFormatter`, but it
+    is built in a single pass: the level entries are precomputed, the date and time
+    are formatted once per second, and the JSON is written directly. The records
+    with an exception or a stack trace go through `LogFormatter`, to append them.
+    """
+
     _formatter: LogFormatter = LogFormatter("%(asctime)s - %(message)s")
 
+    # The Kestra level of each logging level, the others being TRACE
+    _LEVELS = {
+        logging.DEBUG: "DEBUG",
+        logging.INFO: "INFO",
+        logging.WARNING: "WARN",
+        logging.ERROR: "ERROR",
+        logging.CRITICAL: "ERROR",
+    }
+
+    # The start of the JSON entry of each level
+    _ENTRIES = {
+        level: f'{{"level": "{name}", "message": '
+        for level, name in {**_LEVELS, None: "TRACE"}.items()
+    }
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # (second, its date and time formatted to the second)
+        self._second: tuple[int, str] = (-1, "")
+
     @staticmethod
     def _logger_level(level: int) -> str:
-        if level is logging.DEBUG:
-            return "DEBUG"
-        elif level is logging.INFO:
-            return "INFO"
-        elif level is logging.WARNING:
-            return "WARN"
-        elif (
-            level is logging.ERROR
-            or level is logging.CRITICAL
-            or level is logging.FATAL
+        return JsonFormatter._LEVELS.get(level, "TRACE")
+
+    def _time(self, created: float) -> str:
+        """
+        Format a time like `LogFormatter.formatTime`, for example
+        2020-03-20T14:12:46.123Z, caching the part up to the second.
+        """
+        # split the time like datetime.fromtimestamp, rounding to the microsecond
+        fraction, second = math.modf(created)
+        microseconds = round(fraction * 1e6)
+        if microseconds >= 1_000_000:
+            second, microseconds = second + 1, microseconds - 1_000_000
+        second = int(second)
+
+        cached_second, prefix = self._second
+        if second != cached_second:
+            prefix = datetime.fromtimestamp(second, timezone.utc).strftime(
+                "%Y-%m-%dT%H:%M:%S"
+            )
+            self._second = (second, prefix)
+
+        return f"{prefix}.{microseconds // 1000:03d}Z"
+
+    def _entry(self, record: logging.LogRecord) -> str:
+        """
+        Format a record as the JSON object of a log entry.
+        """
+        if (
+            record.exc_info
+            or record.exc_text
+            or record.stack_info
+            or (record.created < 0)
         ):
-            return "ERROR"
+            message = self._formatter.format(record)
+        else:
+            message = f"{self._time(record.created)} - {record.getMessage()}"
+
+        entry = self._ENTRIES.get(record.levelno) or self._ENTRIES[None]
+        return entry + encode_basestring_ascii(message) + "}"
+
+    def format(self, record: logging.LogRecord) -> str:
+        return '::{"logs": [' + self._entry(record) + "]}::"
+
+    def format_batch(self, records: list[logging.LogRecord]) -> str:
+        """
+        Format several records into a single message, in order.
+
+        Args:
+            records (list[logging.LogRecord]): The records to format.
+
+        Returns:
+            str: The Kestra-formatted message.
+        """
+        return '::{"logs": [' + ", ".join(map(self._entry, records)) + "]}::"
+
+
+# A printf-style placeholder of a message template, like "%s" or "%(name)-10s"
+_PLACEHOLDER = re.compile(
+    r"%(\([^)]*\))?[#0\- +]*(\*|\d+)?(\.(\*|\d+))?[diouxXeEfFgGcrsa%]"
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def _only_placeholders(template: str) -> bool:
+    """
+    Whether a message template has no text besides its placeholders, like "%s".
+    """
+    return not _PLACEHOLDER.sub("", template).strip()
+
+
+class RepeatedMessageFilter(logging.Filter):
+    """
+    Collapse the identical records logged within a time window.
+
+    Records are identical when they have the same logger, level and message template
+    (the `msg` before its arguments are applied). A template made only of
+    placeholders, like "%s", does not tell the messages apart, so the message
+    itself is compared instead. The first one is logged, and the
+    next ones are suppressed for `window` seconds. The first identical record after
+    the window is logged with the number of records suppressed meanwhile, for
+    example "Retrying (repeated 1250 times in the last 60s)", and opens a new
+    window. The counts of records that do not come back are logged as summaries
+    once their window is over, by the next record filtered, when their template
+    is evicted, and on `flush`, which is called at exit.
+
+    At most `max_templates` templates are tracked, the least recently seen ones
+    being evicted first.
+
+    Example:
+        Kestra.logger().addFilter(RepeatedMessageFilter(window=60))
+    """
+
+    def __init__(self, window: float = 60.0, max_templates: int = 1000) -> None:
+        """
+        Args:
+            window (float): How long the identical records are suppressed after the
+                one logged, in seconds. Default is 60.
+            max_templates (int): The maximum number of templates tracked. Default
+                is 1000.
+        """
+        super().__init__()
+        self.window = window
+        self.max_templates = max_templates
+        self._lock = threading.Lock()
+        # (logger, level, template) -> [window start, suppressed count, last record]
+        self._seen: OrderedDict[tuple, list] = OrderedDict()
+        # the earliest end of a window with suppressed records
+        self._next_expiry = math.inf
+        _repeated_message_filters.add(self)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "_kestra_summary", False):
+            return True
+
+        template = record.msg if isinstance(record.msg, str) else str(record.msg)
+        if _only_placeholders(template):
+            template = record.getMessage()
+        key = (record.name, record.levelno, template)
+        now = time.monotonic()
+        pending = []
+        logged = True
+        suppressed = 0
+
+        with self._lock:
+            seen = self._seen.get(key)
+            if seen is None:
+                self._seen[key] = [now, 0, None]
+                if len(self._seen) > self.max_templates:
+                    pending.append(self._seen.popitem(last=False)[1])
+            elif now - seen[0] < self.window:
+                self._seen.move_to_end(key)
+                seen[1] += 1
+                seen[2] = record
+                self._next_expiry = min(self._next_expiry, seen[0] + self.window)
+                logged = False
+            else:
+                self._seen.move_to_end(key)
+                suppressed = seen[1]
+                self._seen[key] = [now, 0, None]
+
+            if now >= self._next_expiry:
+                pending.extend(self._pop_expired(now))
+
+        for started, count, last in pending:
+            if count:
+                self._summarize(started, count, last)
+
+        if suppressed:
+            record.msg = self._repeated(record.getMessage(), suppressed, now - seen[0])
+            record.args = ()
+
+        return logged
+
+    def _pop_expired(self, now: float) -> list[list]:
+        """
+        Remove the templates with suppressed records whose window is over, and
+        return them. Called with the lock held.
+        """
+        expired = []
+        self._next_expiry = math.inf
+        for key, seen in list(self._seen.items()):
+            if not seen[1]:
+                continue
+            if now - seen[0] >= self.window:
+                expired.append(seen)
+                del self._seen[key]
+            else:
+                self._next_expiry = min(self._next_expiry, seen[0] + self.window)
+        return expired
+
+    @staticmethod
+    def _repeated(message: str, count: int, duration: float) -> str:
+        return f"{message} (repeated {count} times in the last {duration:.0f}s)"
+
+    def _summarize(self, started: float, count: int, record: logging.LogRecord) -> None:
+        """
+        Log the number of records suppressed since the last one logged.
+        """
+        summary = logging.makeLogRecord(record.__dict__)
+        summary.msg = self._repeated(
+            record.getMessage(), count, time.monotonic() - started
+        )
+        summary.args = ()
+        summary.exc_info = summary.exc_text = None
+        summary._kestra_summary = True
+        logging.getLogger(record.name).handle(summary)
+
+    def flush(self) -> None:
+        """
+        Log the number of records suppressed for every template, and reset them.
+        """
+        with self._lock:
+            pending = [seen for seen in self._seen.values() if seen[1]]
+            self._seen.clear()
+            self._next_expiry = math.inf
+
+        for started, count, record in pending:
+            self._summarize(started, count, record)
+
+
+# The filters flushed at exit, without keeping them alive
+_repeated_message_filters: weakref.WeakSet[RepeatedMessageFilter] = weakref.WeakSet()
+
+
+def _flush_repeated_message_filters() -> None:
+    for repeated in list(_repeated_message_filters):
+        repeated.flush()
+
+
+atexit.register(_flush_repeated_message_filters)
+
+
+class _BatchStreamHandler(logging.StreamHandler):
+    """
+    A StreamHandler writing the records in batches: a batch is written once it
+    holds `capacity` records, or `interval` seconds after its first record, by a
+    background thread. The records are formatted when their batch is written, with
+    the `format_batch` method of the formatter if it has one.
+    """
+
+    def __init__(self, stream: IO[str], capacity: int, interval: float) -> None:
+        super().__init__(stream)
+        self.capacity = capacity
+        self.interval = interval
+        self._buffer: list[logging.LogRecord] = []
+        self._closed = False
+        self._pending = threading.Condition(self.lock)
+        self._thread: threading.Thread | None = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # called with the lock held by Handler.handle
+        self._buffer.append(record)
+        if len(self._buffer) >= self.capacity:
+            self.flush()
+        elif self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="kestra-log-batch", daemon=True
+            )
+            self._thread.start()
+        else:
+            self._pending.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._pending:
+                while not self._buffer and not self._closed:
+                    self._pending.wait()
+                if self._closed:
+                    return
+
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            records, self._buffer = self._buffer, []
+            if not records:
+                return super().flush()
+
+            try:
+                if hasattr(self.formatter, "format_batch"):
+                    message = self.formatter.format_batch(records)
+                else:
+                    message = self.terminator.join(map(self.format, records))
+                self.stream.write(message + self.terminator)
+                super().flush()
+            except Exception:
+                self.handleError(records[0])
+
+    def close(self) -> None:
+        with self.lock:
+            self._closed = True
+            self._pending.notify()
+        self.flush()
+        super().close()
+
+
+class MultiprocessCollector:
+    """
+    Write the messages of worker processes from the parent process, see
+    `Kestra.multiprocess()`.
+
+    Attributes:
+        initializer (Callable): The initializer of the worker processes, to pass to
+            `multiprocessing.Pool` or `ProcessPoolExecutor`. A custom initializer can
+            call it instead.
+        initargs (tuple): The arguments of the initializer.
+    """
+
+    def __init__(self, context=None) -> None:
+        """
+        Args:
+            context: The multiprocessing context of the workers (optional).
+        """
+        context = context or multiprocessing.get_context()
+        # unlike Queue, SimpleQueue writes to the pipe in the calling thread rather
+        # than in a feeder thread, which a terminated worker would not flush
+        self._queue: multiprocessing.SimpleQueue = context.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="kestra-multiprocess", daemon=True
+        )
+        # (name, type, tags) -> value, in the order the metrics were first seen
+        self._metrics: dict[tuple, float] = {}
+        self.initializer = MultiprocessCollector.init_worker
+        self.initargs = (self._queue,)
+
+    @staticmethod
+    def init_worker(queue_: multiprocessing.SimpleQueue) -> None:
+        """
+        Set up a worker process to send its messages to the collector.
+
+        Args:
+            queue_ (multiprocessing.SimpleQueue): The queue of the collector.
+        """
+        Kestra._worker_queue = queue_
+
+        # forget the logger inherited from the parent with fork
+        logger = logging.getLogger("Kestra")
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        Kestra._logger = None
+        Kestra._log_handlers = []
+        Kestra._log_listener = None
+
+    def __enter__(self) -> "MultiprocessCollector":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Write the messages still queued, then send the merged metrics.
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+        if self._metrics:
+            Kestra._send(
+                {
+                    "metrics": [
+                        {"name": name, "type": type_, "value": value, "tags": tags}
+                        for (name, type_, tags), value in self._metrics.items()
+                        for tags in [dict(tags)]
+                    ]
+                }
+            )
+            self._metrics.clear()
+
+    def _run(self) -> None:
+        while (event := self._queue.get()) is not None:
+            kind, *payload = event
+            if kind == "write":
+                stream = sys.stdout if payload[0] == "stdout" else sys.stderr
+                stream.write(payload[1])
+                stream.flush()
+            elif kind == "metrics":
+                self._merge(payload[0])
+
+    def _merge(self, metrics: list[dict]) -> None:
+        for metric in metrics:
+            key = (
+                metric["name"],
+                metric["type"],
+                tuple(sorted(metric["tags"].items())),
+            )
+            if metric["type"] == "gauge" or key not in self._metrics:
+                self._metrics[key] = metric["value"]
+            else:
+                self._metrics[key] += metric["value"]
+
+
+class Profiler(contextlib.ContextDecorator):
+    """
+    Profile a block of code or a function, see `Kestra.profile()`.
+
+    The "sampling" mode samples the stack of the thread that entered the block only.
+    A profiler must not be entered again before it exits, which includes the
+    recursive calls of a decorated function.
+
+    Attributes:
+        enabled (bool): Whether the block is profiled.
+    """
+
+    # KESTRA_PROFILE value -> mode
+    MODES = {
+        "1": "cprofile",
+        "true": "cprofile",
+        "cprofile": "cprofile",
+        "sampling": "sampling",
+    }
+
+    def __init__(
+        self,
+        name: str | None = None,
+        mode: str | None = None,
+        top: int = 10,
+        output: str | None = None,
+        interval: float = 0.01,
+    ) -> None:
+        """
+        Args:
+            See `Kestra.profile()`.
+        """
+        if mode is None:
+            mode = os.environ.get("KESTRA_PROFILE", "").lower() or None
+            if mode in ("0", "false"):
+                mode = None
+        if mode is not None and mode not in Profiler.MODES:
+            raise ValueError(
+                f"Unknown profiling mode {mode!r}, use 'cprofile' or 'sampling'"
+            )
+
+        self.name = name
+        self.mode = Profiler.MODES.get(mode)
+        self.enabled = self.mode is not None
+        self.top = top
+        self.output = output
+        self.interval = interval
+        self._profiler = None
+        # collapsed stack -> number of samples, in "sampling" mode
+        self._stacks: Counter[str] = Counter()
+        self._sampler: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self._started = 0.0
+
+    def __call__(self, function: Callable) -> Callable:
+        if self.name is None:
+            self.name = function.__qualname__
+        return super().__call__(function)
+
+    def __enter__(self) -> "Profiler":
+        if not self.enabled:
+            return self
+
+        self._started = time.perf_counter()
+        if self.mode == "cprofile":
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._stacks.clear()
+            self._stopped.clear()
+            self._sampler = threading.Thread(
+                target=self._sample,
+                # the stacks are sampled up to the frame of the block
+                args=(threading.get_ident(), sys._getframe(1)),
+                name="kestra-profile",
+                daemon=True,
+            )
+            self._sampler.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if not self.enabled:
+            return
+
+        if self.mode == "cprofile":
+            self._profiler.disable()
+        else:
+            self._stopped.set()
+            self._sampler.join()
+        duration = time.perf_counter() - self._started
+
+        name = self.name or "profile"
+        if self.mode == "cprofile":
+            functions = self._cprofile_functions()
+        else:
+            functions = self._sampled_functions(duration)
+        self._write(name)
+
+        tags = {"block": name}
+        Kestra._send(
+            {
+                "metrics": [
+                    {
+                        "name": "kestra.profile.duration",
+                        "type": "timer",
+                        "value": duration,
+                        "tags": tags,
+                    }
+                ]
+                + [
+                    {
+                        "name": "kestra.profile",
+                        "type": "timer",
+                        "value": cumulative,
+                        "tags": {**tags, "function": function},
+                    }
+                    for function, cumulative in functions[: self.top]
+                ]
+            }
+        )
+
+    @staticmethod
+    def _label(filename: str, line: int, function: str) -> str:
+        if filename == "~":
+            # a built-in function
+            return function
+        return f"{os.path.basename(filename)}:{line}({function})"
+
+    def _cprofile_functions(self) -> list[tuple[str, float]]:
+        """
+        The profiled functions and their cumulative time, the highest first.
+        """
+        import pstats
+
+        stats = pstats.Stats(self._profiler).stats
+        functions = [
+            (self._label(*function), cumulative)
+            for function, (_, _, _, cumulative, _) in stats.items()
+            if function[2] != "<method 'disable' of '_lsprof.Profiler' objects>"
+        ]
+        return sorted(functions, key=lambda function: -function[1])
+
+    def _sample(self, thread_id: int, root: FrameType) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    self._label(code.co_filename, code.co_firstlineno, code.co_name)
+                )
+                frame = frame.f_back if frame is not root else None
+            if stack:
+                self._stacks[";".join(reversed(stack))] += 1
+
+    def _sampled_functions(self, duration: float) -> list[tuple[str, float]]:
+        """
+        The sampled functions and their estimated cumulative time, the highest
+        first: the share of the samples a function is on the stack of, times the
+        duration of the block. The samples are often less frequent than `interval`,
+        when the profiled thread holds the GIL.
+        """
+        samples: Counter[str] = Counter()
+        for stack, count in self._stacks.items():
+            for function in set(stack.split(";")):
+                samples[function] += count
+        total = sum(self._stacks.values())
+        return [
+            (function, count / total * duration)
+            for function, count in samples.most_common()
+        ]
+
+    def _write(self, name: str) -> None:
+        """
+        Write the full profile to the output file.
+        """
+        extension = "pstats" if self.mode == "cprofile" else "collapsed"
+        output = self.output or re.sub(r"[^\w.-]", "_", name) + "." + extension
+        if self.mode == "cprofile":
+            self._profiler.dump_stats(output)
+        else:
+            with open(output, "w") as file:
+                for stack, count in self._stacks.items():
+                    file.write(f"{stack} {count}\n")
+
+
+class ResourceSampler:
+    """
+    Send the resources used by the process as gauges, see
+    `Kestra.resource_sampler()`.
+
+    The values are read from `resource.getrusage` and, on Linux, from
+    `/proc/self/statm` and `/proc/self/io`. The values that cannot be read on a
+    platform are not sent.
+    """
+
+    # gauge -> statistics sent when the sampler stops
+    SUMMARIES = {
+        "cpu.percent": ("mean", "max"),
+        "cpu.user": ("total",),
+        "cpu.system": ("total",),
+        "memory.rss": ("mean", "max"),
+        "memory.peak": ("max",),
+        "context_switches.voluntary": ("total",),
+        "context_switches.involuntary": ("total",),
+        "io.read_bytes": ("total",),
+        "io.write_bytes": ("total",),
+    }
+
+    def __init__(self, interval: float = 30.0, tags: dict | None = None) -> None:
+        """
+        Args:
+            See `Kestra.resource_sampler()`.
+        """
+        import resource
+
+        self._resource = resource
+        self.interval = interval
+        self.tags = tags or {}
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._first: dict[str, float] = {}
+        self._last: dict[str, float] = {}
+        # gauge -> values sent, for the summaries
+        self._values: dict[str, list[float]] = {}
+        # the time spent sampling, in seconds
+        self._overhead = 0.0
+
+    def __enter__(self) -> "ResourceSampler":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> "ResourceSampler":
+        """
+        Start sampling, until `stop` is called or the process exits.
+
+        Returns:
+            ResourceSampler: The sampler itself.
+        """
+        self._first = self._last = self.sample()
+        self._values = {}
+        self._overhead = 0.0
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="kestra-resources", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self) -> None:
+        """
+        Stop sampling, then send a last sample and the summaries.
+        """
+        if self._thread is None:
+            return
+
+        atexit.unregister(self.stop)
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        self._emit()
+        self._summarize()
+
+    def sample(self) -> dict[str, float]:
+        """
+        Read the resources used by the process.
+
+        Returns:
+            dict[str, float]: The values by name: the wall clock time, the user and
+                system CPU times in seconds, the resident and peak memory and the
+                bytes read and written in bytes, and the voluntary and involuntary
+                context switches, all but the resident memory since the start of
+                the process.
+        """
+        usage = self._resource.getrusage(self._resource.RUSAGE_SELF)
+        values = {
+            "time": time.monotonic(),
+            "cpu.user": usage.ru_utime,
+            "cpu.system": usage.ru_stime,
+            # in kilobytes on Linux, in bytes on macOS
+            "memory.peak": usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024),
+            "context_switches.voluntary": usage.ru_nvcsw,
+            "context_switches.involuntary": usage.ru_nivcsw,
+        }
+        try:
+            with open("/proc/self/statm") as file:
+                pages = int(file.read().split()[1])
+            values["memory.rss"] = pages * os.sysconf("SC_PAGE_SIZE")
+            # the peak of getrusage is updated lazily by the kernel
+            values["memory.peak"] = max(values["memory.peak"], values["memory.rss"])
+        except (OSError, ValueError):
+            pass
+        try:
+            with open("/proc/self/io") as file:
+                io = dict(line.split(": ") for line in file.read().splitlines())
+            values["io.read_bytes"] = int(io["read_bytes"])
+            values["io.write_bytes"] = int(io["write_bytes"])
+        except (OSError, KeyError, ValueError):
+            pass
+        return values
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self._emit()
+
+    def _emit(self) -> None:
+        """
+        Take a sample and send it, with the CPU usage since the previous one.
+        """
+        started = time.thread_time()
+        values = self.sample()
+        elapsed = values["time"] - self._last["time"]
+        cpu = (
+            values["cpu.user"]
+            + values["cpu.system"]
+            - self._last["cpu.user"]
+            - self._last["cpu.system"]
+        )
+        gauges = {"cpu.percent": 100 * cpu / elapsed if elapsed > 0 else 0.0}
+        gauges.update((name, value) for name, value in values.items() if name != "time")
+        self._last = values
+
+        for name, value in gauges.items():
+            self._values.setdefault(name, []).append(value)
+        Kestra._send(
+            {
+                "metrics": [
+                    {
+                        "name": f"kestra.process.{name}",
+                        "type": "gauge",
+                        "value": value,
+                        "tags": self.tags,
+                    }
+                    for name, value in gauges.items()
+                ]
+            }
+        )
+        self._overhead += time.thread_time() - started
+
+    def _summarize(self) -> None:
+        elapsed = self._last["time"] - self._first["time"]
+        metrics = []
+        for name, stats in ResourceSampler.SUMMARIES.items():
+            values = self._values.get(name)
+            if not values:
+                continue
+            for stat in stats:
+                if stat == "total":
+                    value = self._last[name] - self._first[name]
+                elif stat == "max":
+                    value = max(values)
+                elif name == "cpu.percent":
+                    # over the whole run, rather than the mean of the samples
+                    cpu = sum(
+                        self._last[time_] - self._first[time_]
+                        for time_ in ("cpu.user", "cpu.system")
+                    )
+                    value = 100 * cpu / elapsed if elapsed > 0 else 0.0
+                else:
+                    value = sum(values) / len(values)
+                metrics.append(
+                    {
+                        "name": f"kestra.process.{name}",
+                        "type": "gauge",
+                        "value": value,
+                        "tags": {**self.tags, "stat": stat},
+                    }
+                )
+        metrics.append(
+            {
+                "name": "kestra.process.sampler.duration",
+                "type": "timer",
+                "value": self._overhead,
+                "tags": self.tags,
+            }
+        )
+        Kestra._send({"metrics": metrics})
+
+
+class _QueueStream:
+    """
+    A text stream sending each write to the MultiprocessCollector of the parent, so
+    that it is written in one piece.
+    """
+
+    def __init__(self, queue_: multiprocessing.SimpleQueue, name: str) -> None:
+        self._queue = queue_
+        self._name = name
+
+    def write(self, text: str) -> int:
+        self._queue.put(("write", self._name, text))
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    A QueueHandler that drops the records when its bounded queue is full, instead of
+    blocking, and counts them.
+
+    The records are queued as they are: unlike the default `prepare`, the message is
+    not formatted on the calling thread.
+    """
+
+    def __init__(self, queue_: queue.Queue) -> None:
+        super().__init__(queue_)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+class _LogListener(logging.handlers.QueueListener):
+    """
+    The background thread formatting and writing the records of the non-blocking
+    Kestra logger, with the handlers of the blocking one.
+    """
+
+    def __init__(self, queue_: queue.Queue, *handlers: logging.Handler) -> None:
+        super().__init__(queue_, *handlers, respect_handler_level=True)
+        self.queue_handler = _DroppingQueueHandler(queue_)
+
+    def enqueue_sentinel(self) -> None:
+        # wait for room in the queue, so that the queued records are all written
+        self.queue.put(self._sentinel)
+
+
+def _iter_sse_events(response: requests.Response) -> Iterator[tuple[str, str]]:
+    """
+    Parse a server-sent events stream.
+
+    Args:
+        response (requests.Response): A streamed response of type
+            `text/event-stream`.
+
+    Returns:
+        Iterator[tuple[str, str]]: The name and data of each complete event. An
+            event interrupted by the end of the stream is discarded.
+    """
+    event, data = "message", []
+    # chunk_size=None hands over each chunk as soon as the server flushes it
+    for raw in response.iter_lines(chunk_size=None):
+        line = raw.decode("utf-8")
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event, data = "message", []
+        elif line.startswith(":"):
+            continue
         else:
-            return "TRACE"
+            field, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if field == "event":
+                event = value
+            elif field == "data":
+                data.append(value)
+
+
+def _is_read_timeout(error: Exception) -> bool:
+    """
+    Whether a request failed because the server sent nothing for the read timeout,
+    either while waiting for the response or while streaming its body.
+    """
+    import requests
+    from urllib3.exceptions import ReadTimeoutError
+
+    if isinstance(error, FailedExponentialBackoff):
+        error = error.__cause__ or error
+    # requests wraps a read timeout of a streamed body in a ConnectionError
+    return isinstance(error, requests.ReadTimeout) or any(
+        isinstance(arg, ReadTimeoutError) for arg in error.args
+    )
+
+
+# Size of the chunks read from the streamed responses
+_CHUNK_SIZE = 64 * 1024
+
+# Terminal states of an execution, with the level and wording used to log them
+_TERMINAL_STATES = {
+    "SUCCESS": (logging.INFO, "was successful"),
+    "WARNING": (logging.WARNING, "finished with warnings"),
+    "FAILED": (logging.ERROR, "failed"),
+    "KILLED": (logging.WARNING, "has been killed"),
+    "CANCELLED": (logging.WARNING, "has been cancelled"),
+}
+
+
+class _MultipartEncoder:
+    """
+    A multipart/form-data body read from the file objects while it is sent.
+
+    Unlike the `files` argument of requests, which builds the whole body in memory,
+    the files are read `_CHUNK_SIZE` bytes at a time. The size of the body is
+    exposed as `len` when the size of every file is known, so that it is sent with
+    a Content-Length header, and otherwise None, so that it is sent chunked.
+
+    The files are rewound to their initial position each time the body is iterated,
+    so that a failed request can be retried. Non-seekable files can only be sent
+    once.
+    """
+
+    def __init__(self, fields: dict) -> None:
+        """
+        Args:
+            fields (dict): The fields, as returned by `_BaseFlow._input_files`.
+        """
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        # (part headers, content, initial position of the file, if seekable)
+        self._parts: list[tuple[bytes, Any, int | None]] = []
+        self._iterated = False
+
+        for name, (filename, content, *rest) in fields.items():
+            headers = f"--{self.boundary}\r\nContent-Disposition: form-data; "
+            headers += f'name="{name}"'
+            if filename is not None:
+                content_type = rest[0] if rest else "application/octet-stream"
+                headers += f'; filename="{filename}"\r\nContent-Type: {content_type}'
+            headers += "\r\n\r\n"
+
+            if isinstance(content, str):
+                content = content.encode()
+            position = None
+            if not isinstance(content, bytes):
+                try:
+                    position = content.tell() if content.seekable() else None
+                except (AttributeError, OSError):
+                    pass
+            self._parts.append((headers.encode(), content, position))
+
+        self._closing = f"--{self.boundary}--\r\n".encode()
+
+    @property
+    def len(self) -> int | None:
+        """
+        The size of the body in bytes, or None if the size of a file is unknown.
+        """
+        size = len(self._closing)
+        for headers, content, position in self._parts:
+            if isinstance(content, bytes):
+                length = len(content)
+            elif position is None:
+                return None
+            else:
+                try:
+                    length = os.fstat(content.fileno()).st_size - position
+                except (AttributeError, OSError):
+                    length = content.seek(0, os.SEEK_END) - position
+                    content.seek(position)
+            size += len(headers) + length + 2
+
+        return size
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self._iterated:
+            for _, content, position in self._parts:
+                if isinstance(content, bytes):
+                    continue
+                if position is None:
+                    raise Exception(
+                        "The upload cannot be retried: an input file is not seekable"
+                    )
+                content.seek(position)
+        self._iterated = True
+
+        sent = 0
+        start = time.monotonic()
+        for headers, content, _ in self._parts:
+            yield headers
+            if isinstance(content, bytes):
+                yield content
+                sent += len(content)
+            else:
+                while chunk := content.read(_CHUNK_SIZE):
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    yield chunk
+                    sent += len(chunk)
+            yield b"\r\n"
+        yield self._closing
+
+        duration = time.monotonic() - start
+        logging.debug(
+            "Uploaded %d bytes of inputs in %.2fs (%.2f MB/s)",
+            sent,
+            duration,
+            sent / duration / 1e6 if duration else 0,
+        )
+
+
+class _BaseFlow:
+    """
+    Settings shared by Flow and AsyncFlow: server, authentication, endpoints and
+    polling strategy. See `Flow.__init__` for their description.
+    """
+
+    def __init__(
+        self,
+        wait_for_completion: bool,
+        poll_interval: float | None,
+        labels_from_inputs: bool,
+        tenant: str | None,
+        polling: PollingStrategy | None,
+        log_dir: str | None,
+        retry_policy: RetryPolicy | None,
+        circuit_breaker: CircuitBreaker | None,
+        rate_limiter: RateLimiter | None,
+        instrumentation: Instrumentation | None,
+    ) -> None:
+        self.wait_for_completion = wait_for_completion
+        self.poll_interval = poll_interval
+        if polling is not None:
+            self.polling = polling
+        self.labels_from_inputs = labels_from_inputs
+        self.log_dir = log_dir
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker
+        self.rate_limiter = rate_limiter
+        self.instrumentation = instrumentation
+        self.user = os.environ.get("KESTRA_USER", None)
+        self.hostname = os.environ.get("KESTRA_HOSTNAME", "http://localhost:8080")
+        self.api_token = os.environ.get("KESTRA_API_TOKEN", None)
+
+        if tenant is not None:
+            self.API_ENDPOINT_EXECUTION_CREATE: str = (
+                f"/api/v1/{tenant}/executions/{{namespace}}/{{flow_id}}"
+            )
+            self.API_ENDPOINT_EXECUTION_STATUS: str = (
+                f"/api/v1/{tenant}/executions/{{execution_id}}"
+            )
+            self.API_ENDPOINT_EXECUTION_FOLLOW: str = (
+                f"/api/v1/{tenant}/executions/{{execution_id}}/follow"
+            )
+            self.API_ENDPOINT_EXECUTION_SEARCH: str = (
+                f"/api/v1/{tenant}/executions/search"
+            )
+            self.API_ENDPOINT_EXECUTION_LOG: str = (
+                f"/api/v1/{tenant}/logs/{{execution_id}}/download"
+            )
+            self.API_ENDPOINT_LOG_FOLLOW: str = (
+                f"/api/v1/{tenant}/logs/{{execution_id}}/follow"
+            )
+            self.API_ENDPOINT_EXECUTION_BULK: str = (
+                f"/api/v1/{tenant}/executions/{{action}}/{{target}}"
+            )
+            self.API_ENDPOINT_EXECUTION_FILE: str = (
+                f"/api/v1/{tenant}/executions/{{execution_id}}/file"
+            )
+        else:
+            self.API_ENDPOINT_EXECUTION_CREATE: str = (
+                "/api/v1/executions/{namespace}/{flow_id}"
+            )
+            self.API_ENDPOINT_EXECUTION_STATUS: str = (
+                "/api/v1/executions/{execution_id}"
+            )
+            self.API_ENDPOINT_EXECUTION_FOLLOW: str = (
+                "/api/v1/executions/{execution_id}/follow"
+            )
+            self.API_ENDPOINT_EXECUTION_SEARCH: str = "/api/v1/executions/search"
+            self.API_ENDPOINT_EXECUTION_LOG: str = (
+                "/api/v1/logs/{execution_id}/download"
+            )
+            self.API_ENDPOINT_LOG_FOLLOW: str = "/api/v1/logs/{execution_id}/follow"
+            self.API_ENDPOINT_EXECUTION_BULK: str = (
+                "/api/v1/executions/{action}/{target}"
+            )
+            self.API_ENDPOINT_EXECUTION_FILE: str = (
+                "/api/v1/executions/{execution_id}/file"
+            )
+
+    @property
+    def poll_interval(self) -> float | None:
+        """
+        The fixed polling interval, in seconds, or None. Setting it replaces the
+        `polling` strategy with a fixed one, or the adaptive default for None.
+        """
+        return self._poll_interval
+
+    @poll_interval.setter
+    def poll_interval(self, value: float | None) -> None:
+        self._poll_interval = value
+        if value is not None:
+            self.polling = PollingStrategy.fixed(value)
+        else:
+            self.polling = PollingStrategy()
+
+    def _authenticate(self, kwargs: dict) -> None:
+        """
+        Add the authentication to the arguments of a request, in the following
+        order:
+        1. If an API token is set, it is used.
+        2. If username and password are set, they are used.
+        3. If no authentication is set, the request is made without authentication
+            (not recommended).
+
+        Args:
+            kwargs (dict): The arguments of the request, updated in place.
+        """
+        if self.api_token is not None:
+            kwargs["headers"] = {
+                **kwargs.get("headers", {}),
+                "Authorization": f"Bearer {self.api_token}",
+            }
+        elif self.user is not None and self.password is not None:
+            kwargs["auth"] = (self.user, self.password)
+
+    def _retry_delay(
+        self, attempt: int, started: float, retry_after: str | None = None
+    ) -> float | None:
+        """
+        Get the delay before retrying a failed attempt, following the retry policy.
+
+        Args:
+            attempt (int): The number of the failed attempt, starting at 0.
+            started (float): The `time.monotonic()` of the first attempt.
+            retry_after (str): The `Retry-After` header of the response (optional).
+
+        Returns:
+            float | None: The delay in seconds, or None if the request must not be
+                retried anymore.
+        """
+        policy = self.retry_policy
+        if attempt + 1 >= policy.max_attempts:
+            return None
+
+        delay = policy.delay(attempt, retry_after)
+        if (
+            policy.deadline is not None
+            and time.monotonic() - started + delay > policy.deadline
+        ):
+            return None
+
+        return delay
+
+    def _record_outcome(self, url: str, status_code: int | None) -> None:
+        """
+        Report the outcome of a request to the circuit breaker, if any.
+
+        Args:
+            url (str): The URL of the request.
+            status_code (int): The status code of the response, or None if no
+                response was received.
+        """
+        if self.circuit_breaker is None:
+            return
+
+        host = urlsplit(url).netloc
+        if status_code is None or status_code >= 500:
+            self.circuit_breaker.record_failure(host)
+        else:
+            self.circuit_breaker.record_success(host)
+
+    def _report_request(
+        self,
+        endpoint: str | None,
+        method: str,
+        stats: dict,
+        duration: float,
+        stream: bool,
+    ) -> None:
+        """
+        Pass the measurements of a request to the instrumentation hooks.
+
+        Args:
+            endpoint (str): The API endpoint called (optional).
+            method (str): The HTTP method of the request.
+            stats (dict): The retries, status and response recorded by the request.
+            duration (float): The duration of the request, in seconds.
+            stream (bool): Whether the response is streamed, in which case its body
+                is not read to be measured.
+        """
+        response = stats["response"]
+        sent = received = 0
+        if response is not None:
+            sent = int(response.request.headers.get("Content-Length", 0))
+            if stream:
+                received = int(response.headers.get("Content-Length", 0))
+            else:
+                received = len(response.content)
+
+        try:
+            self.instrumentation.request(
+                endpoint or method.lower(),
+                method.upper(),
+                stats["status"],
+                duration,
+                stats["retries"],
+                sent,
+                received,
+            )
+        except Exception:
+            logging.exception("The request instrumentation failed")
+
+    def _report_wait(
+        self, execution_id: str, response: dict | None, started: float
+    ) -> None:
+        """
+        Pass the duration of the wait for an execution to the instrumentation hooks.
+
+        Args:
+            execution_id (str): The ID of the execution.
+            response (dict): The terminal state of the execution, or None if the
+                wait failed.
+            started (float): The `time.perf_counter()` the wait started at.
+        """
+        state = response["state"]["current"] if response is not None else None
+        try:
+            self.instrumentation.wait(
+                execution_id, state, time.perf_counter() - started
+            )
+        except Exception:
+            logging.exception("The wait instrumentation failed")
+
+    def _create_url(self, namespace: str, flow: str, inputs: dict) -> str:
+        """
+        Build the URL creating an execution, with the inputs as labels if
+        labels_from_inputs is True.
+        """
+        url = self.hostname + self.API_ENDPOINT_EXECUTION_CREATE.format(
+            namespace=namespace,
+            flow_id=flow,
+        )
+
+        if self.labels_from_inputs and len(inputs) > 0:
+            url += "?" + "&".join(
+                [f"labels={key}:{value}" for key, value in inputs.items()]
+            )
+
+        return url
+
+    @staticmethod
+    def _input_files(inputs: dict) -> dict:
+        """
+        Encode the inputs of an execution as multipart form fields.
+        """
+        files = {}
+
+        # If Tuples are passed, then it should be a File type
+        # for example - ('myfile', fileObject, 'application/json')
+        # If not, then it should be treated as a string
+        for k, v in inputs.items():
+            if isinstance(v, tuple):
+                files[k] = v
+            else:
+                files[k] = (None, str(v))
+
+        return files
+
+    def _log_path(self, execution_id: str) -> str:
+        """
+        Get the path where the logs of an execution are written, when log_dir is
+        set.
+        """
+        os.makedirs(self.log_dir, exist_ok=True)
+        return os.path.join(self.log_dir, f"{execution_id}.log")
+
+    @staticmethod
+    def _log_completion(
+        namespace: str | None, flow: str | None, inputs: dict, state: str, log: str
+    ) -> None:
+        """
+        Log the outcome of an execution at a level matching its terminal state.
+        """
+        level, outcome = _TERMINAL_STATES[state]
+
+        logging.log(
+            level,
+            "Execution of the flow %s in the namespace %s with parameters "
+            "%s %s \n%s",
+            flow,
+            namespace,
+            str(inputs),
+            outcome,
+            log,
+        )
+
+
+class Flow(_BaseFlow):
+    """
+    Execute a Kestra flow and optionally wait for its completion.
+
+    Example — trigger a flow and wait for its completion:
+        from kestra import Flow
+        flow = Flow()
+        flow.execute('mynamespace', 'myflow', {'param': 'value'})
+
+    Example — set labels from inputs:
+        from kestra import Flow
+        flow = Flow(labels_from_inputs=True)
+        flow.execute('mynamespace', 'myflow', {'param': 'value'})
+
+    Example — pass a text file to an input of type FILE named 'myfile':
+        from kestra import Flow
+        flow = Flow()
+        with open('example.txt', 'rb') as fh:
+            flow.execute(
+                'mynamespace',
+                'myflow',
+                {'files': ('myfile', fh, 'text/plain')}
+            )
+
+    Example — poll with a custom schedule and give up after 10 minutes:
+        from kestra import Flow, PollingStrategy
+        flow = Flow(polling=PollingStrategy(max_interval=30, timeout=600))
+        flow.execute('mynamespace', 'myflow', {'param': 'value'})
+
+    Example — wait through the execution event stream instead of polling:
+        from kestra import Flow
+        flow = Flow(follow=True)
+        flow.execute('mynamespace', 'myflow', {'param': 'value'})
+
+    Example — execute a flow for many sets of inputs, 16 at a time:
+        from kestra import Flow
+        flow = Flow()
+        inputs = ({'param': value} for value in range(1000))
+        for result in flow.execute_many('mynamespace', 'myflow', inputs, 16):
+            print(result.execution_id, result.status, result.error)
+
+    Example — start subflows, do some work, then collect their results:
+        from concurrent.futures import as_completed
+        from kestra import Flow
+        with Flow() as flow:
+            futures = [
+                flow.submit('mynamespace', 'myflow', {'param': value})
+                for value in range(10)
+            ]
+            do_some_work()
+            for future in as_completed(futures):
+                print(future.result().status)
+
+    Example — wait for an execution started earlier:
+        from kestra import Flow
+        flow = Flow(wait_for_completion=False)
+        execution = flow.execute('mynamespace', 'myflow')
+        ...
+        flow.wait(execution.execution_id)
+
+    Example — show the logs of the subflow live in the parent task:
+        from kestra import Flow
+        flow = Flow(tail_logs=True)
+        flow.execute('mynamespace', 'myflow', {'param': 'value'})
+
+    Example — fire and forget:
+        from kestra import Flow
+        flow = Flow(wait_for_completion=False)
+        flow.execute('mynamespace', 'myflow', {'param': 'value'})
+
+    Example — overwrite the username and password:
+        from kestra import Flow
+        flow = Flow()
+        flow.user = 'admin'
+        flow.password = 'admin'
+        flow.execute('mynamespace', 'myflow')
+
+    Example — set the hostname, username and password using environment variables:
+        from kestra import Flow
+        import os
+
+        os.environ["KESTRA_HOSTNAME"] = "http://localhost:8080"
+        os.environ["KESTRA_USER"] = "admin"
+        os.environ["KESTRA_PASSWORD"] = "admin"
+        flow = Flow()
+        flow.execute('mynamespace', 'myflow', {'param': 'value'})
+    """
+
+    def __init__(
+        self,
+        wait_for_completion: bool = True,
+        poll_interval: float | None = None,
+        labels_from_inputs: bool = False,
+        tenant: str | None = None,
+        polling: PollingStrategy | None = None,
+        follow: bool = False,
+        log_dir: str | None = None,
+        tail_logs: bool = False,
+        retry_policy: RetryPolicy | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        rate_limiter: RateLimiter | None = None,
+        stream_uploads: bool = False,
+        idempotency: IdempotencyStore | None = None,
+        instrumentation: Instrumentation | None = None,
+    ) -> None:
+        """
+        Initialize the Flow class.
+
+        The Flow class is used to execute a Kestra flow and optionally wait for its
+        completion. It can also be used to get the status of an execution and the
+        logs of an execution.
+
+        Args:
+            wait_for_completion (bool): Whether to wait for the flow to complete.
+                Default is True.
+            poll_interval (float): How often to poll the server for the status of the
+                flow, in seconds (optional). Shortcut for a fixed `PollingStrategy`.
+            labels_from_inputs (bool): Whether to use the inputs as execution label.
+                Default is False.
+            tenant (str): The tenant to use for the request (optional).
+            polling (PollingStrategy): The schedule used to poll the server while
+                waiting for the flow (optional). When neither `polling` nor
+                `poll_interval` is set, an adaptive `PollingStrategy()` is used.
+            follow (bool): Whether to wait for the flow by subscribing to the
+                execution event stream instead of polling. Dropped streams are
+                reconnected, and polling is used as a fallback. Default is False.
+            log_dir (str): A directory where the logs of the finished executions
+                are streamed to, one `<execution_id>.log` file per execution
+                (optional). When set, `FlowExecution.log_path` is filled instead of
+                `FlowExecution.log`, so that large logs are not held in memory.
+            tail_logs (bool): Whether to forward the logs of the execution to
+                `Kestra.logger()` while waiting for it, as they are produced.
+                Only the new log lines are transferred. Default is False.
+            retry_policy (RetryPolicy): How the requests are retried (optional).
+                Default is `RetryPolicy()`: up to 5 attempts with an exponential
+                backoff and full jitter.
+            circuit_breaker (CircuitBreaker): A circuit breaker failing fast when
+                the server is down (optional).
+            rate_limiter (RateLimiter): A rate limiter smoothing the requests
+                (optional). Share it between instances to limit the whole process.
+            stream_uploads (bool): Whether to stream the FILE inputs to the server,
+                reading the files chunk by chunk while sending them, instead of
+                building the request in memory. Default is False.
+            idempotency (IdempotencyStore): A store of the created executions
+                (optional). When set, executing a flow again with the same inputs
+                attaches to the recorded execution instead of creating a new one.
+            instrumentation (Instrumentation): Hooks receiving the latency, retries
+                and sizes of the requests, and the wait time of the executions
+                (optional), for example a `MetricsInstrumentation`. Default is None:
+                nothing is measured.
+
+        Attributes:
+            wait_for_completion (bool): Whether to wait for the flow to complete.
+            poll_interval (float): How often to poll the server for the status of
+                the flow, if a fixed interval was requested.
+            polling (PollingStrategy): The schedule used to poll the server.
+            follow (bool): Whether to wait for the flow through the event stream.
+            log_dir (str): The directory where the logs are written, if any.
+            tail_logs (bool): Whether to forward the logs while waiting.
+            retry_policy (RetryPolicy): How the requests are retried.
+            circuit_breaker (CircuitBreaker): The circuit breaker, if any.
+            rate_limiter (RateLimiter): The rate limiter, if any.
+            stream_uploads (bool): Whether to stream the FILE inputs.
+            idempotency (IdempotencyStore): The store of the created executions, if
+                any.
+            instrumentation (Instrumentation): The instrumentation hooks, if any.
+            follow_reconnects (int): How many times a dropped event stream is
+                reconnected before falling back to polling. Default is 3.
+            follow_read_timeout (float): How long the event stream may send nothing,
+                in seconds, before it is reconnected. It also detects half-open
+                connections. Default is 60.
+            max_concurrency (int): The maximum number of concurrent requests made
+                for the executions started with `submit`. Default is 8.
+            labels_from_inputs (bool): Whether to use the inputs as execution label.
+            user (str): The username to use for the request.
+                It is retrieved from the KESTRA_USER environment variable.
+            hostname (str): The hostname of the Kestra server.
+                It is retrieved from the KESTRA_HOSTNAME environment variable.
+            api_token (str): The API token to use for the request.
+                It is retrieved from the KESTRA_API_TOKEN environment variable.
+            API_ENDPOINT_EXECUTION_CREATE (str): The endpoint to create an execution.
+            API_ENDPOINT_EXECUTION_STATUS (str): The endpoint to get the status of an
+                execution.
+            API_ENDPOINT_EXECUTION_FOLLOW (str): The endpoint to follow the events
+                of an execution.
+            API_ENDPOINT_EXECUTION_SEARCH (str): The endpoint to search executions.
+            API_ENDPOINT_EXECUTION_LOG (str): The endpoint to get the logs of an
+                execution.
+            API_ENDPOINT_LOG_FOLLOW (str): The endpoint to follow the logs of an
+                execution.
+        """
+        import requests
+
+        super().__init__(
+            wait_for_completion,
+            poll_interval,
+            labels_from_inputs,
+            tenant,
+            polling,
+            log_dir,
+            retry_policy,
+            circuit_breaker,
+            rate_limiter,
+            instrumentation,
+        )
+        self.follow = follow
+        self.stream_uploads = stream_uploads
+        self.idempotency = idempotency
+        self.follow_reconnects = 3
+        self.follow_read_timeout = 60.0
+        self.tail_logs = tail_logs
+        self.max_concurrency = 8
+        self._session = requests.Session()
+        self._pool_size = requests.adapters.DEFAULT_POOLSIZE
+        self._executor: ThreadPoolExecutor | None = None
+        self._poller: ExecutionPoller | None = None
+        self._background_lock = threading.Lock()
+
+    def _ensure_pool_size(self, size: int) -> None:
+        """
+        Make sure the connection pool of the Flow can keep `size` connections open,
+        so that concurrent requests reuse their connections.
+
+        Args:
+            size (int): The number of concurrent requests.
+        """
+        import requests.adapters
+
+        if size > self._pool_size:
+            self._pool_size = size
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=size)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+
+    def _make_request(
+        self, method: str, url: str, endpoint: str | None = None, **kwargs
+    ) -> requests.Response:
+        """
+        Make a request to the Kestra server. Authentication is added in the following
+        order:
+        1. If an API token is set, it is used.
+        2. If username and password are set, they are used.
+        3. If no authentication is set, the request is made without authentication
+            (not recommended).
+
+        The request is retried following the `retry_policy` of the Flow. By default,
+        it is retried up to 5 times with an exponential backoff and full jitter, on
+        connection errors, timeouts and the following codes:
+        408: Request timeout
+        429: Too many requests
+        500: Internal server error
+        502: Bad gateway
+        503: Service unavailable
+        504: Gateway timeout
+
+        Every attempt waits for the `rate_limiter` of the Flow, if any. The request
+        is measured by the `instrumentation` of the Flow, if any.
+
+        Args:
+            method (str): The method to use for the request.
+            url (str): The URL of the Kestra server.
+            endpoint (str): The name of the API endpoint, used by the
+                instrumentation (optional).
+            kwargs (dict): Additional arguments to pass to the request.
+
+        Returns:
+            requests.Response: The response from the server.
+
+        Raises:
+            FailedExponentialBackoff: If the request still fails after the retries.
+            CircuitOpenError: If the circuit breaker of the Flow is open.
+        """
+        if self.instrumentation is None:
+            return self._retry_request(method, url, kwargs, {})
+
+        stats = {"retries": 0, "status": None, "response": None}
+        started = time.perf_counter()
+        try:
+            return self._retry_request(method, url, kwargs, stats)
+        finally:
+            self._report_request(
+                endpoint,
+                method,
+                stats,
+                time.perf_counter() - started,
+                kwargs.get("stream", False),
+            )
+
+    def _retry_request(
+        self, method: str, url: str, kwargs: dict, stats: dict
+    ) -> requests.Response:
+        """
+        Make a request following the retry policy, see `_make_request`.
+
+        Args:
+            method (str): The method to use for the request.
+            url (str): The URL of the Kestra server.
+            kwargs (dict): Additional arguments to pass to the request.
+            stats (dict): Updated with the number of `retries`, and the `status` and
+                `response` of the last attempt.
+
+        Returns:
+            requests.Response: The response from the server.
+        """
+        import requests
+
+        policy = self.retry_policy
+        retry_exceptions = policy.retry_exceptions or (
+            requests.ConnectionError,
+            requests.Timeout,
+        )
+        started = time.monotonic()
+        attempt = 0
+
+        while True:
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.check(urlsplit(url).netloc)
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(method)
+            self._authenticate(kwargs)
+
+            retry_after = None
+            stats["retries"] = attempt
+            try:
+                response = self._session.request(method, url, **kwargs)
+            except retry_exceptions as e:
+                self._record_outcome(url, None)
+                stats["status"] = None
+                error: Exception = e
+            else:
+                self._record_outcome(url, response.status_code)
+                stats["status"] = response.status_code
+                if response.status_code == 401:
+                    raise Exception(
+                        "Authentication required but not provided. Please set the "
+                        "username and password."
+                    )
+                elif response.status_code not in policy.retry_statuses:
+                    stats["response"] = response
+                    response.raise_for_status()
+                    return response
+
+                retry_after = response.headers.get("Retry-After")
+                error = requests.HTTPError(
+                    f"{response.status_code} {response.reason}", response=response
+                )
+                response.close()
+
+            delay = self._retry_delay(attempt, started, retry_after)
+            if delay is None:
+                raise FailedExponentialBackoff(
+                    f"Failed to make the request after {attempt + 1} attempts: {error}"
+                ) from error
+
+            time.sleep(delay)
+            attempt += 1
+
+    def check_status(self, execution_id: str) -> requests.Response:
+        """
+        Check the status of the execution
+
+        Args:
+            execution_id (str): The ID of the execution.
+
+        Returns:
+            requests.Response: The response from the server.
+        """
+        url = self.hostname + self.API_ENDPOINT_EXECUTION_STATUS.format(
+            execution_id=execution_id
+        )
+
+        return self._make_request("get", url, endpoint="status")
+
+    def get_logs(
+        self, execution_id: str, stream: bool = False
+    ) -> requests.Response | Iterator[str]:
+        """
+        Get the execution logs
+
+        Args:
+            execution_id (str): The ID of the execution.
+            stream (bool): Whether to stream the logs line by line instead of
+                downloading them at once. Default is False.
+
+        Returns:
+            requests.Response | Iterator[str]: The response from the server, or an
+                iterator over the lines of the logs if `stream` is True.
+        """
+        url = self.hostname + self.API_ENDPOINT_EXECUTION_LOG.format(
+            execution_id=execution_id
+        )
+
+        if stream:
+            return self._iter_lines(url)
+
+        return self._make_request("get", url, endpoint="logs")
+
+    def _iter_lines(self, url: str) -> Iterator[str]:
+        with self._make_request("get", url, endpoint="logs", stream=True) as response:
+            for line in response.iter_lines(chunk_size=_CHUNK_SIZE):
+                yield line.decode("utf-8", errors="replace")
+
+    def download_logs(self, execution_id: str, path: str) -> str:
+        """
+        Stream the execution logs to a file, with a bounded memory usage.
+
+        Args:
+            execution_id (str): The ID of the execution.
+            path (str): The path of the file to write.
+
+        Returns:
+            str: The path of the written file.
+        """
+        url = self.hostname + self.API_ENDPOINT_EXECUTION_LOG.format(
+            execution_id=execution_id
+        )
+
+        with self._make_request(
+            "get", url, endpoint="logs", stream=True
+        ) as response, open(path, "wb") as file:
+            for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+                file.write(chunk)
+
+        return path
+
+    def download_file(self, execution_id: str, uri: str, path: str) -> str:
+        """
+        Stream an output file of an execution to disk, without holding it in memory.
+
+        Args:
+            execution_id (str): The ID of the execution.
+            uri (str): The internal storage URI of the file, as found in the outputs
+                of the execution, for example `kestra:///company/team/...`.
+            path (str): The path of the file to write.
+
+        Returns:
+            str: The path of the written file.
+        """
+        url = self.hostname + self.API_ENDPOINT_EXECUTION_FILE.format(
+            execution_id=execution_id
+        )
+
+        with self._make_request(
+            "get", url, endpoint="file", params={"path": uri}, stream=True
+        ) as response, open(path, "wb") as file:
+            for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+                file.write(chunk)
+
+        return path
+
+    def download_files(
+        self,
+        execution_id: str,
+        files: Iterable[str] | dict[str, str],
+        directory: str | None = None,
+        max_concurrency: int = 4,
+    ) -> dict[str, str]:
+        """
+        Download several output files of an execution in parallel.
+
+        Args:
+            execution_id (str): The ID of the execution.
+            files (Iterable[str] | dict[str, str]): The internal storage URIs of the
+                files, or a dict of the paths to write them to, by URI.
+            directory (str): The directory the files are written to, under their
+                own name, when `files` are URIs only.
+            max_concurrency (int): The maximum number of concurrent downloads.
+                Default is 4.
+
+        Returns:
+            dict[str, str]: The paths of the written files, by URI.
+        """
+        if not isinstance(files, dict):
+            if directory is None:
+                raise ValueError("A directory is needed to download files by URI")
+            os.makedirs(directory, exist_ok=True)
+            files = {
+                uri: os.path.join(directory, uri.rsplit("/", 1)[-1]) for uri in files
+            }
+            if len(set(files.values())) < len(files):
+                raise ValueError(
+                    "Several files have the same name, pass the path of each file"
+                )
+
+        self._ensure_pool_size(max_concurrency)
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            futures = {
+                uri: executor.submit(self.download_file, execution_id, uri, path)
+                for uri, path in files.items()
+            }
+
+        return {uri: future.result() for uri, future in futures.items()}
+
+    def read_file(self, execution_id: str, uri: str) -> Iterator[dict[str, Any]]:
+        """
+        Read an Ion output file of an execution record by record, as it is
+        downloaded, with `Kestra.iter_read`.
+
+        Args:
+            execution_id (str): The ID of the execution.
+            uri (str): The internal storage URI of the file.
+
+        Returns:
+            Iterator[dict[str, Any]]: The records of the file.
+        """
+        url = self.hostname + self.API_ENDPOINT_EXECUTION_FILE.format(
+            execution_id=execution_id
+        )
+
+        with self._make_request(
+            "get", url, endpoint="file", params={"path": uri}, stream=True
+        ) as response:
+            response.raw.decode_content = True
+            yield from Kestra.iter_read(response.raw)
+
+    def follow_execution(
+        self, execution_id: str, read_timeout: float | None = None
+    ) -> Iterator[dict]:
+        """
+        Follow the events of an execution through the server-sent events stream.
+
+        Args:
+            execution_id (str): The ID of the execution.
+            read_timeout (float): How long to wait for the server, in seconds
+                (optional). When the stream sends nothing for that long, the
+                iteration raises a `requests.RequestException`. Default is no
+                timeout.
+
+        Returns:
+            Iterator[dict]: The successive states of the execution, as sent by the
+                server. The iterator ends when the server closes the stream.
+        """
+        url = self.hostname + self.API_ENDPOINT_EXECUTION_FOLLOW.format(
+            execution_id=execution_id
+        )
+
+        with self._make_request(
+            "get",
+            url,
+            endpoint="follow",
+            stream=True,
+            headers={"Accept": "text/event-stream"},
+            timeout=read_timeout,
+        ) as response:
+            for _, data in _iter_sse_events(response):
+                if data:
+                    yield json.loads(data)
+
+    def _wait_for_terminal(self, execution_id: str) -> dict:
+        """
+        Wait for an execution to reach a terminal state.
+
+        When `follow` is enabled, the execution event stream is used first, and
+        the status is polled following the `polling` strategy of the Flow if the
+        stream is not available. When `tail_logs` is enabled, the logs of the
+        execution are forwarded to `Kestra.logger()` meanwhile.
+
+        Args:
+            execution_id (str): The ID of the execution.
+
+        Returns:
+            dict: The last known state of the execution.
+
+        Raises:
+            ExecutionWaitTimeout: If the strategy timeout is exceeded.
+        """
+        deadline = None
+        if self.polling.timeout is not None:
+            deadline = time.monotonic() + self.polling.timeout
+
+        tailer = None
+        if self.tail_logs:
+            tailer = _LogTailer(self, execution_id)
+            tailer.start()
+
+        started = time.perf_counter()
+        response = None
+        try:
+            if self.follow:
+                response = self._follow_until_terminal(execution_id, deadline)
+
+            if response is None:
+                response = self._poll_until_terminal(execution_id, deadline)
+            return response
+        finally:
+            if tailer is not None:
+                tailer.stop()
+            if self.instrumentation is not None:
+                self._report_wait(execution_id, response, started)
+
+    def _follow_until_terminal(
+        self, execution_id: str, deadline: float | None
+    ) -> dict | None:
+        """
+        Follow the event stream of an execution until it reaches a terminal state.
+
+        Args:
+            execution_id (str): The ID of the execution.
+            deadline (float): The `time.monotonic()` deadline of the wait (optional).
+
+        The stream is read with a timeout of `follow_read_timeout`, bounded by the
+        time left before the deadline. A stream silent for that long is
+        reconnected, without counting as a drop.
+
+        Returns:
+            dict | None: The terminal state of the execution, or None if the stream
+                is not available or dropped more than `follow_reconnects` times.
+
+        Raises:
+            ExecutionWaitTimeout: If the deadline is exceeded.
+        """
+        import requests
+
+        def check_deadline() -> None:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise ExecutionWaitTimeout(
+                    f"Execution {execution_id} did not finish within "
+                    f"{self.polling.timeout} seconds"
+                )
+
+        attempt = 0
+        while attempt <= self.follow_reconnects:
+            read_timeout = self.follow_read_timeout
+            if deadline is not None:
+                read_timeout = max(0.01, min(read_timeout, deadline - time.monotonic()))
+            try:
+                for response in self.follow_execution(execution_id, read_timeout):
+                    state = (response.get("state") or {}).get("current")
+                    if state in _TERMINAL_STATES:
+                        return response
+                    check_deadline()
+            except requests.HTTPError as e:
+                logging.debug(
+                    "Following execution %s is not available, falling back to "
+                    "polling: %s",
+                    execution_id,
+                    e,
+                )
+                return None
+            except (requests.RequestException, FailedExponentialBackoff) as e:
+                check_deadline()
+                if _is_read_timeout(e):
+                    logging.debug(
+                        "Event stream of execution %s is silent, reconnecting",
+                        execution_id,
+                    )
+                    continue
+                logging.debug(
+                    "Event stream of execution %s dropped: %s", execution_id, e
+                )
+            else:
+                check_deadline()
+
+            attempt += 1
+            logging.debug(
+                "Reconnecting to the event stream of execution %s (%d/%d)",
+                execution_id,
+                attempt,
+                self.follow_reconnects,
+            )
+
+        logging.debug(
+            "Event stream of execution %s dropped too many times, falling back to "
+            "polling",
+            execution_id,
+        )
+        return None
+
+    def _poll_until_terminal(self, execution_id: str, deadline: float | None) -> dict:
+        """
+        Poll the status of an execution until it reaches a terminal state.
+
+        The delay between two checks follows the `polling` strategy of the Flow.
+
+        Args:
+            execution_id (str): The ID of the execution.
+            deadline (float): The `time.monotonic()` deadline of the wait (optional).
+
+        Returns:
+            dict: The last status response of the execution.
+
+        Raises:
+            ExecutionWaitTimeout: If the deadline is exceeded.
+        """
+        for interval in self.polling.intervals():
+            if deadline is not None:
+                interval = max(0, min(interval, deadline - time.monotonic()))
+
+            time.sleep(interval)
+
+            response = self.check_status(execution_id).json()
+            if response["state"]["current"] in _TERMINAL_STATES:
+                return response
+
+            if deadline is not None and time.monotonic() >= deadline:
+                raise ExecutionWaitTimeout(
+                    f"Execution {execution_id} did not finish within "
+                    f"{self.polling.timeout} seconds"
+                )
+
+    def _reusable(self, execution_id: str) -> dict | None:
+        """
+        Get a recorded execution if it can be attached to: it still exists, and did
+        not fail, was not killed nor cancelled. Otherwise return None.
+        """
+        import requests
+
+        try:
+            execution = self.check_status(execution_id).json()
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return None
+            raise
+
+        if execution["state"]["current"] in ("FAILED", "KILLED", "CANCELLED"):
+            return None
+        return execution
+
+    def _create_execution(self, namespace: str, flow: str, inputs: dict) -> dict:
+        """
+        Create an execution of a Kestra flow.
+
+        If the Flow has an `idempotency` store holding an execution of the flow with
+        the same inputs, that execution is returned instead, unless it failed, was
+        killed or was cancelled.
+
+        Args:
+            namespace (str): The namespace of the flow.
+            flow (str): The name of the flow.
+            inputs (dict): The inputs of the flow.
+
+        Returns:
+            dict: The created execution, as returned by the server.
+        """
+        logging.debug(
+            "Starting a flow %s in the namespace %s with parameters %s",
+            flow,
+            namespace,
+            str(inputs),
+        )
+
+        url = self._create_url(namespace, flow, inputs)
+
+        key = None
+        if self.idempotency is not None:
+            key = self.idempotency.key(url, inputs)
+            execution_id = self.idempotency.get(key) if key is not None else None
+            execution = self._reusable(execution_id) if execution_id else None
+            if execution is not None:
+                logging.info(
+                    "Attaching to the execution %s started with the same inputs",
+                    execution_id,
+                )
+                return execution
+
+        if len(inputs) > 0 and self.stream_uploads:
+            body = _MultipartEncoder(self._input_files(inputs))
+            response = self._make_request(
+                "post",
+                url,
+                endpoint="create",
+                data=body,
+                headers={"Content-Type": body.content_type},
+            ).json()
+        elif len(inputs) > 0:
+            files = self._input_files(inputs)
+            response = self._make_request(
+                "post", url, endpoint="create", files=files
+            ).json()
+        else:
+            response = self._make_request("post", url, endpoint="create").json()
+
+        if "id" not in response:
+            raise Exception("Starting execution failed: " + str(response))
+
+        if key is not None:
+            self.idempotency.put(key, response["id"])
+
+        logging.info(
+            "Successfully triggered the execution: %s/ui/executions/%s/%s/%s",
+            self.hostname,
+            namespace,
+            flow,
+            response["id"],
+        )
+
+        return response
+
+    def _complete(
+        self,
+        result: FlowExecution,
+        response: dict,
+        namespace: str,
+        flow: str,
+        inputs: dict,
+    ) -> FlowExecution:
+        """
+        Fill a FlowExecution from the terminal state of its execution.
+
+        Args:
+            result (FlowExecution): The execution to complete.
+            response (dict): The terminal state of the execution.
+            namespace (str): The namespace of the flow.
+            flow (str): The name of the flow.
+            inputs (dict): The inputs of the flow.
+
+        Returns:
+            FlowExecution: The completed execution.
+        """
+        if self.log_dir is not None:
+            result.log_path = self.download_logs(
+                result.execution_id, self._log_path(result.execution_id)
+            )
+            log = f"Logs written to {result.log_path}"
+        else:
+            result.log = str(self.get_logs(result.execution_id).text)
+            log = result.log
+
+        self._log_completion(namespace, flow, inputs, response["state"]["current"], log)
+        result.status = response["state"]["current"]
+        result.error = None
+        result.outputs = response.get("outputs")
+
+        return result
+
+    def execute(
+        self,
+        namespace: str,
+        flow: str,
+        inputs: dict = None,
+    ) -> FlowExecution:
+        """
+        Execute a Kestra flow and optionally wait for its completion.
+
+        The process is the following:
+        1. Create the execution
+        2. If wait_for_completion is True:
+            - Wait for the execution to entered finish state
+                (SUCCESS, WARNING, FAILED, KILLED, CANCELLED), polling the server
+                according to the `polling` strategy
+            - Get the logs of the execution
+            - Return the status, log and error of the execution
+        3. If wait_for_completion is False:
+            - Return a namedtuple with the status "STARTED"
+        4. If the execution fails, an exception is raised
+
+        Args:
+            namespace (str): The namespace of the flow.
+            flow (str): The name of the flow.
+            inputs (dict): The inputs of the flow.
+
+        Returns:
+            namedtuple: A namedtuple containing the status, log and error of the flow.
+        """
+        if inputs is None:
+            inputs = {}
+
+        execution_id = self._create_execution(namespace, flow, inputs)["id"]
+        result = FlowExecution(execution_id, None, None, None)
+
+        if self.wait_for_completion:
+            response = self._wait_for_terminal(execution_id)
+
+            return self._complete(result, response, namespace, flow, inputs)
+        else:
+            result.status = "STARTED"
+            result.log = None
+            result.error = None
+
+        return result
+
+    def execute_many(
+        self,
+        namespace: str,
+        flow: str,
+        inputs_iter: Iterable[dict],
+        max_concurrency: int = 8,
+        ordered: bool = False,
+    ) -> Iterator[FlowExecution]:
+        """
+        Execute a Kestra flow once per set of inputs, concurrently.
+
+        Executions are created by up to `max_concurrency` concurrent requests. If
+        wait_for_completion is True, they are all awaited by a single shared poller,
+        an ExecutionPoller refreshing them in batches.
+
+        A failure of one item does not abort the batch: the FlowExecution of that
+        item is yielded with its `error` set, and its `execution_id` set to None if
+        the execution could not be created.
+
+        Args:
+            namespace (str): The namespace of the flow.
+            flow (str): The name of the flow.
+            inputs_iter (Iterable[dict]): The inputs of each execution. It is
+                consumed lazily.
+            max_concurrency (int): The maximum number of concurrent requests.
+                Default is 8.
+            ordered (bool): Whether to yield the results in the order of the inputs
+                rather than as they complete. Default is False.
+
+        Returns:
+            Iterator[FlowExecution]: The result of each execution.
+        """
+        self._ensure_pool_size(max_concurrency)
+        slots = threading.BoundedSemaphore(max_concurrency)
+        completed: queue.SimpleQueue = queue.SimpleQueue()
+        # insertion-ordered, to yield the results in the order of the inputs
+        pending: dict[Future, None] = {}
+
+        def has_result() -> bool:
+            if ordered:
+                return len(pending) > 0 and next(iter(pending)).done()
+            return not completed.empty()
+
+        def take_result() -> FlowExecution:
+            future = next(iter(pending)) if ordered else completed.get()
+            del pending[future]
+            return future.result()
+
+        with ThreadPoolExecutor(max_concurrency) as executor, ExecutionPoller(
+            self, max_concurrency=max_concurrency
+        ) as poller:
+            for inputs in inputs_iter:
+                slots.acquire()
+                future = self._execute_async(
+                    namespace,
+                    flow,
+                    inputs or {},
+                    executor,
+                    poller,
+                    on_created=slots.release,
+                    collect_errors=True,
+                )
+                pending[future] = None
+                if not ordered:
+                    future.add_done_callback(completed.put)
+
+                while has_result():
+                    yield take_result()
+
+            while pending:
+                yield take_result()
+
+    def submit(
+        self,
+        namespace: str,
+        flow: str,
+        inputs: dict = None,
+    ) -> Future:
+        """
+        Execute a Kestra flow in the background.
+
+        The execution is created and, if wait_for_completion is True, awaited by the
+        poller shared by all the executions submitted through this Flow. The
+        calling thread is not blocked.
+
+        Args:
+            namespace (str): The namespace of the flow.
+            flow (str): The name of the flow.
+            inputs (dict): The inputs of the flow.
+
+        Returns:
+            Future: A `concurrent.futures.Future` of the FlowExecution. It raises the
+                error of the execution, if any.
+        """
+        executor, poller = self._background()
+        return self._execute_async(namespace, flow, inputs or {}, executor, poller)
+
+    def wait(self, execution_id: str) -> FlowExecution:
+        """
+        Wait for an existing execution to finish, whoever started it.
+
+        Args:
+            execution_id (str): The ID of the execution.
+
+        Returns:
+            FlowExecution: The status and log of the execution.
+        """
+        response = self._wait_for_terminal(execution_id)
+
+        return self._complete(
+            FlowExecution(execution_id, None, None, None),
+            response,
+            response.get("namespace"),
+            response.get("flowId"),
+            response.get("inputs") or {},
+        )
+
+    def kill_many(
+        self,
+        execution_ids: Iterable[str] | None = None,
+        query: dict | None = None,
+        chunk_size: int = 500,
+    ) -> int:
+        """
+        Kill many executions at once, with the bulk endpoints of the server.
+
+        The executions are either given by ID, sent `chunk_size` at a time, or
+        selected by a query on the server, in a single request.
+
+        Args:
+            execution_ids (Iterable[str]): The IDs of the executions (optional). It
+                is consumed lazily.
+            query (dict): The filters selecting the executions (optional), as
+                accepted by the executions search endpoint, for example
+                `{"namespace": "company.team", "state": ["RUNNING"]}`.
+            chunk_size (int): The maximum number of IDs per request. Default is 500.
+
+        Returns:
+            int: The number of executions killed, as counted by the server.
+        """
+        return self._bulk("delete", "kill", execution_ids, query, chunk_size)
+
+    def restart_many(
+        self,
+        execution_ids: Iterable[str] | None = None,
+        query: dict | None = None,
+        chunk_size: int = 500,
+    ) -> int:
+        """
+        Restart many failed executions at once. See `kill_many` for the arguments.
+
+        Returns:
+            int: The number of executions restarted, as counted by the server.
+        """
+        return self._bulk("post", "restart", execution_ids, query, chunk_size)
+
+    def replay_many(
+        self,
+        execution_ids: Iterable[str] | None = None,
+        query: dict | None = None,
+        chunk_size: int = 500,
+    ) -> int:
+        """
+        Replay many executions at once, each one creating a new execution. See
+        `kill_many` for the arguments.
+
+        Returns:
+            int: The number of executions replayed, as counted by the server.
+        """
+        return self._bulk("post", "replay", execution_ids, query, chunk_size)
+
+    def set_labels_many(
+        self,
+        labels: dict,
+        execution_ids: Iterable[str] | None = None,
+        query: dict | None = None,
+        chunk_size: int = 500,
+    ) -> int:
+        """
+        Set labels on many executions at once. See `kill_many` for the other
+        arguments.
+
+        Args:
+            labels (dict): The labels to set, by key.
+
+        Returns:
+            int: The number of executions labelled, as counted by the server.
+        """
+        body = [{"key": key, "value": str(value)} for key, value in labels.items()]
+        return self._bulk("post", "labels", execution_ids, query, chunk_size, body)
+
+    def _bulk(
+        self,
+        method: str,
+        action: str,
+        execution_ids: Iterable[str] | None,
+        query: dict | None,
+        chunk_size: int,
+        labels: list | None = None,
+    ) -> int:
+        """
+        Apply an action to many executions with the by-ids or by-query endpoints.
+
+        Args:
+            method (str): The HTTP method of the endpoints.
+            action (str): The action: kill, restart, replay or labels.
+            execution_ids (Iterable[str]): The IDs of the executions (optional).
+            query (dict): The filters selecting the executions (optional).
+            chunk_size (int): The maximum number of IDs per request.
+            labels (list): The labels set by the `labels` action (optional).
+
+        Returns:
+            int: The number of executions the action was applied to.
+        """
+        if (execution_ids is None) == (query is None):
+            raise ValueError("Either execution_ids or query must be given")
+
+        if query is not None:
+            url = self.hostname + self.API_ENDPOINT_EXECUTION_BULK.format(
+                action=action, target="by-query"
+            )
+            response = self._make_request(
+                method, url, endpoint="bulk", params=query, json=labels
+            )
+            return response.json().get("count", 0)
+
+        url = self.hostname + self.API_ENDPOINT_EXECUTION_BULK.format(
+            action=action, target="by-ids"
+        )
+        count = 0
+        execution_ids = iter(execution_ids)
+        while chunk := list(itertools.islice(execution_ids, chunk_size)):
+            if labels is not None:
+                body: Any = {"executionsId": chunk, "executionLabels": labels}
+            else:
+                body = chunk
+            response = self._make_request(method, url, endpoint="bulk", json=body)
+            count += response.json().get("count", 0)
+
+        return count
+
+    def close(self) -> None:
+        """
+        Release the threads and connections of the Flow. Executions submitted and
+        still being created or waited for are cancelled.
+        """
+        with self._background_lock:
+            executor, self._executor = self._executor, None
+            poller, self._poller = self._poller, None
+
+        if poller is not None:
+            poller.close()
+        if executor is not None:
+            executor.shutdown()
+        self._session.close()
+
+    def __enter__(self) -> "Flow":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _background(self) -> tuple[ThreadPoolExecutor, "ExecutionPoller"]:
+        """
+        Get the executor and poller of the executions submitted in the background,
+        creating them on first use.
+        """
+        with self._background_lock:
+            if self._executor is None:
+                self._ensure_pool_size(self.max_concurrency)
+                self._executor = ThreadPoolExecutor(
+                    self.max_concurrency, thread_name_prefix="kestra-flow"
+                )
+                self._poller = ExecutionPoller(
+                    self, max_concurrency=self.max_concurrency
+                )
+            return self._executor, self._poller
+
+    def _execute_async(
+        self,
+        namespace: str,
+        flow: str,
+        inputs: dict,
+        executor: ThreadPoolExecutor,
+        poller: "ExecutionPoller",
+        on_created: Callable[[], None] | None = None,
+        collect_errors: bool = False,
+    ) -> Future:
+        """
+        Create an execution in the background and, if wait_for_completion is True,
+        complete it once the poller sees it in a terminal state.
+
+        Args:
+            namespace (str): The namespace of the flow.
+            flow (str): The name of the flow.
+            inputs (dict): The inputs of the flow.
+            executor (ThreadPoolExecutor): The executor running the requests.
+            poller (ExecutionPoller): The poller waiting for the execution.
+            on_created (Callable): Called once the creation request is over
+                (optional).
+            collect_errors (bool): Whether to report failures in the `error` field
+                of the FlowExecution instead of raising them. Default is False.
+
+        Returns:
+            Future: A future of the FlowExecution.
+        """
+        result: Future = Future()
+
+        def fail(execution_id: str | None, error: Exception) -> None:
+            if collect_errors:
+                result.set_result(FlowExecution(execution_id, None, None, str(error)))
+            else:
+                result.set_exception(error)
+
+        def complete(execution_id: str, tracked: Future, started: float) -> None:
+            if self.instrumentation is not None:
+                # a wait cancelled by close() has no exception() but raises it
+                failed = tracked.cancelled() or tracked.exception() is not None
+                response = None if failed else tracked.result()
+                self._report_wait(execution_id, response, started)
+
+            try:
+                result.set_result(
+                    self._complete(
+                        FlowExecution(execution_id, None, None, None),
+                        tracked.result(),
+                        namespace,
+                        flow,
+                        inputs,
+                    )
+                )
+            except Exception as e:
+                fail(execution_id, e)
+
+        def created(creation: Future) -> None:
+            if on_created is not None:
+                on_created()
+
+            try:
+                execution = creation.result()
+            except Exception as e:
+                return fail(None, e)
+            execution_id = execution["id"]
+
+            if not self.wait_for_completion:
+                return result.set_result(
+                    FlowExecution(execution_id, "STARTED", None, None)
+                )
+
+            started = time.perf_counter()
+            try:
+                tracked = poller.track(
+                    execution_id,
+                    namespace,
+                    flow,
+                    execution.get("state", {}).get("startDate"),
+                )
+            except RuntimeError:
+                # the Flow was closed while the execution was being created, it is
+                # cancelled like the executions being waited for
+                result.cancel()
+                return
+            tracked.add_done_callback(
+                lambda tracked: executor.submit(
+                    complete, execution_id, tracked, started
+                )
+            )
+
+        executor.submit(
+            self._create_execution, namespace, flow, inputs
+        ).add_done_callback(created)
+
+        return result
+
+
+class _LogTailer:
+    """
+    Forward the logs of an execution to `Kestra.logger()` as they are produced,
+    from the logs event stream.
+
+    The server replays the logs from the start on each connection, so `offset`
+    counts the log entries already forwarded: a dropped stream is reconnected up
+    to `follow_reconnects` times without forwarding any line twice, and the total
+    transfer stays linear in the size of the logs.
+    """
+
+    # Kestra log levels mapped to the levels of the logging module
+    _LEVELS = {
+        "TRACE": logging.DEBUG,
+        "DEBUG": logging.DEBUG,
+        "INFO": logging.INFO,
+        "WARN": logging.WARNING,
+        "ERROR": logging.ERROR,
+    }
+
+    def __init__(self, flow: Flow, execution_id: str) -> None:
+        self.offset = 0
+        self._flow = flow
+        self._execution_id = execution_id
+        self._stopped = threading.Event()
+        # set on every line received, and when the tailing ends
+        self._received = threading.Event()
+        self._response: requests.Response | None = None
+        self._thread = threading.Thread(
+            target=self._run, name=f"kestra-logs-{execution_id}", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self, grace: float = 1.0, quiet: float = 0.1) -> None:
+        """
+        Stop tailing. The last lines sent by the server are still forwarded while
+        they keep arriving, for up to `grace` seconds: the stream is closed once
+        it stays silent for `quiet` seconds, unless the server closed it first.
+        """
+        for _ in range(math.ceil(grace / quiet)):
+            self._received.clear()
+            if not self._thread.is_alive() or not self._received.wait(quiet):
+                break
+
+        self._stopped.set()
+        if self._response is not None:
+            self._interrupt(self._response)
+        self._thread.join(quiet)
+
+    @staticmethod
+    def _interrupt(response: requests.Response) -> None:
+        """
+        Stop the reads of a streamed response made by another thread.
+        """
+        # closing the response would wait for the read in progress to return, so
+        # the socket is shut down instead, and the reading thread closes it
+        connection = getattr(response.raw, "connection", None)
+        sock = getattr(connection, "sock", None)
+        if sock is None:
+            response.close()
+            return
+        with contextlib.suppress(OSError):
+            sock.shutdown(socket.SHUT_RDWR)
+
+    def _run(self) -> None:
+        try:
+            self._tail()
+        finally:
+            self._received.set()
+
+    def _tail(self) -> None:
+        import requests
+
+        url = self._flow.hostname + self._flow.API_ENDPOINT_LOG_FOLLOW.format(
+            execution_id=self._execution_id
+        )
+
+        for _ in range(self._flow.follow_reconnects + 1):
+            index = 0
+            try:
+                with self._flow._make_request(
+                    "get",
+                    url,
+                    endpoint="logs_follow",
+                    stream=True,
+                    headers={"Accept": "text/event-stream"},
+                ) as response:
+                    self._response = response
+                    for _, data in _iter_sse_events(response):
+                        if self._stopped.is_set():
+                            return
+                        if index >= self.offset:
+                            self._forward(json.loads(data))
+                            self.offset += 1
+                            self._received.set()
+                        index += 1
+                # the server closed the stream
+                return
+            except requests.HTTPError as e:
+                logging.debug(
+                    "Logs of execution %s are not available: %s", self._execution_id, e
+                )
+                return
+            except Exception as e:
+                if self._stopped.is_set():
+                    return
+                logging.debug(
+                    "Logs stream of execution %s dropped: %s", self._execution_id, e
+                )
+
+    def _forward(self, entry: dict) -> None:
+        message = entry.get("message")
+        if message is None:
+            return
+
+        if entry.get("taskId"):
+            message = f"[{entry['taskId']}] {message}"
+
+        Kestra.logger().log(
+            self._LEVELS.get(entry.get("level"), logging.INFO), "%s", message
+        )
+
+
+class ExecutionPoller:
+    """
+    Wait for many executions with a single polling loop.
+
+    All the tracked executions are refreshed once per interval of the `polling`
+    strategy of the Flow:
+    - an execution tracked without its flow and start date is first checked on its
+      own, which resolves it if it is already finished and tells them,
+    - then the executions of a same flow are refreshed together through the
+      executions search API, listing the finished executions of the flow, the
+      most recently ended first, by pages of `batch_size`. The listing stops at
+      the executions that ended before the tracked ones started, and at
+      `max_pages` pages per refresh: the next refresh resumes where it stopped, so
+      that the request rate stays constant whatever the number of executions.
+    If the search API is not available, each execution is checked on its own, with
+    at most `max_concurrency` concurrent requests.
+
+    Example - wait for executions created elsewhere:
+        from kestra import ExecutionPoller, Flow
+        with ExecutionPoller(Flow()) as poller:
+            futures = [poller.track(execution_id) for execution_id in ids]
+            for future in futures:
+                print(future.result()["state"]["current"])
+    """
+
+    def __init__(
+        self,
+        flow: Flow,
+        batch_size: int = 100,
+        max_concurrency: int = 8,
+        max_pages: int = 10,
+    ) -> None:
+        """
+        Args:
+            flow (Flow): The Flow used to make the requests. Its `polling` strategy
+                sets the interval between two refreshes, and the timeout of each
+                wait.
+            batch_size (int): The page size of the search requests. Default is 100.
+            max_concurrency (int): The maximum number of concurrent requests when
+                checking executions on their own. Default is 8.
+            max_pages (int): The maximum number of search requests per flow and
+                refresh. Default is 10.
+        """
+        self._flow = flow
+        self._batch_size = batch_size
+        self._max_concurrency = max_concurrency
+        self._max_pages = max_pages
+        # (namespace, flow id) -> page the next search resumes at
+        self._pages: dict[tuple[str, str], int] = {}
+        self._search_available = True
+        self._tracked: dict[str, tuple[Future, float | None]] = {}
+        # (namespace, flow id, start date) of the executions checked once
+        self._origins: dict[str, tuple[str, str, datetime]] = {}
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread: threading.Thread | None = None
+        self._executor: ThreadPoolExecutor | None = None
+
+    def __enter__(self) -> "ExecutionPoller":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def track(
+        self,
+        execution_id: str,
+        namespace: str | None = None,
+        flow_id: str | None = None,
+        start_date: str | None = None,
+    ) -> Future:
+        """
+        Start waiting for an execution. Cancelling the returned future stops
+        waiting for it.
+
+        When the namespace, flow and start date of the execution are given, it is
+        refreshed through the search API from the start, rather than first checked
+        on its own.
+
+        Args:
+            execution_id (str): The ID of the execution.
+            namespace (str): The namespace of its flow (optional).
+            flow_id (str): The ID of its flow (optional).
+            start_date (str): Its start date, in ISO 8601 format (optional).
+
+        Returns:
+            Future: A future of the terminal state of the execution. It fails with
+                ExecutionWaitTimeout if the timeout of the `polling` strategy is
+                exceeded.
+        """
+        future: Future = Future()
+        deadline = None
+        if self._flow.polling.timeout is not None:
+            deadline = time.monotonic() + self._flow.polling.timeout
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The poller is closed")
+
+            self._tracked[execution_id] = (future, deadline)
+            if namespace and flow_id and start_date:
+                self._remember(
+                    execution_id,
+                    {
+                        "namespace": namespace,
+                        "flowId": flow_id,
+                        "state": {"startDate": start_date},
+                    },
+                )
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="kestra-poller", daemon=True
+                )
+                self._thread.start()
+            elif len(self._tracked) == 1:
+                self._condition.notify()
+
+        return future
+
+    def close(self) -> None:
+        """
+        Stop the poller, cancelling the executions still being waited for.
+        """
+        with self._condition:
+            self._closed = True
+            tracked, self._tracked = self._tracked, {}
+            self._condition.notify()
+
+        for future, _ in tracked.values():
+            future.cancel()
+        if self._thread is not None:
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def _run(self) -> None:
+        intervals = None
+
+        while True:
+            with self._condition:
+                while not self._tracked and not self._closed:
+                    # restart the polling schedule on the next tracked execution
+                    intervals = None
+                    self._condition.wait()
+                if intervals is None:
+                    intervals = self._flow.polling.intervals()
+                if not self._closed:
+                    self._condition.wait(next(intervals))
+                if self._closed:
+                    return
+
+                for execution_id, (future, _) in list(self._tracked.items()):
+                    if future.cancelled():
+                        del self._tracked[execution_id]
+                        self._origins.pop(execution_id, None)
+                execution_ids = list(self._tracked)
+
+            responses = self._refresh(execution_ids)
+
+            with self._condition:
+                now = time.monotonic()
+                for execution_id, response in responses.items():
+                    if isinstance(response, Exception):
+                        self._resolve(execution_id, exception=response)
+                    elif response["state"]["current"] in _TERMINAL_STATES:
+                        self._resolve(execution_id, result=response)
+
+                for execution_id, (_, deadline) in list(self._tracked.items()):
+                    if deadline is not None and now >= deadline:
+                        self._resolve(
+                            execution_id,
+                            exception=ExecutionWaitTimeout(
+                                f"Execution {execution_id} did not finish within "
+                                f"{self._flow.polling.timeout} seconds"
+                            ),
+                        )
+
+    def _resolve(
+        self,
+        execution_id: str,
+        result: dict | None = None,
+        exception: Exception | None = None,
+    ) -> None:
+        self._origins.pop(execution_id, None)
+        tracked = self._tracked.pop(execution_id, None)
+        if tracked is None or not tracked[0].set_running_or_notify_cancel():
+            return
+
+        if exception is not None:
+            tracked[0].set_exception(exception)
+        else:
+            tracked[0].set_result(result)
+
+    def _refresh(self, execution_ids: list[str]) -> dict[str, dict | Exception]:
+        """
+        Get the current state of executions.
+
+        Args:
+            execution_ids (list[str]): The IDs of the executions.
+
+        Returns:
+            dict[str, dict | Exception]: The state of the executions found, or the
+                error raised while checking them on their own. Executions not found
+                in a search are still running.
+        """
+        import requests
+
+        responses: dict[str, dict | Exception] = {}
+        unknown = []
+        flows: dict[tuple[str, str], list[str]] = {}
+
+        for execution_id in execution_ids:
+            origin = self._origins.get(execution_id)
+            if origin is None or not self._search_available:
+                unknown.append(execution_id)
+            else:
+                flows.setdefault(origin[:2], []).append(execution_id)
+
+        for (namespace, flow_id), ids in flows.items():
+            try:
+                responses.update(self._search(namespace, flow_id, ids))
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code in {
+                    400,
+                    404,
+                    405,
+                }:
+                    logging.debug(
+                        "The executions search API is not available, checking "
+                        "executions one by one: %s",
+                        e,
+                    )
+                    self._search_available = False
+                unknown.extend(ids)
+            except Exception as e:
+                logging.debug("Searching executions failed: %s", e)
+                unknown.extend(ids)
+
+        for execution_id, response in self._check(unknown).items():
+            responses[execution_id] = response
+            if not isinstance(response, Exception):
+                self._remember(execution_id, response)
+
+        return responses
+
+    def _remember(self, execution_id: str, response: dict) -> None:
+        """
+        Keep the flow and start date of an execution, so that it can be refreshed
+        through the search API.
+        """
+        import dateutil.parser
 
-    def format(self, record: logging.LogRecord) -> str:
-        result = {
-            "logs": [
-                {
-                    "level": self._logger_level(record.levelno),
-                    "message": self._formatter.format(record),
-                }
-            ]
-        }
+        try:
+            self._origins[execution_id] = (
+                response["namespace"],
+                response["flowId"],
+                dateutil.parser.isoparse(response["state"]["startDate"]),
+            )
+        except (KeyError, TypeError, ValueError):
+            pass
 
-        return Kestra.format(result)
+    def _search(
+        self, namespace: str, flow_id: str, execution_ids: list[str]
+    ) -> dict[str, dict]:
+        """
+        Find which executions of a flow are finished through the search API.
 
+        Args:
+            namespace (str): The namespace of the flow.
+            flow_id (str): The ID of the flow.
+            execution_ids (list[str]): The IDs of the executions of the flow.
 
-class Flow:
-    """
-    Execute a Kestra flow and optionally wait for its completion.
+        Returns:
+            dict[str, dict]: The state of the finished executions found.
+        """
+        url = self._flow.hostname + self._flow.API_ENDPOINT_EXECUTION_SEARCH
+        since = min(self._origins[execution_id][2] for execution_id in execution_ids)
+        remaining = set(execution_ids)
+        found = {}
+        # the first page holds the executions that ended last, then the listing
+        # resumes where the previous refresh stopped
+        pages = itertools.chain(
+            [1], itertools.count(self._pages.pop((namespace, flow_id), 2))
+        )
 
-    Example — trigger a flow and wait for its completion:
-        from kestra import Flow
-        flow = Flow()
-        flow.execute('mynamespace', 'myflow', {'param': 'value'})
+        for _, page in zip(range(self._max_pages), pages):
+            response = self._flow._make_request(
+                "get",
+                url,
+                endpoint="search",
+                params=[
+                    ("namespace", namespace),
+                    ("flowId", flow_id),
+                    ("startDate", since.isoformat()),
+                    ("sort", "state.endDate:desc"),
+                    ("size", self._batch_size),
+                    ("page", page),
+                ]
+                + [("state", state) for state in _TERMINAL_STATES],
+            ).json()
 
-    Example — set labels from inputs:
-        from kestra import Flow
-        flow = Flow(labels_from_inputs=True)
-        flow.execute('mynamespace', 'myflow', {'param': 'value'})
+            ended = []
+            for execution in response.get("results", []):
+                if execution.get("id") in remaining:
+                    remaining.discard(execution["id"])
+                    found[execution["id"]] = execution
+                ended.append(execution.get("state", {}).get("endDate"))
 
-    Example — pass a text file to an input of type FILE named 'myfile':
-        from kestra import Flow
-        flow = Flow()
-        with open('example.txt', 'rb') as fh:
-            flow.execute(
-                'mynamespace',
-                'myflow',
-                {'files': ('myfile', fh, 'text/plain')}
-            )
+            if not remaining or page * self._batch_size >= response.get("total", 0):
+                return found
+            if self._ended_before(ended, remaining):
+                # the next executions ended before any remaining one started
+                return found
 
-    Example — fire and forget:
-        from kestra import Flow
-        flow = Flow(wait_for_completion=False)
-        flow.execute('mynamespace', 'myflow', {'param': 'value'})
+        # resume at the next page on the next refresh
+        self._pages[(namespace, flow_id)] = page + 1
+        return found
 
-    Example — overwrite the username and password:
-        from kestra import Flow
-        flow = Flow()
-        flow.user = 'admin'
-        flow.password = 'admin'
-        flow.execute('mynamespace', 'myflow')
+    def _ended_before(self, ended: list[str | None], execution_ids: set[str]) -> bool:
+        """
+        Whether one of the end dates of a page is before the start of all the
+        executions.
+        """
+        import dateutil.parser
 
-    Example — set the hostname, username and password using environment variables:
-        from kestra import Flow
-        import os
+        try:
+            oldest = min(dateutil.parser.isoparse(date) for date in ended if date)
+            return oldest < min(self._origins[id_][2] for id_ in execution_ids)
+        except (TypeError, ValueError):
+            return False
 
-        os.environ["KESTRA_HOSTNAME"] = "http://localhost:8080"
-        os.environ["KESTRA_USER"] = "admin"
-        os.environ["KESTRA_PASSWORD"] = "admin"
-        flow = Flow()
-        flow.execute('mynamespace', 'myflow', {'param': 'value'})
+    def _check(self, execution_ids: list[str]) -> dict[str, dict | Exception]:
+        """
+        Get the current state of executions, one request per execution.
+
+        Args:
+            execution_ids (list[str]): The IDs of the executions.
+
+        Returns:
+            dict[str, dict | Exception]: The state of each execution, or the error
+                raised while getting it.
+        """
+
+        def check(execution_id: str) -> dict | Exception:
+            try:
+                return self._flow.check_status(execution_id).json()
+            except Exception as e:
+                return e
+
+        if not execution_ids:
+            return {}
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self._max_concurrency)
+
+        return dict(zip(execution_ids, self._executor.map(check, execution_ids)))
+
+
+class AsyncFlow(_BaseFlow):
+    """
+    Execute a Kestra flow from asyncio code and optionally await its completion.
+
+    AsyncFlow has the same settings as Flow, but its requests go through a pooled
+    `httpx.AsyncClient` and it waits with `asyncio.sleep`, so that many executions
+    can be awaited concurrently from a single thread. It requires the `httpx`
+    package: `pip install kestra[async]`.
+
+    Cancelling a task awaiting `execute` stops waiting for the execution and
+    raises `asyncio.CancelledError`; the execution itself keeps running on the
+    server.
+
+    Example — trigger flows concurrently and await their completion:
+        import asyncio
+        from kestra import AsyncFlow
+
+        async def main():
+            async with AsyncFlow() as flow:
+                return await asyncio.gather(
+                    *(
+                        flow.execute('mynamespace', 'myflow', {'param': value})
+                        for value in range(100)
+                    )
+                )
+
+        asyncio.run(main())
     """
 
     def __init__(
         self,
         wait_for_completion: bool = True,
-        poll_interval: int = 1,
+        poll_interval: float | None = None,
         labels_from_inputs: bool = False,
         tenant: str | None = None,
+        polling: PollingStrategy | None = None,
+        log_dir: str | None = None,
+        retry_policy: RetryPolicy | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        rate_limiter: RateLimiter | None = None,
+        instrumentation: Instrumentation | None = None,
+        client: "httpx.AsyncClient | None" = None,
     ) -> None:
         """
-        Initialize the Flow class.
-
-        The Flow class is used to execute a Kestra flow and optionally wait for its
-        completion. It can also be used to get the status of an execution and the
-        logs of an execution.
+        Initialize the AsyncFlow class.
 
         Args:
             wait_for_completion (bool): Whether to wait for the flow to complete.
                 Default is True.
-            poll_interval (int): How often to poll the server for the status of the
-                flow. Default is 1 second.
+            poll_interval (float): How often to poll the server for the status of the
+                flow, in seconds (optional). Shortcut for a fixed `PollingStrategy`.
             labels_from_inputs (bool): Whether to use the inputs as execution label.
                 Default is False.
             tenant (str): The tenant to use for the request (optional).
+            polling (PollingStrategy): The schedule used to poll the server while
+                waiting for the flow (optional). When neither `polling` nor
+                `poll_interval` is set, an adaptive `PollingStrategy()` is used.
+            log_dir (str): A directory where the logs of the finished executions
+                are streamed to (optional). See `Flow.__init__`.
+            retry_policy (RetryPolicy): How the requests are retried (optional).
+            circuit_breaker (CircuitBreaker): A circuit breaker failing fast when
+                the server is down (optional).
+            rate_limiter (RateLimiter): A rate limiter smoothing the requests
+                (optional). It can be shared with Flow instances.
+            instrumentation (Instrumentation): Hooks measuring the requests and
+                waits (optional). See `Flow.__init__`.
+            client (httpx.AsyncClient): The client used to make the requests
+                (optional). By default, a client owned by the AsyncFlow is created.
 
         Attributes:
-            wait_for_completion (bool): Whether to wait for the flow to complete.
-            poll_interval (int): How often to poll the server for the status of the
-                flow.
-            labels_from_inputs (bool): Whether to use the inputs as execution label.
-            user (str): The username to use for the request.
-                It is retrieved from the KESTRA_USER environment variable.
-            hostname (str): The hostname of the Kestra server.
-                It is retrieved from the KESTRA_HOSTNAME environment variable.
-            api_token (str): The API token to use for the request.
-                It is retrieved from the KESTRA_API_TOKEN environment variable.
-            API_ENDPOINT_EXECUTION_CREATE (str): The endpoint to create an execution.
-            API_ENDPOINT_EXECUTION_STATUS (str): The endpoint to get the status of an
-                execution.
-            API_ENDPOINT_EXECUTION_LOG (str): The endpoint to get the logs of an
-                execution.
+            See `Flow.__init__`.
         """
-        self.wait_for_completion = wait_for_completion
-        self.poll_interval = poll_interval
-        self.labels_from_inputs = labels_from_inputs
-        self.user = os.environ.get("KESTRA_USER", None)
-        self.hostname = os.environ.get("KESTRA_HOSTNAME", "http://localhost:8080")
-        self.api_token = os.environ.get("KESTRA_API_TOKEN", None)
+        try:
+            import httpx
+        except ImportError as e:
+            raise ImportError(
+                "AsyncFlow requires the httpx package, install it with "
+                "`pip install kestra[async]`"
+            ) from e
 
-        if tenant is not None:
-            self.API_ENDPOINT_EXECUTION_CREATE: str = (
-                f"/api/v1/{tenant}/executions/{{namespace}}/{{flow_id}}"
-            )
-            self.API_ENDPOINT_EXECUTION_STATUS: str = (
-                f"/api/v1/{tenant}/executions/{{execution_id}}"
-            )
-            self.API_ENDPOINT_EXECUTION_LOG: str = (
-                f"/api/v1/{tenant}/logs/{{execution_id}}/download"
-            )
-        else:
-            self.API_ENDPOINT_EXECUTION_CREATE: str = (
-                "/api/v1/executions/{namespace}/{flow_id}"
-            )
-            self.API_ENDPOINT_EXECUTION_STATUS: str = (
-                "/api/v1/executions/{execution_id}"
-            )
-            self.API_ENDPOINT_EXECUTION_LOG: str = (
-                "/api/v1/logs/{execution_id}/download"
-            )
+        super().__init__(
+            wait_for_completion,
+            poll_interval,
+            labels_from_inputs,
+            tenant,
+            polling,
+            log_dir,
+            retry_policy,
+            circuit_breaker,
+            rate_limiter,
+            instrumentation,
+        )
+        self._owns_client = client is None
+        self._client = client or httpx.AsyncClient(timeout=None)
 
-    def _make_request(self, method: str, url: str, **kwargs) -> requests.Response:
+    async def aclose(self) -> None:
         """
-        Make a request to the Kestra server. Authentication is added in the following
-        order:
-        1. If an API token is set, it is used.
-        2. If username and password are set, they are used.
-        3. If no authentication is set, the request is made without authentication
-            (not recommended).
+        Close the HTTP client of the AsyncFlow, if it owns it.
+        """
+        if self._owns_client:
+            await self._client.aclose()
 
-        The request is retried up to 5 times with an exponential backoff. The retry
-        codes are:
-        408: Request timeout
-        429: Too many requests
-        500: Internal server error
-        502: Bad gateway
-        503: Service unavailable
-        504: Gateway timeout
+    async def __aenter__(self) -> "AsyncFlow":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def _throttle(self, method: str) -> None:
+        """
+        Wait for the rate limiter, if any, without blocking the event loop.
+
+        Args:
+            method (str): The HTTP method of the request.
+        """
+        import asyncio
+
+        if self.rate_limiter is not None:
+            delay = self.rate_limiter.reserve(method)
+            if delay:
+                await asyncio.sleep(delay)
+
+    async def _make_request(
+        self, method: str, url: str, endpoint: str | None = None, **kwargs
+    ) -> "httpx.Response":
+        """
+        Make a request to the Kestra server, with the same authentication, retries,
+        circuit breaker, rate limiter and instrumentation as `Flow._make_request`.
 
         Args:
             method (str): The method to use for the request.
             url (str): The URL of the Kestra server.
-            kwargs (dict): Additional arguments to pass to the request.
+            endpoint (str): The name of the API endpoint, used by the
+                instrumentation (optional).
+            kwargs (dict): Additional arguments to pass to the request. With
+                `stream=True`, the body of the response is not read, and the caller
+                must close the response with `aclose()`.
 
         Returns:
-            requests.Response: The response from the server.
+            httpx.Response: The response from the server.
         """
-        retries = 5
-        retry_codes = {
-            408,
-            429,
-            500,
-            502,
-            503,
-            504,
-        }
+        stream = kwargs.pop("stream", False)
+        if self.instrumentation is None:
+            return await self._retry_request(method, url, kwargs, {}, stream)
 
-        for i in range(retries):
-            if self.api_token is not None:
-                kwargs["headers"] = {"Authorization": f"Bearer {self.api_token}"}
-            elif self.user is not None and self.password is not None:
-                kwargs["auth"] = (self.user, self.password)
-
-            response = requests.request(method, url, **kwargs)
-            if response.status_code == 401:
-                raise Exception(
-                    "Authentication required but not provided. Please set the username "
-                    "and password."
-                )
-            elif response.status_code in retry_codes:
-                time.sleep(2**i)
-                continue
+        stats = {"retries": 0, "status": None, "response": None}
+        started = time.perf_counter()
+        try:
+            return await self._retry_request(method, url, kwargs, stats, stream)
+        finally:
+            self._report_request(
+                endpoint, method, stats, time.perf_counter() - started, stream
+            )
 
-            response.raise_for_status()
-            return response
+    async def _retry_request(
+        self, method: str, url: str, kwargs: dict, stats: dict, stream: bool = False
+    ) -> "httpx.Response":
+        """
+        Make a request following the retry policy, see `Flow._retry_request`. A
+        streamed response is closed unless it is returned.
+        """
+        import asyncio
 
-        raise FailedExponentialBackoff("Failed to make the request after 5 retries")
+        import httpx
 
-    def check_status(self, execution_id: str) -> requests.Response:
+        policy = self.retry_policy
+        retry_exceptions = policy.retry_exceptions or (httpx.TransportError,)
+        started = time.monotonic()
+        attempt = 0
+
+        while True:
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.check(urlsplit(url).netloc)
+            await self._throttle(method)
+            self._authenticate(kwargs)
+
+            retry_after = None
+            stats["retries"] = attempt
+            try:
+                if stream:
+                    auth = kwargs.pop("auth", httpx.USE_CLIENT_DEFAULT)
+                    request = self._client.build_request(method, url, **kwargs)
+                    response = await self._client.send(request, auth=auth, stream=True)
+                else:
+                    response = await self._client.request(method, url, **kwargs)
+            except retry_exceptions as e:
+                self._record_outcome(url, None)
+                stats["status"] = None
+                error: Exception = e
+            else:
+                self._record_outcome(url, response.status_code)
+                stats["status"] = response.status_code
+                if stream and response.is_error:
+                    await response.aclose()
+                if response.status_code == 401:
+                    raise Exception(
+                        "Authentication required but not provided. Please set the "
+                        "username and password."
+                    )
+                elif response.status_code not in policy.retry_statuses:
+                    stats["response"] = response
+                    response.raise_for_status()
+                    return response
+
+                retry_after = response.headers.get("Retry-After")
+                error = Exception(f"{response.status_code} {response.reason_phrase}")
+
+            delay = self._retry_delay(attempt, started, retry_after)
+            if delay is None:
+                raise FailedExponentialBackoff(
+                    f"Failed to make the request after {attempt + 1} attempts: {error}"
+                ) from error
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def check_status(self, execution_id: str) -> "httpx.Response":
         """
         Check the status of the execution
 
@@ -516,15 +4343,15 @@ class Flow:
             execution_id (str): The ID of the execution.
 
         Returns:
-            requests.Response: The response from the server.
+            httpx.Response: The response from the server.
         """
         url = self.hostname + self.API_ENDPOINT_EXECUTION_STATUS.format(
             execution_id=execution_id
         )
 
-        return self._make_request("get", url)
+        return await self._make_request("get", url, endpoint="status")
 
-    def get_logs(self, execution_id: str) -> requests.Response:
+    async def get_logs(self, execution_id: str) -> "httpx.Response":
         """
         Get the execution logs
 
@@ -532,33 +4359,91 @@ class Flow:
             execution_id (str): The ID of the execution.
 
         Returns:
-            requests.Response: The response from the server.
+            httpx.Response: The response from the server.
         """
         url = self.hostname + self.API_ENDPOINT_EXECUTION_LOG.format(
             execution_id=execution_id
         )
 
-        return self._make_request("get", url)
+        return await self._make_request("get", url, endpoint="logs")
 
-    def execute(
+    async def download_logs(self, execution_id: str, path: str) -> str:
+        """
+        Stream the execution logs to a file, with a bounded memory usage.
+
+        Args:
+            execution_id (str): The ID of the execution.
+            path (str): The path of the file to write.
+
+        Returns:
+            str: The path of the written file.
+        """
+        url = self.hostname + self.API_ENDPOINT_EXECUTION_LOG.format(
+            execution_id=execution_id
+        )
+
+        response = await self._make_request("get", url, endpoint="logs", stream=True)
+        try:
+            with open(path, "wb") as file:
+                async for chunk in response.aiter_bytes(_CHUNK_SIZE):
+                    file.write(chunk)
+        finally:
+            await response.aclose()
+
+        return path
+
+    async def _wait_for_terminal(self, execution_id: str) -> dict:
+        """
+        Poll the status of an execution until it reaches a terminal state, following
+        the `polling` strategy.
+
+        Args:
+            execution_id (str): The ID of the execution.
+
+        Returns:
+            dict: The last status response of the execution.
+
+        Raises:
+            ExecutionWaitTimeout: If the strategy timeout is exceeded.
+        """
+        import asyncio
+
+        deadline = None
+        if self.polling.timeout is not None:
+            deadline = time.monotonic() + self.polling.timeout
+
+        started = time.perf_counter()
+        response = None
+        try:
+            for interval in self.polling.intervals():
+                if deadline is not None:
+                    interval = max(0, min(interval, deadline - time.monotonic()))
+
+                await asyncio.sleep(interval)
+
+                response = (await self.check_status(execution_id)).json()
+                if response["state"]["current"] in _TERMINAL_STATES:
+                    return response
+                response = None
+
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise ExecutionWaitTimeout(
+                        f"Execution {execution_id} did not finish within "
+                        f"{self.polling.timeout} seconds"
+                    )
+        finally:
+            if self.instrumentation is not None:
+                self._report_wait(execution_id, response, started)
+
+    async def execute(
         self,
         namespace: str,
         flow: str,
         inputs: dict = None,
     ) -> FlowExecution:
         """
-        Execute a Kestra flow and optionally wait for its completion.
-
-        The process is the following:
-        1. Create the execution
-        2. If wait_for_completion is True:
-            - Wait for the execution to entered finish state
-                (SUCCESS, WARNING, FAILED, KILLED, CANCELLED)
-            - Get the logs of the execution
-            - Return the status, log and error of the execution
-        3. If wait_for_completion is False:
-            - Return a namedtuple with the status "STARTED"
-        4. If the execution fails, an exception is raised
+        Execute a Kestra flow and optionally await its completion. See
+        `Flow.execute`.
 
         Args:
             namespace (str): The namespace of the flow.
@@ -566,7 +4451,7 @@ class Flow:
             inputs (dict): The inputs of the flow.
 
         Returns:
-            namedtuple: A namedtuple containing the status, log and error of the flow.
+            FlowExecution: The status, log and error of the execution.
         """
         if inputs is None:
             inputs = {}
@@ -578,53 +4463,19 @@ class Flow:
             str(inputs),
         )
 
-        url = self.hostname + self.API_ENDPOINT_EXECUTION_CREATE.format(
-            namespace=namespace,
-            flow_id=flow,
-        )
-
-        if self.labels_from_inputs and len(inputs) > 0:
-            labels = "?"
-            labels = "?" + "&".join(
-                [f"labels={key}:{value}" for key, value in inputs.items()]
+        response = (
+            await self._make_request(
+                "post",
+                self._create_url(namespace, flow, inputs),
+                endpoint="create",
+                files=self._input_files(inputs) or None,
             )
-
-            url += labels
-
-            files = {}
-
-            # If Tuples are passed, then it should be a File type
-            # for example - ('myfile', fileObject, 'application/json')
-            # If not, then it should be treated as a string
-            for k, v in inputs.items():
-                if isinstance(v, tuple):
-                    files[k] = v
-                else:
-                    files[k] = (None, str(v))
-
-            response = self._make_request("post", url, files=files).json()
-        elif len(inputs) > 0:
-            files = {}
-
-            # If Tuples are passed, then it should be a File type
-            # for example - ('myfile', fileObject, 'application/json')
-            # If not, then it should be treated as a string
-            for k, v in inputs.items():
-                if isinstance(v, tuple):
-                    files[k] = v
-                else:
-                    files[k] = (None, str(v))
-
-            response = self._make_request("post", url, files=files).json()
-        else:
-            response = self._make_request("post", url).json()
+        ).json()
 
         if "id" not in response:
             raise Exception("Starting execution failed: " + str(response))
 
         execution_id = response["id"]
-        result = FlowExecution(execution_id, None, None, None)
-
         logging.info(
             "Successfully triggered the execution: %s/ui/executions/%s/%s/%s",
             self.hostname,
@@ -633,87 +4484,59 @@ class Flow:
             execution_id,
         )
 
-        if self.wait_for_completion:
-            while True:
-                time.sleep(self.poll_interval)
+        if not self.wait_for_completion:
+            return FlowExecution(execution_id, "STARTED", None, None)
 
-                response = self.check_status(execution_id).json()
+        return await self._complete(execution_id, namespace, flow, inputs)
 
-                log = self.get_logs(execution_id)
+    async def wait(self, execution_id: str) -> FlowExecution:
+        """
+        Await an existing execution, whoever started it. See `Flow.wait`.
 
-                if "SUCCESS" in response["state"]["current"]:
-                    logging.info(
-                        "Execution of the flow %s in the namespace %s with parameters "
-                        "%s was successful \n%s",
-                        flow,
-                        namespace,
-                        str(inputs),
-                        str(log.text),
-                    )
-                    result.status = response["state"]["current"]
-                    result.log = str(log.text)
-                    result.error = None
-
-                    return result
-                elif "WARNING" in response["state"]["current"]:
-                    logging.warning(
-                        "Execution of the flow %s in the namespace %s with parameters "
-                        "%s finished with warnings \n%s",
-                        flow,
-                        namespace,
-                        str(inputs),
-                        str(log.text),
-                    )
-                    result.status = response["state"]["current"]
-                    result.log = str(log.text)
-                    result.error = None
-
-                    return result
-                elif "FAILED" in response["state"]["current"]:
-                    logging.error(
-                        "Execution of the flow %s in the namespace %s with parameters "
-                        "%s failed \n%s",
-                        flow,
-                        namespace,
-                        str(inputs),
-                        str(log.text),
-                    )
-                    result.status = response["state"]["current"]
-                    result.log = str(log.text)
-                    result.error = None
-
-                    return result
-                elif "KILLED" in response["state"]["current"]:
-                    logging.warning(
-                        "Execution of the flow %s in the namespace %s with parameters "
-                        "%s has been killed \n%s",
-                        flow,
-                        namespace,
-                        str(inputs),
-                        str(log.text),
-                    )
-                    result.status = response["state"]["current"]
-                    result.log = str(log.text)
-                    result.error = None
-
-                    return result
-                elif "CANCELLED" in response["state"]["current"]:
-                    logging.warning(
-                        "Execution of the flow %s in the namespace %s with parameters "
-                        "%s has been cancelled \n%s",
-                        flow,
-                        namespace,
-                        str(inputs),
-                        str(log.text),
-                    )
-                    result.status = response["state"]["current"]
-                    result.log = str(log.text)
-                    result.error = None
+        Args:
+            execution_id (str): The ID of the execution.
+
+        Returns:
+            FlowExecution: The status and log of the execution.
+        """
+        return await self._complete(execution_id, None, None, None)
+
+    async def _complete(
+        self,
+        execution_id: str,
+        namespace: str | None,
+        flow: str | None,
+        inputs: dict | None,
+    ) -> FlowExecution:
+        response = await self._wait_for_terminal(execution_id)
+        log_path = None
 
-                    return result
+        if self.log_dir is not None:
+            log_path = await self.download_logs(
+                execution_id, self._log_path(execution_id)
+            )
+            log = None
         else:
-            result.status = "STARTED"
-            result.log = None
-            result.error = None
+            log = (await self.get_logs(execution_id)).text
 
-        return result
+        if flow is None:
+            namespace = response.get("namespace")
+            flow = response.get("flowId")
+            inputs = response.get("inputs") or {}
+
+        self._log_completion(
+            namespace,
+            flow,
+            inputs,
+            response["state"]["current"],
+            log if log_path is None else f"Logs written to {log_path}",
+        )
+
+        return FlowExecution(
+            execution_id,
+            response["state"]["current"],
+            log,
+            None,
+            log_path,
+            response.get("outputs"),
+        )
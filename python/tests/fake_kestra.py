@@ -0,0 +1,471 @@
+"""
+A local stand-in for the Kestra API, used to exercise `Flow` end to end.
+
+Each execution goes through `states`, one step per status check, a search
+request covering it counting as a status check, or one step per `state_duration`
+seconds. The follow endpoints stream all the states, or all the log lines, as
+server-sent events.
+
+Latency, server errors and rate limiting can be injected to reproduce production
+failure modes, and large logs generated, to load-test `Flow` on one machine. The
+server can also be started on its own, for scripts using the real environment
+variables:
+
+    python tests/fake_kestra.py --port 8080 --latency 0.05 --throttle-rate 0.1
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, Iterator
+from urllib.parse import parse_qs, urlparse
+
+_TERMINAL_STATES = {"SUCCESS", "WARNING", "FAILED", "KILLED", "CANCELLED"}
+
+
+class FakeKestraServer:
+    def __init__(
+        self,
+        states: tuple = ("CREATED", "RUNNING", "SUCCESS"),
+        follow_enabled: bool = True,
+        follow_drops: int = 0,
+        search_enabled: bool = True,
+        log: str = "Execution logs",
+        log_follow_drops: int = 0,
+        log_follow_hold: float = 0.0,
+        outputs: dict | None = None,
+        files: dict[str, bytes] | None = None,
+        state_duration: float | None = None,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: int = 1,
+        log_lines: int | None = None,
+        log_line_size: int = 100,
+        seed: int | None = None,
+        port: int = 0,
+    ) -> None:
+        """
+        Args:
+            states (tuple): The successive states of every execution.
+            follow_enabled (bool): Whether the follow endpoint exists. When False,
+                it answers 404.
+            follow_drops (int): How many follow connections are closed after the
+                first event, before the stream behaves.
+            search_enabled (bool): Whether the search endpoint exists. When False,
+                it answers 404.
+            log (str): The logs returned for every execution.
+            log_follow_drops (int): How many logs follow connections are closed
+                after the first line, before the stream behaves.
+            log_follow_hold (float): How long the logs follow connections stay open
+                after the last line, in seconds.
+            outputs (dict): The outputs of the executions in their last state.
+            files (dict[str, bytes]): The content of the output files, by URI.
+            state_duration (float): How long each state lasts, in seconds
+                (optional). When set, the executions go through `states` with time
+                rather than with the status checks, and the follow endpoint streams
+                each state when it is reached.
+            latency (float): The delay added before every response, in seconds.
+            error_rate (float): The fraction of the requests answered with a 500
+                error, between 0 and 1.
+            throttle_rate (float): The fraction of the requests answered with a 429
+                error and a Retry-After header, between 0 and 1.
+            retry_after (int): The Retry-After of the 429 errors, in seconds.
+            log_lines (int): The number of log lines generated for every execution
+                (optional). When set, it replaces `log`, and the logs are streamed
+                rather than held in memory.
+            log_line_size (int): The size of the generated log lines, in bytes.
+            seed (int): The seed of the error and throttle injection (optional).
+            port (int): The port to listen to. Default is a free port.
+        """
+        self.states = states
+        self.follow_enabled = follow_enabled
+        self.follow_drops = follow_drops
+        self.search_enabled = search_enabled
+        self.log = log
+        self.log_follow_drops = log_follow_drops
+        self.log_follow_hold = log_follow_hold
+        self.outputs = outputs
+        self.files = files or {}
+        self.state_duration = state_duration
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.log_lines = log_lines
+        self.log_line_size = log_line_size
+        self._random = random.Random(seed)
+        self.executions: dict[str, dict] = {}
+        self.requests: list[tuple[str, str]] = []
+        self.uploads: list[tuple[dict, bytes]] = []
+        self.injected: list[int] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(0.01,), daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FakeKestraServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, method: str, pattern: str) -> int:
+        """
+        Count the received requests whose path matches a regular expression.
+        """
+        return sum(
+            1
+            for m, path in self.requests
+            if m == method and re.fullmatch(pattern, path)
+        )
+
+    def iter_log(self) -> Iterator[str]:
+        """
+        The log lines of an execution, generated if `log_lines` is set.
+        """
+        if self.log_lines is None:
+            yield from self.log.splitlines()
+            return
+
+        for i in range(self.log_lines):
+            line = f"2024-04-21T13:43:24.340Z INFO line {i} "
+            yield line.ljust(self.log_line_size - 1, "x")
+
+    def _injected_error(self) -> int | None:
+        """
+        Draw the error answered to a request, if any: 500, 429 or None.
+        """
+        with self._lock:
+            draw = self._random.random()
+            if draw < self.error_rate:
+                self.injected.append(500)
+            elif draw < self.error_rate + self.throttle_rate:
+                self.injected.append(429)
+            else:
+                return None
+            return self.injected[-1]
+
+    def _step_at(self, execution_id: str, at: float) -> int:
+        """
+        The step of an execution at a time, when the states follow the time.
+        """
+        created = self.executions[execution_id]["created"]
+        return int((at - created) / self.state_duration)
+
+    def _execution(self, execution_id: str, step: int) -> dict:
+        execution = self.executions[execution_id]
+        response = {
+            "id": execution_id,
+            "namespace": execution["namespace"],
+            "flowId": execution["flowId"],
+            "state": {
+                "current": self.states[min(step, len(self.states) - 1)],
+                "startDate": execution["startDate"],
+            },
+        }
+        if self.outputs is not None and step >= len(self.states) - 1:
+            response["outputs"] = self.outputs
+        if response["state"]["current"] in _TERMINAL_STATES:
+            with self._lock:
+                response["state"]["endDate"] = execution.setdefault(
+                    "endDate", datetime.now(timezone.utc).isoformat()
+                )
+        return response
+
+    def _check(self, execution_id: str) -> dict:
+        if self.state_duration is not None:
+            return self._execution(
+                execution_id, self._step_at(execution_id, time.monotonic())
+            )
+
+        with self._lock:
+            step = self.executions[execution_id]["step"]
+            self.executions[execution_id]["step"] += 1
+        return self._execution(execution_id, step)
+
+
+def _read_body(request: BaseHTTPRequestHandler) -> bytes:
+    """
+    Read the body of a request, sent with a Content-Length or chunked.
+    """
+    if request.headers.get("Transfer-Encoding") != "chunked":
+        return request.rfile.read(int(request.headers.get("Content-Length", 0)))
+
+    body = b""
+    while size := int(request.rfile.readline().strip(), 16):
+        body += request.rfile.read(size)
+        request.rfile.readline()
+    request.rfile.readline()
+    return body
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    @property
+    def fake(self) -> FakeKestraServer:
+        return self.server.fake
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        self._record()
+        body = _read_body(self)
+        with self.fake._lock:
+            self.fake.uploads.append((dict(self.headers), body))
+        if self._inject():
+            return
+        path = urlparse(self.path).path
+
+        match = re.fullmatch(r"/api/v1(?:/[^/]+)?/executions/([^/]+)/([^/]+)", path)
+        if match:
+            execution_id = uuid.uuid4().hex
+            with self.fake._lock:
+                self.fake.executions[execution_id] = {
+                    "namespace": match[1],
+                    "flowId": match[2],
+                    "startDate": datetime.now(timezone.utc).isoformat(),
+                    "created": time.monotonic(),
+                    "step": 0,
+                }
+            self._json(self.fake._execution(execution_id, 0))
+        else:
+            self._send(404, b"")
+
+    def do_GET(self) -> None:
+        self._record()
+        if self._inject():
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if re.fullmatch(r"/api/v1(?:/[^/]+)?/executions/search", url.path):
+            return self._search(query)
+
+        # routes of a given execution, by path under /api/v1[/tenant]
+        routes = {
+            r"executions/([^/]+)/follow": self._follow,
+            r"executions/([^/]+)/file": lambda _: self._file(query),
+            r"executions/([^/]+)": lambda execution_id: self._json(
+                self.fake._check(execution_id)
+            ),
+            r"logs/([^/]+)/follow": lambda _: self._follow_logs(),
+            r"logs/([^/]+)/download": lambda _: self._download_logs(),
+        }
+        for pattern, route in routes.items():
+            match = re.fullmatch(r"/api/v1(?:/[^/]+)?/" + pattern, url.path)
+            if match and match[1] in self.fake.executions:
+                return route(match[1])
+
+        self._send(404, b"")
+
+    def _inject(self) -> bool:
+        """
+        Delay the response by the latency, and answer the injected error if any.
+
+        Returns:
+            bool: Whether an error was answered.
+        """
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+
+        status = self.fake._injected_error()
+        if status == 429:
+            self._send(429, b"", headers={"Retry-After": str(self.fake.retry_after)})
+        elif status == 500:
+            self._send(500, b"Injected error")
+        return status is not None
+
+    def _download_logs(self) -> None:
+        if self.fake.log_lines is None:
+            return self._send(200, self.fake.log.encode(), "text/plain")
+
+        self._start_chunked("text/plain")
+        for line in self.fake.iter_log():
+            self._chunk(f"{line}\n".encode())
+        self._chunk(b"")
+
+    def _file(self, query: dict) -> None:
+        content = self.fake.files.get(query["path"][0])
+        if content is None:
+            return self._send(404, b"")
+
+        self._send(200, content, "application/octet-stream")
+
+    def _search(self, query: dict) -> None:
+        if not self.fake.search_enabled:
+            return self._send(404, b"")
+
+        with self.fake._lock:
+            execution_ids = [
+                execution_id
+                for execution_id, execution in self.fake.executions.items()
+                if execution["namespace"] in query.get("namespace", [None])
+                and execution["flowId"] in query.get("flowId", [None])
+            ]
+        executions = [self.fake._check(execution_id) for execution_id in execution_ids]
+        executions = [
+            execution
+            for execution in executions
+            if "state" not in query or execution["state"]["current"] in query["state"]
+        ]
+        if query.get("sort") == ["state.endDate:desc"]:
+            executions.sort(
+                key=lambda execution: execution["state"].get("endDate", ""),
+                reverse=True,
+            )
+
+        size = int(query.get("size", ["10"])[0])
+        start = (int(query.get("page", ["1"])[0]) - 1) * size
+        end = start + size
+        self._json(
+            {
+                "results": executions[start:end],
+                "total": len(executions),
+            }
+        )
+
+    def _follow(self, execution_id: str) -> None:
+        if not self.fake.follow_enabled:
+            return self._send(404, b"")
+
+        with self.fake._lock:
+            drop = self.fake.follow_drops > 0
+            self.fake.follow_drops -= 1
+
+        self._events(
+            (
+                self.fake._execution(execution_id, self._reach(execution_id, step))
+                for step in range(len(self.fake.states))
+            ),
+            drop,
+        )
+
+    def _reach(self, execution_id: str, step: int) -> int:
+        """
+        Wait for an execution to reach a step, when the states follow the time.
+        """
+        if self.fake.state_duration is not None:
+            created = self.fake.executions[execution_id]["created"]
+            time.sleep(
+                max(0.0, created + step * self.fake.state_duration - time.monotonic())
+            )
+        return step
+
+    def _follow_logs(self) -> None:
+        with self.fake._lock:
+            drop = self.fake.log_follow_drops > 0
+            self.fake.log_follow_drops -= 1
+
+        self._events(
+            (
+                {"level": "INFO", "taskId": "task", "message": line}
+                for line in self.fake.iter_log()
+            ),
+            drop,
+            self.fake.log_follow_hold,
+        )
+
+    def _events(self, events: Iterable[dict], drop: bool, hold: float = 0.0) -> None:
+        """
+        Stream events, closing the connection after the first one if `drop`, and
+        keeping it open for `hold` seconds after the last one.
+        """
+        self._start_chunked("text/event-stream")
+        for event in events:
+            self._chunk(f"data:{json.dumps(event)}\n\n".encode())
+            if drop:
+                # close the connection without the terminating chunk
+                self.close_connection = True
+                return
+        time.sleep(hold)
+        self._chunk(b"")
+
+    def _start_chunked(self, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _record(self) -> None:
+        with self.fake._lock:
+            self.fake.requests.append((self.command, urlparse(self.path).path))
+
+    def _json(self, body: dict) -> None:
+        self._send(200, json.dumps(body).encode(), "application/json")
+
+    def _send(
+        self,
+        status: int,
+        body: bytes,
+        content_type: str = "text/plain",
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a fake Kestra API.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--states", default="CREATED,RUNNING,SUCCESS")
+    parser.add_argument("--state-duration", type=float, default=1.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--log-lines", type=int, default=None)
+    parser.add_argument("--log-line-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = FakeKestraServer(
+        states=tuple(args.states.split(",")),
+        state_duration=args.state_duration,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        log_lines=args.log_lines,
+        log_line_size=args.log_line_size,
+        seed=args.seed,
+        port=args.port,
+    )
+    with server:
+        print(f"Serving a fake Kestra API on {server.url}", flush=True)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
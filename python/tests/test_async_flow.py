@@ -0,0 +1,227 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+from pytest_mock import MockerFixture
+
+from exceptions import FailedExponentialBackoff
+from kestra import AsyncFlow, Instrumentation, RetryPolicy
+
+
+def make_flow(handler, **kwargs) -> AsyncFlow:
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return AsyncFlow(client=client, poll_interval=0, **kwargs)
+
+
+def kestra_api(states: list[str], threads: set | None = None):
+    """
+    Handle the Kestra API calls, each execution going through `states`.
+    """
+    checks: dict[str, int] = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if threads is not None:
+            threads.add(threading.get_ident())
+
+        path = request.url.path
+        if request.method == "POST":
+            execution_id = f"exec-{len(checks)}"
+            checks[execution_id] = 0
+            return httpx.Response(200, json={"id": execution_id})
+        if path.endswith("/download"):
+            return httpx.Response(200, text="Execution logs")
+
+        execution_id = path.rsplit("/", 1)[1]
+        state = states[min(checks[execution_id], len(states) - 1)]
+        checks[execution_id] += 1
+        return httpx.Response(200, json={"state": {"current": state}})
+
+    return handler
+
+
+@pytest.mark.parametrize(
+    "tenant",
+    [
+        None,
+        "skylord-prod",
+    ],
+)
+def test_execute_success(tenant):
+    requests = []
+    api = kestra_api(["SUCCESS"])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(f"{request.method} {request.url.path}")
+        return api(request)
+
+    async def run():
+        async with make_flow(handler, tenant=tenant) as flow:
+            return await flow.execute(namespace="namespace-test", flow="flow-test")
+
+    result = asyncio.run(run())
+
+    prefix = f"/api/v1/{tenant}" if tenant is not None else "/api/v1"
+    assert result.status == "SUCCESS"
+    assert result.log == "Execution logs"
+    assert result.error is None
+    assert requests == [
+        f"POST {prefix}/executions/namespace-test/flow-test",
+        f"GET {prefix}/executions/exec-0",
+        f"GET {prefix}/logs/exec-0/download",
+    ]
+
+
+def test_execute_with_inputs_as_labels():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json={"id": "123"})
+
+    async def run():
+        async with make_flow(
+            handler, wait_for_completion=False, labels_from_inputs=True
+        ) as flow:
+            return await flow.execute(
+                namespace="namespace-test",
+                flow="flow-test",
+                inputs={"param1": "value1"},
+            )
+
+    result = asyncio.run(run())
+
+    assert result.status == "STARTED"
+    assert requests[0].url.params.get_list("labels") == ["param1:value1"]
+    assert b'name="param1"\r\n\r\nvalue1' in requests[0].read()
+
+
+def test_execute_concurrently_on_one_thread():
+    threads = set()
+
+    async def run():
+        async with make_flow(
+            kestra_api(["CREATED", "RUNNING", "SUCCESS"], threads)
+        ) as flow:
+            return await asyncio.gather(
+                *(flow.execute("namespace-test", "flow-test") for _ in range(200))
+            )
+
+    results = asyncio.run(run())
+
+    assert len({result.execution_id for result in results}) == 200
+    assert all(result.status == "SUCCESS" for result in results)
+    assert threads == {threading.get_ident()}
+
+
+def test_execute_cancellation():
+    async def run():
+        async with make_flow(kestra_api(["RUNNING"])) as flow:
+            task = asyncio.create_task(flow.execute("namespace-test", "flow-test"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+            # the flow is still usable after a cancellation
+            return await flow.check_status("exec-0")
+
+    assert asyncio.run(run()).json() == {"state": {"current": "RUNNING"}}
+
+
+def test_failed_exponential_backoff(mocker: MockerFixture):
+    mock_sleep = mocker.patch("asyncio.sleep")
+
+    async def run():
+        async with make_flow(
+            lambda request: httpx.Response(503),
+            retry_policy=RetryPolicy(jitter=False),
+        ) as flow:
+            await flow.check_status("123")
+
+    with pytest.raises(FailedExponentialBackoff):
+        asyncio.run(run())
+
+    assert mock_sleep.call_args_list == [mocker.call(2**i) for i in range(4)]
+
+
+def test_retries_transport_errors(mocker: MockerFixture):
+    mocker.patch("asyncio.sleep")
+    responses = iter([httpx.ConnectError("refused"), httpx.Response(200, json={})])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    async def run():
+        async with make_flow(handler) as flow:
+            return await flow.check_status("123")
+
+    assert asyncio.run(run()).json() == {}
+
+
+def test_execute_with_log_dir(tmp_path):
+    async def run():
+        async with make_flow(kestra_api(["SUCCESS"]), log_dir=str(tmp_path)) as flow:
+            return await flow.execute("namespace-test", "flow-test")
+
+    result = asyncio.run(run())
+
+    assert result.status == "SUCCESS"
+    assert result.log is None
+    assert result.log_path == str(tmp_path / "exec-0.log")
+    assert (tmp_path / "exec-0.log").read_text() == "Execution logs"
+
+
+def test_execute_instrumentation():
+    requests, waits = [], []
+
+    class Recording(Instrumentation):
+        def request(self, endpoint, method, status, *args):
+            requests.append((endpoint, method, status))
+
+        def wait(self, execution_id, state, duration):
+            waits.append((execution_id, state))
+
+    async def run():
+        async with make_flow(
+            kestra_api(["RUNNING", "SUCCESS"]), instrumentation=Recording()
+        ) as flow:
+            return await flow.execute("namespace-test", "flow-test")
+
+    asyncio.run(run())
+
+    assert requests == [
+        ("create", "POST", 200),
+        ("status", "GET", 200),
+        ("status", "GET", 200),
+        ("logs", "GET", 200),
+    ]
+    assert waits == [("exec-0", "SUCCESS")]
+
+
+def test_download_logs_retries(mocker: MockerFixture, tmp_path):
+    mock_sleep = mocker.patch("asyncio.sleep")
+    responses = iter([httpx.Response(503), httpx.Response(200, text="Execution logs")])
+    requests = []
+
+    class Recording(Instrumentation):
+        def request(self, endpoint, method, status, duration, retries, *args):
+            requests.append((endpoint, method, status, retries))
+
+    async def run():
+        async with make_flow(
+            lambda request: next(responses),
+            instrumentation=Recording(),
+            retry_policy=RetryPolicy(jitter=False),
+        ) as flow:
+            return await flow.download_logs("123", str(tmp_path / "123.log"))
+
+    path = asyncio.run(run())
+
+    assert open(path).read() == "Execution logs"
+    assert mock_sleep.call_args_list == [mocker.call(1)]
+    assert requests == [("logs", "GET", 200, 1)]
@@ -1,11 +1,34 @@
+import email.parser
+import io
+import logging
 import os
+import re
+import time
+from concurrent.futures import CancelledError, Future, as_completed
 
 import pytest
+import requests
 import requests_mock
 from pytest_mock import MockerFixture
 
-from exceptions import FailedExponentialBackoff
-from kestra import Flow
+from exceptions import (
+    CircuitOpenError,
+    ExecutionWaitTimeout,
+    FailedExponentialBackoff,
+)
+from fake_kestra import FakeKestraServer
+from kestra import (
+    CircuitBreaker,
+    ExecutionPoller,
+    Flow,
+    IdempotencyStore,
+    Instrumentation,
+    Kestra,
+    MetricsInstrumentation,
+    PollingStrategy,
+    RateLimiter,
+    RetryPolicy,
+)
 
 
 def test_failed_exponential_backoff(mocker: MockerFixture):
@@ -17,7 +40,7 @@ def test_failed_exponential_backoff(mocker: MockerFixture):
             status_code=500,
         )
 
-        flow = Flow()
+        flow = Flow(retry_policy=RetryPolicy(jitter=False))
 
         with pytest.raises(FailedExponentialBackoff):
             flow._make_request(
@@ -26,13 +49,12 @@ def test_failed_exponential_backoff(mocker: MockerFixture):
             )
 
         assert m.call_count == 5
-        mock_sleep.assert_has_calls(
+        assert mock_sleep.call_args_list == (
             [
                 mocker.call(1),
                 mocker.call(2),
                 mocker.call(4),
                 mocker.call(8),
-                mocker.call(16),
             ]
         )
 
@@ -93,6 +115,136 @@ def test_get_logs(tenant):
         assert m.call_count == 1
 
 
+def test_retry_policy_full_jitter(mocker: MockerFixture):
+    mocker.patch("random.uniform", side_effect=lambda a, b: b / 2)
+    policy = RetryPolicy(base_delay=1, max_delay=5)
+
+    assert [policy.delay(attempt) for attempt in range(5)] == [0.5, 1, 2, 2.5, 2.5]
+
+
+def test_retry_policy_retry_after():
+    policy = RetryPolicy()
+
+    assert policy.delay(3, "7") == 7
+    assert policy.delay(3, "Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert policy.delay(0, "soon") <= 1
+    assert policy.delay(0, "86400") == 300
+    assert (
+        RetryPolicy(max_retry_after=60).delay(0, "Fri, 31 Dec 9999 00:00:00 GMT") == 60
+    )
+    assert RetryPolicy(retry_after=False, jitter=False).delay(0, "7") == 1
+
+
+def test_make_request_retry_after(mocker: MockerFixture):
+    mock_sleep = mocker.patch("time.sleep")
+
+    with requests_mock.Mocker() as m:
+        m.get(
+            "http://localhost:8080/api/v1/executions/123",
+            [
+                {"status_code": 429, "headers": {"Retry-After": "3"}},
+                {"status_code": 200, "json": {"id": "123"}},
+            ],
+        )
+
+        response = Flow()._make_request(
+            "GET", "http://localhost:8080/api/v1/executions/123"
+        )
+
+    assert response.json() == {"id": "123"}
+    assert mock_sleep.call_args_list == [mocker.call(3.0)]
+
+
+def test_make_request_retries_connection_errors(mocker: MockerFixture):
+    mock_sleep = mocker.patch("time.sleep")
+
+    with requests_mock.Mocker() as m:
+        m.get(
+            "http://localhost:8080/api/v1/executions/123",
+            [
+                {"exc": requests.ConnectionError},
+                {"exc": requests.Timeout},
+                {"status_code": 200, "json": {"id": "123"}},
+            ],
+        )
+
+        response = Flow()._make_request(
+            "GET", "http://localhost:8080/api/v1/executions/123"
+        )
+
+    assert response.json() == {"id": "123"}
+    assert mock_sleep.call_count == 2
+
+
+def test_make_request_deadline(mocker: MockerFixture):
+    mock_sleep = mocker.patch("time.sleep")
+    mocker.patch("time.monotonic", side_effect=[0, 0, 2, 6])
+
+    with requests_mock.Mocker() as m:
+        m.get("http://localhost:8080/api/v1/executions/123", status_code=503)
+
+        flow = Flow(retry_policy=RetryPolicy(jitter=False, deadline=5))
+        with pytest.raises(FailedExponentialBackoff):
+            flow._make_request("GET", "http://localhost:8080/api/v1/executions/123")
+
+        # the third retry would end at 6 + 4 seconds, past the deadline
+        assert m.call_count == 3
+        assert mock_sleep.call_args_list == [mocker.call(1), mocker.call(2)]
+
+
+def test_circuit_breaker(mocker: MockerFixture):
+    mocker.patch("time.sleep")
+    monotonic = mocker.patch("time.monotonic", return_value=0)
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    url = "http://localhost:8080/api/v1/executions/123"
+
+    with requests_mock.Mocker() as m:
+        m.get(url, status_code=503)
+        flow = Flow(retry_policy=RetryPolicy(max_attempts=2), circuit_breaker=breaker)
+
+        with pytest.raises(FailedExponentialBackoff):
+            flow._make_request("GET", url)
+        with pytest.raises(CircuitOpenError):
+            flow._make_request("GET", url)
+        assert m.call_count == 3
+
+        # after the reset timeout, a successful trial request closes the circuit
+        monotonic.return_value = 31
+        m.get(url, json={"id": "123"})
+        assert flow._make_request("GET", url).json() == {"id": "123"}
+        assert flow._make_request("GET", url).json() == {"id": "123"}
+        assert m.call_count == 5
+
+
+def test_rate_limiter_budgets(mocker: MockerFixture):
+    monotonic = mocker.patch("time.monotonic", return_value=0)
+    limiter = RateLimiter(create_rate=2, read_rate=10)
+
+    # the create budget holds 2 requests, then one every half second
+    assert [limiter.reserve("POST") for _ in range(4)] == [0, 0, 0.5, 1]
+    # reads have their own budget
+    assert [limiter.reserve("GET") for _ in range(10)] == [0] * 10
+    assert limiter.reserve("GET") == pytest.approx(0.1)
+
+    monotonic.return_value = 10
+    assert limiter.reserve("POST") == 0
+    assert RateLimiter(read_rate=1).reserve("DELETE") == 0
+
+
+def test_make_request_rate_limited(mocker: MockerFixture):
+    mock_sleep = mocker.patch("time.sleep")
+    mocker.patch("time.monotonic", return_value=0)
+
+    with requests_mock.Mocker() as m:
+        m.get("http://localhost:8080/api/v1/executions/123", json={})
+
+        flow = Flow(rate_limiter=RateLimiter(read_rate=1, burst=2))
+        for _ in range(4):
+            flow._make_request("GET", "http://localhost:8080/api/v1/executions/123")
+
+    assert mock_sleep.call_args_list == [mocker.call(1), mocker.call(2)]
+
+
 def test_execute_with_file_input(mocker: MockerFixture):
     with requests_mock.Mocker() as m:
         m.post(
@@ -322,3 +474,893 @@ def test_execute_with_inputs(tenant):
         assert result.log == "Execution logs"
         assert result.error is None
         assert m.call_count == 3
+
+
+def test_polling_strategy_intervals():
+    strategy = PollingStrategy(
+        initial_interval=0.1, max_interval=1, multiplier=2, jitter=0
+    )
+    intervals = strategy.intervals()
+
+    assert [next(intervals) for _ in range(6)] == [0.1, 0.2, 0.4, 0.8, 1, 1]
+
+
+def test_polling_strategy_jitter():
+    strategy = PollingStrategy(initial_interval=1, max_interval=1, jitter=0.5)
+    intervals = strategy.intervals()
+
+    for _ in range(100):
+        assert 0.5 <= next(intervals) <= 1
+
+
+def test_poll_interval_is_a_fixed_strategy():
+    flow = Flow(poll_interval=3)
+
+    assert flow.polling == PollingStrategy.fixed(3)
+
+    flow.poll_interval = 5
+    assert flow.poll_interval == 5
+    assert flow.polling == PollingStrategy.fixed(5)
+
+
+def test_execute_polls_until_terminal_state(mocker: MockerFixture):
+    mock_sleep = mocker.patch("time.sleep")
+
+    with requests_mock.Mocker() as m:
+        m.post(
+            "http://localhost:8080/api/v1/executions/namespace-test/flow-test",
+            json={"id": "123"},
+            status_code=200,
+        )
+        m.get(
+            "http://localhost:8080/api/v1/executions/123",
+            [
+                {"json": {"state": {"current": "CREATED"}}},
+                {"json": {"state": {"current": "RUNNING"}}},
+                {"json": {"state": {"current": "WARNING"}}},
+            ],
+        )
+        logs = m.get(
+            "http://localhost:8080/api/v1/logs/123/download",
+            text="Execution logs",
+        )
+
+        flow = Flow(polling=PollingStrategy(initial_interval=0.1, jitter=0))
+        result = flow.execute(namespace="namespace-test", flow="flow-test")
+
+        assert result.status == "WARNING"
+        assert logs.call_count == 1
+        mock_sleep.assert_has_calls(
+            [mocker.call(0.1), mocker.call(0.2), mocker.call(0.4)]
+        )
+
+
+def test_execute_wait_timeout(mocker: MockerFixture):
+    # a clock moved forward by the waits only
+    clock = [0.0]
+    mocker.patch("time.monotonic", side_effect=lambda: clock[0])
+    mocker.patch(
+        "time.sleep", side_effect=lambda seconds: clock.append(clock.pop() + seconds)
+    )
+
+    with requests_mock.Mocker() as m:
+        m.post(
+            "http://localhost:8080/api/v1/executions/namespace-test/flow-test",
+            json={"id": "123"},
+            status_code=200,
+        )
+        m.get(
+            "http://localhost:8080/api/v1/executions/123",
+            json={"state": {"current": "RUNNING"}},
+        )
+
+        flow = Flow(polling=PollingStrategy.fixed(5, timeout=10))
+
+        with pytest.raises(ExecutionWaitTimeout):
+            flow.execute(namespace="namespace-test", flow="flow-test")
+
+        assert m.call_count == 3
+
+
+def test_execute_follow():
+    with FakeKestraServer() as server:
+        flow = Flow(follow=True)
+        flow.hostname = server.url
+
+        result = flow.execute(namespace="namespace-test", flow="flow-test")
+
+        assert result.status == "SUCCESS"
+        assert result.log == "Execution logs"
+        assert server.count("GET", r"/api/v1/executions/\w+/follow") == 1
+        assert server.count("GET", r"/api/v1/executions/\w+") == 0
+
+
+def test_execute_follow_reconnects_dropped_stream():
+    with FakeKestraServer(follow_drops=2) as server:
+        flow = Flow(follow=True)
+        flow.hostname = server.url
+
+        result = flow.execute(namespace="namespace-test", flow="flow-test")
+
+        assert result.status == "SUCCESS"
+        assert server.count("GET", r"/api/v1/executions/\w+/follow") == 3
+        assert server.count("GET", r"/api/v1/executions/\w+") == 0
+
+
+def test_execute_retries_injected_errors():
+    with FakeKestraServer(
+        error_rate=0.2, throttle_rate=0.2, retry_after=0, seed=3
+    ) as server:
+        flow = Flow(
+            polling=PollingStrategy.fixed(0),
+            retry_policy=RetryPolicy(max_attempts=10, base_delay=0, jitter=False),
+        )
+        flow.hostname = server.url
+
+        results = [flow.execute("namespace-test", "flow-test") for _ in range(5)]
+
+        assert [result.status for result in results] == ["SUCCESS"] * 5
+        assert set(server.injected) == {429, 500}
+
+
+def test_execute_timed_states():
+    with FakeKestraServer(state_duration=0.05) as server:
+        flow = Flow(polling=PollingStrategy.fixed(0.01))
+        flow.hostname = server.url
+
+        start = time.perf_counter()
+        result = flow.execute("namespace-test", "flow-test")
+
+        assert result.status == "SUCCESS"
+        assert time.perf_counter() - start >= 0.1
+        assert server.count("GET", r"/api/v1/executions/\w+") > 3
+
+
+def test_execute_follow_timed_states_and_large_logs():
+    with FakeKestraServer(state_duration=0.05, log_lines=10_000) as server:
+        flow = Flow(follow=True)
+        flow.hostname = server.url
+
+        start = time.perf_counter()
+        result = flow.execute("namespace-test", "flow-test")
+
+        assert result.status == "SUCCESS"
+        assert time.perf_counter() - start >= 0.1
+        lines = result.log.splitlines()
+        assert len(lines) == 10_000
+        assert all(len(line) == 99 for line in lines)
+
+
+def test_execute_follow_timeout_silent_stream():
+    with FakeKestraServer(state_duration=3) as server:
+        flow = Flow(follow=True, polling=PollingStrategy(timeout=0.5))
+        flow.hostname = server.url
+
+        start = time.perf_counter()
+        with pytest.raises(ExecutionWaitTimeout):
+            flow.execute("namespace-test", "flow-test")
+
+        assert time.perf_counter() - start < 1.5
+
+
+def test_execute_follow_reconnects_silent_stream():
+    with FakeKestraServer(state_duration=0.3) as server:
+        flow = Flow(follow=True)
+        flow.follow_reconnects = 0
+        flow.follow_read_timeout = 0.1
+        flow.hostname = server.url
+
+        result = flow.execute("namespace-test", "flow-test")
+
+        assert result.status == "SUCCESS"
+        # the read timeouts do not count as drops, so it never falls back to polling
+        assert server.count("GET", r"/api/v1/executions/\w+/follow") > 1
+        assert server.count("GET", r"/api/v1/executions/\w+") == 0
+
+
+def test_follow_skips_events_without_state(mocker: MockerFixture):
+    flow = Flow(follow=True)
+    terminal = {"id": "123", "state": {"current": "SUCCESS"}}
+    mocker.patch.object(
+        flow, "follow_execution", return_value=iter([{"id": "123"}, terminal])
+    )
+
+    assert flow._follow_until_terminal("123", None) == terminal
+
+
+@pytest.mark.parametrize(
+    "server_options",
+    [
+        {"follow_enabled": False},
+        {"follow_drops": 10},
+    ],
+)
+def test_execute_follow_falls_back_to_polling(server_options):
+    with FakeKestraServer(**server_options) as server:
+        flow = Flow(follow=True, poll_interval=0)
+        flow.hostname = server.url
+
+        result = flow.execute(namespace="namespace-test", flow="flow-test")
+
+        assert result.status == "SUCCESS"
+        assert server.count("GET", r"/api/v1/executions/\w+") == 3
+
+
+def test_execute_many():
+    with FakeKestraServer() as server:
+        flow = Flow(poll_interval=0)
+        flow.hostname = server.url
+
+        results = list(
+            flow.execute_many(
+                "namespace-test",
+                "flow-test",
+                ({"param": i} for i in range(20)),
+                max_concurrency=4,
+            )
+        )
+
+        assert len({result.execution_id for result in results}) == 20
+        assert all(result.status == "SUCCESS" for result in results)
+        assert all(result.log == "Execution logs" for result in results)
+        assert (
+            server.count("POST", r"/api/v1/executions/namespace-test/flow-test") == 20
+        )
+
+
+def _create_from_param(request, context):
+    param = re.search(rb'name="param"\r\n\r\n(\d+)', request.body)[1].decode()
+    if param == "3":
+        context.status_code = 400
+        return {"message": "Invalid input"}
+    return {"id": f"exec-{param}"}
+
+
+@pytest.mark.parametrize("wait_for_completion", [True, False])
+def test_execute_many_ordered_with_failures(wait_for_completion):
+    with requests_mock.Mocker() as m:
+        m.post(
+            "http://localhost:8080/api/v1/executions/namespace-test/flow-test",
+            json=_create_from_param,
+        )
+        m.get(
+            re.compile(r"http://localhost:8080/api/v1/executions/exec-\d+"),
+            json={"state": {"current": "SUCCESS"}},
+        )
+        m.get(
+            re.compile(r"http://localhost:8080/api/v1/logs/exec-\d+/download"),
+            text="Execution logs",
+        )
+
+        flow = Flow(wait_for_completion=wait_for_completion, poll_interval=0)
+        results = list(
+            flow.execute_many(
+                "namespace-test",
+                "flow-test",
+                [{"param": i} for i in range(10)],
+                max_concurrency=3,
+                ordered=True,
+            )
+        )
+
+        assert [result.execution_id for result in results] == [
+            None if i == 3 else f"exec-{i}" for i in range(10)
+        ]
+        assert results[3].status is None
+        assert "400" in results[3].error
+        assert all(
+            result.status == ("SUCCESS" if wait_for_completion else "STARTED")
+            for i, result in enumerate(results)
+            if i != 3
+        )
+
+
+def _start_executions(server: FakeKestraServer, count: int) -> list[str]:
+    flow = Flow(wait_for_completion=False)
+    flow.hostname = server.url
+    return [
+        result.execution_id
+        for result in flow.execute_many(
+            "namespace-test", "flow-test", [{}] * count, ordered=True
+        )
+    ]
+
+
+@pytest.mark.parametrize(
+    "search_enabled, status_checks, searches",
+    [
+        # one check per execution, then 1 search while running, 3 pages once done
+        (True, 30, 4),
+        # the search API is tried once, then each execution is checked on its own
+        (False, 90, 1),
+    ],
+)
+def test_execution_poller(search_enabled, status_checks, searches):
+    with FakeKestraServer(search_enabled=search_enabled) as server:
+        execution_ids = _start_executions(server, 30)
+        flow = Flow(poll_interval=0)
+        flow.hostname = server.url
+
+        with ExecutionPoller(flow, batch_size=10) as poller:
+            futures = [poller.track(execution_id) for execution_id in execution_ids]
+            results = [future.result(timeout=10) for future in futures]
+
+        assert [result["id"] for result in results] == execution_ids
+        assert all(result["state"]["current"] == "SUCCESS" for result in results)
+        assert server.count("GET", r"/api/v1/executions/\w{32}") == status_checks
+        assert server.count("GET", r"/api/v1/executions/search") == searches
+
+
+def test_execution_poller_tracks_with_origin():
+    with FakeKestraServer() as server:
+        flow = Flow(poll_interval=0, wait_for_completion=False)
+        flow.hostname = server.url
+        executions = [
+            flow._create_execution("namespace-test", "flow-test", {}) for _ in range(30)
+        ]
+
+        with ExecutionPoller(flow, batch_size=10) as poller:
+            futures = [
+                poller.track(
+                    execution["id"],
+                    execution["namespace"],
+                    execution["flowId"],
+                    execution["state"]["startDate"],
+                )
+                for execution in executions
+            ]
+            results = [future.result(timeout=10) for future in futures]
+
+        assert all(result["state"]["current"] == "SUCCESS" for result in results)
+        assert server.count("GET", r"/api/v1/executions/\w{32}") == 0
+
+
+def test_execution_poller_caps_search_pages():
+    with FakeKestraServer(state_duration=3600) as server:
+        finished = _start_executions(server, 50)
+        for execution_id in finished:
+            server.executions[execution_id]["created"] -= 7200
+        running = _start_executions(server, 1)[0]
+        flow = Flow(polling=PollingStrategy.fixed(0.1))
+        flow.hostname = server.url
+
+        def track(poller: ExecutionPoller, execution_id: str) -> Future:
+            execution = server._execution(execution_id, 0)
+            return poller.track(
+                execution_id,
+                execution["namespace"],
+                execution["flowId"],
+                execution["state"]["startDate"],
+            )
+
+        with ExecutionPoller(flow, batch_size=10, max_pages=2) as poller:
+            pending = track(poller, running)
+            # found on a later refresh, resuming after the pages already listed
+            resolved = track(poller, finished[0])
+            assert resolved.result(timeout=10)["state"]["current"] == "SUCCESS"
+
+            # 6 pages of finished executions, at most 2 per refresh of 0.1s
+            searches = server.count("GET", r"/api/v1/executions/search")
+            time.sleep(0.5)
+            searches = server.count("GET", r"/api/v1/executions/search") - searches
+            assert 2 <= searches <= 2 * 6
+            assert not pending.done()
+        assert server.count("GET", r"/api/v1/executions/\w{32}") == 0
+
+
+def test_execution_poller_timeout():
+    with FakeKestraServer(states=("RUNNING",)) as server:
+        execution_ids = _start_executions(server, 2)
+        flow = Flow(polling=PollingStrategy.fixed(0.01, timeout=0.1))
+        flow.hostname = server.url
+
+        with ExecutionPoller(flow) as poller:
+            futures = [poller.track(execution_id) for execution_id in execution_ids]
+
+            for future in futures:
+                with pytest.raises(ExecutionWaitTimeout):
+                    future.result(timeout=10)
+
+
+def test_submit():
+    with FakeKestraServer() as server, Flow(poll_interval=0) as flow:
+        flow.hostname = server.url
+
+        futures = [
+            flow.submit("namespace-test", "flow-test", {"param": i}) for i in range(5)
+        ]
+        results = [future.result(timeout=10) for future in as_completed(futures)]
+
+        assert len({result.execution_id for result in results}) == 5
+        assert all(result.status == "SUCCESS" for result in results)
+        assert all(result.log == "Execution logs" for result in results)
+
+
+def test_submit_failure():
+    with requests_mock.Mocker() as m, Flow() as flow:
+        m.post(
+            "http://localhost:8080/api/v1/executions/namespace-test/flow-test",
+            status_code=400,
+        )
+
+        future = flow.submit("namespace-test", "flow-test")
+
+        with pytest.raises(requests.HTTPError):
+            future.result(timeout=10)
+
+
+def test_wait():
+    with FakeKestraServer() as server:
+        flow = Flow(wait_for_completion=False, poll_interval=0)
+        flow.hostname = server.url
+
+        started = flow.execute("namespace-test", "flow-test")
+        result = flow.wait(started.execution_id)
+
+        assert started.status == "STARTED"
+        assert result.execution_id == started.execution_id
+        assert result.status == "SUCCESS"
+        assert result.log == "Execution logs"
+
+
+def test_get_logs_stream():
+    with requests_mock.Mocker() as m:
+        m.get(
+            "http://localhost:8080/api/v1/logs/123/download",
+            text="line 1\nline 2\nligne 3 é\n",
+        )
+
+        flow = Flow()
+        lines = flow.get_logs(execution_id="123", stream=True)
+
+        assert m.call_count == 0
+        assert list(lines) == ["line 1", "line 2", "ligne 3 é"]
+        assert m.call_count == 1
+
+
+def test_download_logs(tmp_path):
+    with requests_mock.Mocker() as m:
+        m.get(
+            "http://localhost:8080/api/v1/logs/123/download",
+            content=b"log line\n" * 100_000,
+        )
+
+        flow = Flow()
+        path = flow.download_logs("123", str(tmp_path / "123.log"))
+
+        assert path == str(tmp_path / "123.log")
+        assert (tmp_path / "123.log").read_bytes() == b"log line\n" * 100_000
+
+
+def test_execute_with_log_dir(tmp_path):
+    with FakeKestraServer() as server:
+        flow = Flow(poll_interval=0, log_dir=str(tmp_path / "logs"))
+        flow.hostname = server.url
+
+        result = flow.execute(namespace="namespace-test", flow="flow-test")
+
+        assert result.status == "SUCCESS"
+        assert result.log is None
+        assert result.log_path == str(tmp_path / "logs" / f"{result.execution_id}.log")
+        with open(result.log_path) as file:
+            assert file.read() == "Execution logs"
+
+
+@pytest.mark.parametrize("log_follow_drops", [0, 2])
+def test_execute_tail_logs(caplog, log_follow_drops):
+    with FakeKestraServer(
+        log="line 1\nline 2\nline 3", log_follow_drops=log_follow_drops
+    ) as server:
+        flow = Flow(poll_interval=0.05, tail_logs=True)
+        flow.hostname = server.url
+
+        with caplog.at_level(logging.INFO, logger="Kestra"):
+            result = flow.execute(namespace="namespace-test", flow="flow-test")
+
+        assert result.status == "SUCCESS"
+        assert [
+            record.getMessage() for record in caplog.records if record.name == "Kestra"
+        ] == ["[task] line 1", "[task] line 2", "[task] line 3"]
+        assert server.count("GET", r"/api/v1/logs/\w+/follow") == log_follow_drops + 1
+
+
+def test_execute_tail_logs_stream_kept_open(caplog):
+    with FakeKestraServer(log="line 1\nline 2", log_follow_hold=5) as server:
+        flow = Flow(poll_interval=0.05, tail_logs=True)
+        flow.hostname = server.url
+
+        start = time.perf_counter()
+        with caplog.at_level(logging.INFO, logger="Kestra"):
+            flow.execute(namespace="namespace-test", flow="flow-test")
+
+        # the silent stream is closed without waiting out the grace period
+        assert time.perf_counter() - start < 0.8
+        assert [
+            record.getMessage() for record in caplog.records if record.name == "Kestra"
+        ] == ["[task] line 1", "[task] line 2"]
+
+
+def parse_multipart(headers: dict, body: bytes) -> dict:
+    message = email.parser.BytesParser().parsebytes(
+        f"Content-Type: {headers['Content-Type']}\r\n\r\n".encode() + body
+    )
+    return {
+        part.get_param("name", header="Content-Disposition"): (
+            part.get_filename(),
+            part.get_payload(decode=True),
+        )
+        for part in message.get_payload()
+    }
+
+
+def test_execute_stream_uploads(tmp_path):
+    content = os.urandom(300 * 1024)
+    (tmp_path / "input.bin").write_bytes(content)
+
+    with FakeKestraServer() as server, open(tmp_path / "input.bin", "rb") as file:
+        flow = Flow(wait_for_completion=False, stream_uploads=True)
+        flow.hostname = server.url
+
+        result = flow.execute(
+            "namespace-test",
+            "flow-test",
+            {"file": ("input.bin", file), "count": 3},
+        )
+
+        headers, body = server.uploads[0]
+
+    assert result.execution_id in server.executions
+    assert headers["Content-Length"] == str(len(body))
+    assert parse_multipart(headers, body) == {
+        "file": ("input.bin", content),
+        "count": (None, b"3"),
+    }
+
+
+def test_execute_stream_uploads_unknown_size():
+    class Pipe(io.RawIOBase):
+        def __init__(self, data: bytes) -> None:
+            self.data = io.BytesIO(data)
+
+        def readable(self) -> bool:
+            return True
+
+        def readinto(self, buffer) -> int:
+            return self.data.readinto(buffer)
+
+    with FakeKestraServer() as server:
+        flow = Flow(wait_for_completion=False, stream_uploads=True)
+        flow.hostname = server.url
+
+        flow.execute(
+            "namespace-test",
+            "flow-test",
+            {"file": ("input.txt", Pipe(b"streamed"), "text/plain")},
+        )
+
+        headers, body = server.uploads[0]
+
+    assert headers["Transfer-Encoding"] == "chunked"
+    assert parse_multipart(headers, body) == {"file": ("input.txt", b"streamed")}
+
+
+def test_execute_stream_uploads_retry(mocker: MockerFixture):
+    mocker.patch("time.sleep")
+    bodies = []
+
+    def create(request, context):
+        bodies.append(b"".join(request.body))
+        context.status_code = 503 if len(bodies) == 1 else 200
+        return {"id": "123"}
+
+    with requests_mock.Mocker() as m:
+        m.post(
+            "http://localhost:8080/api/v1/executions/namespace-test/flow-test",
+            json=create,
+        )
+
+        flow = Flow(wait_for_completion=False, stream_uploads=True)
+        flow.execute(
+            "namespace-test", "flow-test", {"file": ("a.txt", io.BytesIO(b"data"))}
+        )
+
+    assert len(bodies) == 2
+    assert bodies[0] == bodies[1]
+    assert b"data" in bodies[0]
+
+
+def test_execute_idempotency(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "executions.db"))
+
+    with FakeKestraServer() as server:
+        flow = Flow(polling=PollingStrategy.fixed(0), idempotency=store)
+        flow.hostname = server.url
+
+        first = flow.execute("namespace-test", "flow-test", {"a": 1})
+        # another Flow sharing the database, as a retried task would
+        flow = Flow(polling=PollingStrategy.fixed(0), idempotency=store)
+        flow.hostname = server.url
+        again = flow.execute("namespace-test", "flow-test", {"a": 1})
+        other = flow.execute("namespace-test", "flow-test", {"a": 2})
+
+        assert again.execution_id == first.execution_id
+        assert again.status == "SUCCESS"
+        assert other.execution_id != first.execution_id
+        assert server.count("POST", r"/api/v1/executions/.*") == 2
+
+
+@pytest.mark.parametrize(
+    "states,ttl,created",
+    [
+        (("FAILED",), 3600, 2),
+        (("SUCCESS",), 0, 2),
+        (("SUCCESS",), 3600, 1),
+    ],
+)
+def test_execute_idempotency_new_execution(tmp_path, states, ttl, created):
+    store = IdempotencyStore(str(tmp_path / "executions.db"), ttl=ttl)
+
+    with FakeKestraServer(states=states) as server:
+        flow = Flow(polling=PollingStrategy.fixed(0), idempotency=store)
+        flow.hostname = server.url
+
+        flow.execute("namespace-test", "flow-test", {"a": 1})
+        flow.execute("namespace-test", "flow-test", {"a": 1})
+
+        assert server.count("POST", r"/api/v1/executions/.*") == created
+
+
+def test_idempotency_key():
+    url = "http://localhost:8080/api/v1/executions/namespace-test/flow-test"
+    file = io.BytesIO(b"content")
+    file.seek(2)
+
+    key = IdempotencyStore.key(url, {"a": 1, "file": ("f.txt", file)})
+
+    assert file.tell() == 2
+    assert key == IdempotencyStore.key(url, {"file": ("f.txt", file), "a": "1"})
+    assert key != IdempotencyStore.key(url, {"a": 1, "file": ("f.txt", b"other")})
+    assert key != IdempotencyStore.key(url + "-2", {"a": 1, "file": ("f.txt", file)})
+    assert IdempotencyStore.key(url, {"file": ("f.txt", io.RawIOBase())}) is None
+    with pytest.raises(ValueError, match="'file'"):
+        IdempotencyStore.key(url, {"file": ("f.txt",)})
+
+
+class RecordingInstrumentation(Instrumentation):
+    def __init__(self) -> None:
+        self.requests = []
+        self.waits = []
+
+    def request(self, endpoint, method, status, duration, retries, sent, received):
+        assert duration >= 0
+        self.requests.append((endpoint, method, status, retries, sent, received))
+
+    def wait(self, execution_id, state, duration):
+        self.waits.append((execution_id, state))
+
+
+def test_execute_instrumentation():
+    instrumentation = RecordingInstrumentation()
+
+    with FakeKestraServer(states=("RUNNING", "SUCCESS")) as server:
+        flow = Flow(polling=PollingStrategy.fixed(0), instrumentation=instrumentation)
+        flow.hostname = server.url
+
+        result = flow.execute("namespace-test", "flow-test", {"a": 1})
+
+    endpoints = [request[0] for request in instrumentation.requests]
+    assert endpoints == ["create", "status", "status", "logs"]
+    create = instrumentation.requests[0]
+    assert create[1:4] == ("POST", 200, 0)
+    assert create[4] > 0 and create[5] > 0
+    assert instrumentation.requests[-1][5] == len("Execution logs")
+    assert instrumentation.waits == [(result.execution_id, "SUCCESS")]
+
+
+def test_submit_instrumentation():
+    instrumentation = RecordingInstrumentation()
+
+    with FakeKestraServer() as server, Flow(
+        polling=PollingStrategy.fixed(0), instrumentation=instrumentation
+    ) as flow:
+        flow.hostname = server.url
+        result = flow.submit("namespace-test", "flow-test").result()
+
+    assert instrumentation.waits == [(result.execution_id, "SUCCESS")]
+
+
+def test_submit_instrumentation_close_while_pending():
+    instrumentation = RecordingInstrumentation()
+
+    with FakeKestraServer(states=("RUNNING",)) as server:
+        flow = Flow(
+            polling=PollingStrategy.fixed(0.01), instrumentation=instrumentation
+        )
+        flow.hostname = server.url
+        future = flow.submit("namespace-test", "flow-test")
+        while not server.count("GET", r"/api/v1/executions/\w+"):
+            time.sleep(0.01)
+
+        flow.close()
+
+        with pytest.raises(CancelledError):
+            future.result(timeout=3)
+    assert [state for _, state in instrumentation.waits] == [None]
+
+
+def test_submit_close_while_creating():
+    with FakeKestraServer(latency=0.3) as server:
+        flow = Flow(polling=PollingStrategy.fixed(0.01))
+        flow.hostname = server.url
+        future = flow.submit("namespace-test", "flow-test")
+        while not server.count("POST", r"/api/v1/executions/.*"):
+            time.sleep(0.01)
+
+        flow.close()
+
+        with pytest.raises(CancelledError):
+            future.result(timeout=3)
+
+
+def test_make_request_instrumentation_retries(mocker: MockerFixture, monkeypatch):
+    mocker.patch("time.sleep")
+    metrics = []
+    monkeypatch.setattr(Kestra, "_send", metrics.append)
+
+    with requests_mock.Mocker() as m:
+        m.get(
+            "http://localhost:8080/api/v1/executions/123",
+            [{"status_code": 503}, {"status_code": 404}],
+        )
+
+        flow = Flow(instrumentation=MetricsInstrumentation())
+        with pytest.raises(requests.HTTPError):
+            flow._make_request(
+                "GET", "http://localhost:8080/api/v1/executions/123", endpoint="status"
+            )
+
+    tags = {"endpoint": "status", "status": "404"}
+    assert [metric["metrics"][0]["name"] for metric in metrics] == [
+        "kestra.api.duration",
+        "kestra.api.retries",
+    ]
+    assert metrics[1]["metrics"][0] == {
+        "name": "kestra.api.retries",
+        "type": "counter",
+        "value": 1,
+        "tags": tags,
+    }
+    assert metrics[0]["metrics"][0]["tags"] == tags
+
+
+def test_make_request_instrumentation_failure(caplog):
+    class Failing(Instrumentation):
+        def request(self, *args):
+            raise ValueError("broken")
+
+    with requests_mock.Mocker() as m:
+        m.get("http://localhost:8080/api/v1/executions/123", json={})
+
+        flow = Flow(instrumentation=Failing())
+        response = flow._make_request(
+            "GET", "http://localhost:8080/api/v1/executions/123"
+        )
+
+    assert response.json() == {}
+    assert "The request instrumentation failed" in caplog.text
+
+
+def test_kill_many_chunks_ids():
+    with requests_mock.Mocker() as m:
+        m.delete(
+            "http://localhost:8080/api/v1/executions/kill/by-ids",
+            json=lambda request, context: {"count": len(request.json())},
+        )
+
+        count = Flow().kill_many((f"exec-{i}" for i in range(1200)), chunk_size=500)
+
+        assert count == 1200
+        assert [len(request.json()) for request in m.request_history] == [
+            500,
+            500,
+            200,
+        ]
+        assert m.request_history[2].json()[-1] == "exec-1199"
+
+
+@pytest.mark.parametrize(
+    "action,method,path",
+    [
+        ("kill_many", "DELETE", "kill"),
+        ("restart_many", "POST", "restart"),
+        ("replay_many", "POST", "replay"),
+    ],
+)
+def test_bulk_by_query(action, method, path):
+    with requests_mock.Mocker() as m:
+        m.register_uri(
+            method,
+            f"http://localhost:8080/api/v1/tenant/executions/{path}/by-query",
+            json={"count": 42},
+        )
+
+        count = getattr(Flow(tenant="tenant"), action)(
+            query={"namespace": "company.team", "state": ["FAILED", "KILLED"]}
+        )
+
+        assert count == 42
+        assert m.last_request.qs == {
+            "namespace": ["company.team"],
+            "state": ["failed", "killed"],
+        }
+
+
+def test_set_labels_many():
+    with requests_mock.Mocker() as m:
+        m.post(
+            "http://localhost:8080/api/v1/executions/labels/by-ids",
+            json={"count": 2},
+        )
+
+        count = Flow().set_labels_many({"team": "data", "run": 3}, ["a", "b"])
+
+        assert count == 2
+        assert m.last_request.json() == {
+            "executionsId": ["a", "b"],
+            "executionLabels": [
+                {"key": "team", "value": "data"},
+                {"key": "run", "value": "3"},
+            ],
+        }
+
+
+def test_bulk_requires_ids_or_query():
+    with pytest.raises(ValueError):
+        Flow().kill_many()
+    with pytest.raises(ValueError):
+        Flow().kill_many(["a"], query={"namespace": "company.team"})
+
+
+def test_execute_outputs_and_files(tmp_path):
+    uris = [f"kestra:///namespace-test/flow-test/file-{i}.csv" for i in range(3)]
+    files = {uri: f"content {i}".encode() * 10_000 for i, uri in enumerate(uris)}
+
+    with FakeKestraServer(
+        outputs={"count": 3, "files": uris}, files=files
+    ) as server, Flow(polling=PollingStrategy.fixed(0)) as flow:
+        flow.hostname = server.url
+
+        result = flow.execute("namespace-test", "flow-test")
+        paths = flow.download_files(
+            result.execution_id, result.outputs["files"], str(tmp_path)
+        )
+
+        assert result.outputs == {"count": 3, "files": uris}
+        # the outputs come with the terminal state, without any other request
+        assert server.count("GET", r"/api/v1/executions/[^/]+") == 3
+        assert server.count("GET", r".*/file") == 3
+        with pytest.raises(requests.HTTPError):
+            flow.download_file(result.execution_id, "kestra:///missing", "missing")
+
+    assert paths == {uri: str(tmp_path / uri.rsplit("/", 1)[1]) for uri in uris}
+    for uri, path in paths.items():
+        with open(path, "rb") as file:
+            assert file.read() == files[uri]
+
+
+def test_read_file():
+    path = os.path.join(os.path.dirname(__file__), "data", "employees.ion")
+    with open(path, "rb") as file:
+        files = {"kestra:///employees.ion": file.read()}
+
+    with FakeKestraServer(files=files) as server:
+        flow = Flow(wait_for_completion=False)
+        flow.hostname = server.url
+        execution = flow.execute("namespace-test", "flow-test")
+
+        records = list(
+            flow.read_file(execution.execution_id, "kestra:///employees.ion")
+        )
+
+    assert records == Kestra.read(path)
+    assert records == list(Kestra.iter_read(path))
@@ -1,8 +1,11 @@
 import os
+import subprocess
+import sys
 from datetime import datetime, timedelta, timezone
 
 import pytest
 
+import kestra
 from kestra import Kestra
 
 
@@ -69,3 +72,29 @@ def test_not_datetime_parsing(load_ion_data):
     result = load_ion_data("not_datetime.ion")
     print(result)  # Debugging output
     assert result[0]["not_datetime_column"] == "931811085135341"
+
+
+def test_lazy_imports():
+    # a fresh interpreter, as the other tests load the dependencies
+    script = f"""
+import sys
+from kestra import Kestra
+
+Kestra.outputs({{"key": "value"}})
+Kestra.counter("count", 1)
+loaded = ["requests", "urllib3", "amazon.ion.core", "dateutil.parser", "asyncio", "email.utils"]
+assert not [name for name in loaded if name in sys.modules], sys.modules.keys()
+
+assert Kestra.read({os.path.join(os.path.dirname(__file__), "data", "basic.ion")!r})
+assert "amazon.ion.core" in sys.modules
+"""
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(
+            [os.path.dirname(kestra.__file__), os.environ.get("PYTHONPATH", "")]
+        ),
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", script], env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
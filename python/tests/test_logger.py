@@ -1,6 +1,22 @@
+import gc
+import io
+import json
 import logging
+import queue
+import sys
+import time
+import weakref
 
-from kestra import JsonFormatter
+import pytest
+
+from kestra import (
+    JsonFormatter,
+    Kestra,
+    LogFormatter,
+    RepeatedMessageFilter,
+    _BatchStreamHandler,
+    _DroppingQueueHandler,
+)
 
 
 def make_record() -> logging.LogRecord:
@@ -26,3 +42,297 @@ def test_formatter():
     assert out.find('::{"logs": [') >= 0
     assert out.find("1: hello") >= 0
     assert out.find("2020-03-20T14:12:46.000Z") >= 0
+
+
+@pytest.fixture
+def kestra_logger():
+    """
+    Reset the Kestra logger before and after a test.
+    """
+
+    def reset():
+        Kestra._stop_log_listener()
+        for handler in Kestra._log_handlers:
+            logging.getLogger("Kestra").removeHandler(handler)
+        Kestra._logger = None
+        Kestra._log_handlers = []
+
+    reset()
+    yield
+    reset()
+
+
+def test_non_blocking_logger(kestra_logger, capsys):
+    logger = Kestra.logger(non_blocking=True)
+    assert Kestra.logger() is logger
+
+    for i in range(100):
+        logger.info("record %d", i)
+    logger.warning("careful")
+    Kestra._stop_log_listener()
+
+    out, err = capsys.readouterr()
+    lines = out.splitlines()
+    assert len(lines) == 100
+    assert "record 0" in lines[0] and "record 99" in lines[99]
+    assert '"level": "WARN"' in err and "careful" in err
+    assert "dropped" not in err
+
+    # the records logged after the listener stopped are written synchronously
+    logger.info("after")
+    assert "after" in capsys.readouterr().out
+
+
+def test_non_blocking_logger_switch(kestra_logger, capsys):
+    logger = Kestra.logger()
+    assert Kestra.logger(non_blocking=True) is logger
+    assert Kestra._log_listener is not None
+
+    logger.info("queued")
+    Kestra._stop_log_listener()
+
+    assert capsys.readouterr().out.count("queued") == 1
+
+
+def test_dropping_queue_handler():
+    handler = _DroppingQueueHandler(queue.Queue(2))
+    record = make_record()
+
+    for _ in range(5):
+        handler.handle(record)
+
+    assert handler.queue.qsize() == 2
+    assert handler.queue.get() is record
+    assert handler.dropped == 3
+
+
+def reference_format(record: logging.LogRecord) -> str:
+    """
+    The formatting of JsonFormatter before it was optimized.
+    """
+    levels = {10: "DEBUG", 20: "INFO", 30: "WARN", 40: "ERROR", 50: "ERROR"}
+    entry = {
+        "level": levels.get(record.levelno, "TRACE"),
+        "message": LogFormatter("%(asctime)s - %(message)s").format(record),
+    }
+    return Kestra.format({"logs": [entry]})
+
+
+@pytest.mark.parametrize(
+    "created",
+    [1584713566, 1584713566.5, 1584713566.0005, 1584713566.9995, 1584713566.9999996],
+)
+@pytest.mark.parametrize("level", [5, logging.INFO, 25, logging.CRITICAL])
+@pytest.mark.parametrize("message", ["plain", 'quotes " and \\ \n', "unicode é 🚀"])
+def test_formatter_matches_reference(created, level, message):
+    record = make_record()
+    record.created, record.levelno, record.msg, record.args = (
+        created,
+        level,
+        message,
+        (),
+    )
+
+    assert JsonFormatter().format(record) == reference_format(record)
+
+
+def test_formatter_exception():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord(
+            "name", logging.ERROR, "f.py", 1, "failed", (), sys.exc_info()
+        )
+
+    out = JsonFormatter().format(record)
+
+    assert out == reference_format(record)
+    assert "ValueError: boom" in out
+
+
+def parse_frames(output: str) -> list[list[dict]]:
+    return [json.loads(line[2:-2])["logs"] for line in output.splitlines()]
+
+
+def test_formatter_batch():
+    records = [make_record(), make_record()]
+    records[1].levelno = logging.WARNING
+
+    frames = parse_frames(JsonFormatter().format_batch(records))
+
+    assert [entry["level"] for entry in frames[0]] == ["DEBUG", "WARN"]
+    assert frames[0][0] == parse_frames(JsonFormatter().format(records[0]))[0][0]
+
+
+def test_batch_stream_handler():
+    stream = io.StringIO()
+    handler = _BatchStreamHandler(stream, capacity=3, interval=60)
+    handler.setFormatter(JsonFormatter())
+
+    for i in range(7):
+        record = make_record()
+        record.args = (i, "hello")
+        handler.handle(record)
+
+    assert [len(frame) for frame in parse_frames(stream.getvalue())] == [3, 3]
+
+    handler.close()
+    frames = parse_frames(stream.getvalue())
+    assert [len(frame) for frame in frames] == [3, 3, 1]
+    messages = [entry["message"] for frame in frames for entry in frame]
+    assert [message.split(" - ")[1] for message in messages] == [
+        f"{i}: hello" for i in range(7)
+    ]
+
+
+def test_batch_stream_handler_interval():
+    stream = io.StringIO()
+    handler = _BatchStreamHandler(stream, capacity=100, interval=0.01)
+    handler.setFormatter(JsonFormatter())
+
+    handler.handle(make_record())
+    handler.handle(make_record())
+    deadline = time.monotonic() + 5
+    while not stream.getvalue() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert [len(frame) for frame in parse_frames(stream.getvalue())] == [2]
+    handler.close()
+
+
+def test_batched_logger(kestra_logger, capsys):
+    logger = Kestra.logger(batch_size=10, batch_interval=60)
+
+    for i in range(3):
+        logger.info("info %d", i)
+    logger.error("error")
+    for handler in Kestra._log_handlers:
+        handler.flush()
+
+    out, err = capsys.readouterr()
+    assert [len(frame) for frame in parse_frames(out)] == [3]
+    assert [frame[0]["level"] for frame in parse_frames(err)] == ["ERROR"]
+
+
+def test_formatter_time_cache():
+    formatter = JsonFormatter()
+    record = make_record()
+
+    for created in [1584713566.1, 1584713566.7, 1584713567.2, 1584713566.3, 0.5]:
+        record.created = created
+        assert formatter.format(record) == reference_format(record)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.messages.append((record.levelname, record.getMessage()))
+
+
+@pytest.fixture
+def dedup_logger():
+    logger = logging.getLogger("test-dedup")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    handler = ListHandler()
+    logger.addHandler(handler)
+    yield logger, handler
+    logger.removeHandler(handler)
+    logger.filters.clear()
+
+
+def test_repeated_message_filter(dedup_logger, mocker):
+    logger, handler = dedup_logger
+    monotonic = mocker.patch("time.monotonic", return_value=0)
+    repeated = RepeatedMessageFilter(window=60)
+    logger.addFilter(repeated)
+
+    for i in range(1000):
+        logger.warning("Retrying item %d", i)
+        logger.info("Retrying item %d", i)
+    logger.warning("Other message")
+    monotonic.return_value = 61
+    logger.warning("Retrying item %d", 1000)
+    logger.warning("Retrying item %d", 1001)
+    monotonic.return_value = 70
+    repeated.flush()
+
+    assert handler.messages == [
+        ("WARNING", "Retrying item 0"),
+        ("INFO", "Retrying item 0"),
+        ("WARNING", "Other message"),
+        ("INFO", "Retrying item 999 (repeated 999 times in the last 61s)"),
+        ("WARNING", "Retrying item 1000 (repeated 999 times in the last 61s)"),
+        ("WARNING", "Retrying item 1001 (repeated 1 times in the last 9s)"),
+    ]
+
+
+def test_repeated_message_filter_expired_windows(dedup_logger, mocker):
+    logger, handler = dedup_logger
+    monotonic = mocker.patch("time.monotonic", return_value=0)
+    logger.addFilter(RepeatedMessageFilter(window=60))
+
+    logger.warning("Retrying")
+    logger.warning("Retrying")
+    monotonic.return_value = 30
+    logger.info("Progress")
+    monotonic.return_value = 65
+    logger.info("Progress")
+    logger.warning("Retrying")
+
+    # the summary is logged once its window is over, not when the message returns
+    assert handler.messages == [
+        ("WARNING", "Retrying"),
+        ("INFO", "Progress"),
+        ("WARNING", "Retrying (repeated 1 times in the last 65s)"),
+        ("WARNING", "Retrying"),
+    ]
+
+
+def test_repeated_message_filter_placeholder_template(dedup_logger, mocker):
+    logger, handler = dedup_logger
+    mocker.patch("time.monotonic", return_value=0)
+    repeated = RepeatedMessageFilter(window=60)
+    logger.addFilter(repeated)
+
+    # like the lines forwarded by the log tailer
+    for message in ["[task] alpha", "[task] beta", "[task] gamma", "[task] alpha"]:
+        logger.info("%s", message)
+    repeated.flush()
+
+    assert handler.messages == [
+        ("INFO", "[task] alpha"),
+        ("INFO", "[task] beta"),
+        ("INFO", "[task] gamma"),
+        ("INFO", "[task] alpha (repeated 1 times in the last 0s)"),
+    ]
+
+
+def test_repeated_message_filter_not_kept_alive():
+    repeated = weakref.ref(RepeatedMessageFilter())
+    gc.collect()
+
+    assert repeated() is None
+
+
+def test_repeated_message_filter_evicts_templates(dedup_logger, mocker):
+    logger, handler = dedup_logger
+    mocker.patch("time.monotonic", return_value=0)
+    logger.addFilter(RepeatedMessageFilter(window=60, max_templates=2))
+
+    logger.info("first")
+    logger.info("first")
+    logger.info("second")
+    logger.info("third")
+    logger.info("first")
+
+    assert handler.messages == [
+        ("INFO", "first"),
+        ("INFO", "second"),
+        ("INFO", "first (repeated 1 times in the last 0s)"),
+        ("INFO", "third"),
+        ("INFO", "first"),
+    ]
@@ -0,0 +1,81 @@
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from kestra import Kestra
+
+
+def work(item: int) -> int:
+    Kestra.logger().info("item %d: %s", item, "x" * 100_000)
+    Kestra.logger().warning("warning %d", item)
+    Kestra.counter("items", 1, {"kind": "test"})
+    Kestra.counter("bytes", 10)
+    Kestra.timer("duration", 0.5)
+    Kestra.gauge("last", item)
+    Kestra.outputs({f"item_{item}": item})
+    return item
+
+
+def parse_frames(output: str) -> list[dict]:
+    lines = output.splitlines()
+    assert all(line.startswith("::") and line.endswith("::") for line in lines)
+    return [json.loads(line[2:-2]) for line in lines]
+
+
+def test_multiprocess(capsys):
+    context = multiprocessing.get_context("spawn")
+
+    with Kestra.multiprocess(context) as collector, ProcessPoolExecutor(
+        2,
+        mp_context=context,
+        initializer=collector.initializer,
+        initargs=collector.initargs,
+    ) as pool:
+        assert sorted(pool.map(work, range(20))) == list(range(20))
+
+    out, err = capsys.readouterr()
+    frames = parse_frames(out)
+    logs = [frame["logs"][0] for frame in frames if "logs" in frame]
+    outputs = [frame["outputs"] for frame in frames if "outputs" in frame]
+    metrics = [frame["metrics"] for frame in frames if "metrics" in frame]
+
+    assert len(logs) == 20
+    assert all(len(log["message"]) > 100_000 for log in logs)
+    assert len(parse_frames(err)) == 20
+    assert sorted(output.popitem()[1] for output in outputs) == list(range(20))
+    # the metrics of all the workers are sent once, merged
+    assert len(metrics) == 1
+    by_name = {metric["name"]: metric for metric in metrics[0]}
+    assert by_name["items"] == {
+        "name": "items",
+        "type": "counter",
+        "value": 20,
+        "tags": {"kind": "test"},
+    }
+    assert by_name["bytes"]["value"] == 200
+    assert by_name["duration"]["value"] == 10
+    assert by_name["last"]["value"] in range(20)
+
+
+def send_output(item: int) -> int:
+    Kestra.outputs({f"item_{item}": "x" * 200_000})
+    Kestra.counter("items", 1)
+    return item
+
+
+def test_multiprocess_pool_terminated_on_exit(capsys):
+    context = multiprocessing.get_context("spawn")
+
+    # Pool.__exit__ terminates the workers right after the last task
+    with Kestra.multiprocess(context) as collector, context.Pool(
+        4, initializer=collector.initializer, initargs=collector.initargs
+    ) as pool:
+        assert sorted(pool.map(send_output, range(200))) == list(range(200))
+
+    frames = parse_frames(capsys.readouterr().out)
+    outputs = [frame["outputs"] for frame in frames if "outputs" in frame]
+    metrics = [frame["metrics"] for frame in frames if "metrics" in frame]
+
+    assert len(outputs) == 200
+    assert all(len(output.popitem()[1]) == 200_000 for output in outputs)
+    assert metrics == [[{"name": "items", "type": "counter", "value": 200, "tags": {}}]]
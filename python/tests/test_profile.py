@@ -0,0 +1,84 @@
+import json
+import pstats
+import time
+
+import pytest
+
+from kestra import Kestra
+
+
+def busy(duration: float = 0.1) -> int:
+    """
+    Spin for `duration` seconds, and return the number of iterations.
+    """
+    end = time.perf_counter() + duration
+    total = 0
+    while time.perf_counter() < end:
+        total += 1
+    return total
+
+
+def parse_metrics(output: str) -> list[dict]:
+    return [
+        metric
+        for line in output.splitlines()
+        for metric in json.loads(line[2:-2])["metrics"]
+    ]
+
+
+def test_profile_disabled_by_default(monkeypatch, tmp_path, capsys):
+    monkeypatch.delenv("KESTRA_PROFILE", raising=False)
+    monkeypatch.chdir(tmp_path)
+
+    with Kestra.profile("block") as profiler:
+        busy(0.01)
+
+    assert not profiler.enabled
+    assert capsys.readouterr().out == ""
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_profile_cprofile(tmp_path, capsys):
+    output = tmp_path / "block.pstats"
+
+    with Kestra.profile("block", mode="cprofile", top=3, output=str(output)):
+        busy()
+
+    metrics = parse_metrics(capsys.readouterr().out)
+    assert metrics[0]["name"] == "kestra.profile.duration"
+    assert metrics[0]["tags"] == {"block": "block"}
+    assert [metric["name"] for metric in metrics[1:]] == ["kestra.profile"] * 3
+    functions = [metric["tags"]["function"] for metric in metrics[1:]]
+    assert any(function.endswith("(busy)") for function in functions)
+    values = [metric["value"] for metric in metrics[1:]]
+    assert values == sorted(values, reverse=True)
+
+    stats = pstats.Stats(str(output))
+    assert any(function[2] == "busy" for function in stats.stats)
+
+
+def test_profile_environment_sampling(monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv("KESTRA_PROFILE", "sampling")
+    monkeypatch.chdir(tmp_path)
+
+    @Kestra.profile(interval=0.001)
+    def work():
+        return busy(0.2)
+
+    assert work() > 0
+
+    metrics = parse_metrics(capsys.readouterr().out)
+    name = "test_profile_environment_sampling.<locals>.work"
+    assert {metric["tags"]["block"] for metric in metrics} == {name}
+    functions = {metric["tags"]["function"] for metric in metrics[1:]}
+    assert any(function.endswith("(busy)") for function in functions)
+
+    collapsed = tmp_path / (name.replace("<", "_").replace(">", "_") + ".collapsed")
+    stacks = collapsed.read_text().splitlines()
+    assert any(";" in stack and "(busy) " in stack for stack in stacks)
+    assert all(stack.rsplit(" ", 1)[1].isdigit() for stack in stacks)
+
+
+def test_profile_unknown_mode():
+    with pytest.raises(ValueError):
+        Kestra.profile(mode="perf")
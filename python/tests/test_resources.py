@@ -0,0 +1,89 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+
+from kestra import Kestra
+
+
+def parse_metrics(output: str) -> list[list[dict]]:
+    return [json.loads(line[2:-2])["metrics"] for line in output.splitlines()]
+
+
+def test_sample():
+    values = Kestra.resource_sampler().sample()
+
+    assert values["cpu.user"] > 0
+    assert values["memory.peak"] > 0
+    assert values["context_switches.voluntary"] >= 0
+    if sys.platform == "linux":
+        assert 0 < values["memory.rss"] <= values["memory.peak"]
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="reads /proc")
+def test_resource_sampler(tmp_path, capsys):
+    with Kestra.resource_sampler(interval=0.05, tags={"task": "test"}):
+        end = time.perf_counter() + 0.2
+        while time.perf_counter() < end:
+            pass
+        with open(tmp_path / "data", "wb") as file:
+            file.write(os.urandom(1024 * 1024))
+            os.fsync(file.fileno())
+
+    *samples, summary = parse_metrics(capsys.readouterr().out)
+
+    # the samples of the interval, and the last one when stopping
+    assert len(samples) >= 3
+    names = {
+        "kestra.process.cpu.percent",
+        "kestra.process.cpu.user",
+        "kestra.process.memory.rss",
+        "kestra.process.memory.peak",
+        "kestra.process.context_switches.voluntary",
+        "kestra.process.io.write_bytes",
+    }
+    for sample in samples:
+        assert names <= {metric["name"] for metric in sample}
+        assert all(metric["type"] == "gauge" for metric in sample)
+        assert all(metric["tags"] == {"task": "test"} for metric in sample)
+
+    stats = {(metric["name"], metric["tags"].get("stat")): metric for metric in summary}
+    assert stats[("kestra.process.cpu.percent", "max")]["value"] > 20
+    assert 0 < stats[("kestra.process.cpu.percent", "mean")]["value"] <= 110
+    assert stats[("kestra.process.cpu.user", "total")]["value"] > 0.1
+    assert (
+        stats[("kestra.process.memory.rss", "max")]["value"]
+        >= stats[("kestra.process.memory.rss", "mean")]["value"]
+    )
+    assert stats[("kestra.process.memory.rss", "max")]["tags"] == {
+        "task": "test",
+        "stat": "max",
+    }
+    overhead = stats[("kestra.process.sampler.duration", None)]
+    assert overhead["type"] == "timer"
+    assert 0 <= overhead["value"] < 0.1
+
+
+def test_resource_sampler_stop_once(capsys):
+    sampler = Kestra.resource_sampler(interval=60).start()
+    sampler.stop()
+    sampler.stop()
+
+    assert len(parse_metrics(capsys.readouterr().out)) == 2
+
+
+def test_resource_sampler_concurrent_metrics(capsys):
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with Kestra.resource_sampler(interval=0.001):
+            for i in range(2000):
+                Kestra.counter("rows", i)
+    finally:
+        sys.setswitchinterval(interval)
+
+    # each frame is on its own line, even when written by both threads at once
+    metrics = parse_metrics(capsys.readouterr().out)
+    assert sum(metric[0]["name"] == "rows" for metric in metrics) == 2000